@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+from typing import Dict, List
+
+import faiss
+import numpy as np
+
+# Add the project root to the system path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from loguru import logger
+from src.data_loader import settings
+from src.data_loader.sharded_index import index_exists, shard_paths
+from src.data_loader.vector_compression import INDEX_TYPES, build_index, load_full_vectors, rescore
+from src.monitoring.tracing import percentile
+from benchmarks.retrieval_benchmark import BENCHMARK_OUTPUT_DIR, DEFAULT_QUERY_SET, git_commit, load_query_set
+
+
+def load_index_vectors(index_path: str) -> np.ndarray:
+    """
+    Full-precision vectors of every shard of the live index.
+
+    Compressed shards are read from their float32 copy when they have one, and decoded
+    from their codes otherwise.
+    """
+    vectors = []
+    for path in shard_paths(index_path):
+        full_vectors = load_full_vectors(path)
+        if full_vectors is not None:
+            vectors.append(np.asarray(full_vectors, dtype=np.float32))
+            continue
+        index = faiss.read_index(os.path.join(path, "index.faiss"))
+        vectors.append(index.reconstruct_n(0, index.ntotal))
+    return np.vstack(vectors)
+
+
+def embed_queries(queries_path: str) -> np.ndarray:
+    """Embed the labelled query set with the production embedding model"""
+    from src.data_loader.query_embeddings import get_embeddings
+    embeddings = get_embeddings()
+    return np.array(embeddings.embed_documents([item["query"] for item in load_query_set(queries_path)]), dtype=np.float32)
+
+
+def sample_queries(vectors: np.ndarray, count: int, seed: int = 0) -> np.ndarray:
+    """Stored vectors with small noise added, as queries that need no embedding model"""
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), size=min(count, len(vectors)), replace=False)]
+    noise = rng.normal(scale=np.std(vectors) * 0.5, size=sample.shape).astype(np.float32)
+    return sample + noise
+
+
+def overlap_recall(found: List[np.ndarray], exact: np.ndarray) -> float:
+    """Mean fraction of the exact top-k that a search found"""
+    return float(np.mean([len(set(ids.tolist()) & set(truth.tolist())) / len(truth) for ids, truth in zip(found, exact)]))
+
+
+def benchmark_index_type(index_type: str, vectors: np.ndarray, queries: np.ndarray, exact_ids: np.ndarray,
+                         k: int, rescore_factor: int) -> Dict:
+    """Memory, recall@k against exact search and latency of one storage format, with and without re-scoring"""
+    index = build_index(vectors, index_type)
+    index_bytes = len(faiss.serialize_index(index))
+
+    plain, rescored, plain_ms, rescored_ms = [], [], [], []
+    for query in queries:
+        start = time.perf_counter()
+        _, ids = index.search(query[None, :], k)
+        plain_ms.append((time.perf_counter() - start) * 1000)
+        plain.append(ids[0])
+
+        start = time.perf_counter()
+        _, candidates = index.search(query[None, :], k * rescore_factor)
+        ids, _ = rescore(vectors, query, candidates[0][candidates[0] != -1], k)
+        rescored_ms.append((time.perf_counter() - start) * 1000)
+        rescored.append(ids)
+
+    return {
+        "index_bytes": index_bytes,
+        "bytes_per_vector": index_bytes / len(vectors),
+        # Per-vector code size alone, without trained codebooks (what a large index converges to)
+        "code_bytes_per_vector": index.sa_code_size(),
+        f"recall_at_{k}": overlap_recall(plain, exact_ids),
+        f"rescored_recall_at_{k}": overlap_recall(rescored, exact_ids),
+        "latency_ms": {"p50": percentile(plain_ms, 50), "p95": percentile(plain_ms, 95)},
+        "rescored_latency_ms": {"p50": percentile(rescored_ms, 50), "p95": percentile(rescored_ms, 95)},
+    }
+
+
+def run_compression_benchmark(index_path: str, queries: np.ndarray, k: int = 5, rescore_factor: int = None,
+                              index_types: List[str] = None) -> Dict:
+    """
+    Compare embedding storage formats on the live index's vectors.
+
+    Args:
+        index_path (str): Index directory
+        queries (np.ndarray): Query vectors
+        k (int): Results per query
+        rescore_factor (int, optional): Candidates re-scored per result (defaults to settings.INDEX_RESCORE_FACTOR)
+        index_types (List[str], optional): Formats to compare (defaults to all)
+
+    Returns:
+        dict: Per-format memory, recall and latency, with savings relative to float32
+    """
+    rescore_factor = rescore_factor or settings.INDEX_RESCORE_FACTOR
+    vectors = load_index_vectors(index_path)
+    logger.info(f"Comparing storage formats on {len(vectors)} vectors with {len(queries)} queries")
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, exact_ids = exact.search(queries, k)
+
+    results = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "config": {"index": index_path, "vectors": len(vectors), "queries": len(queries), "k": k,
+                   "rescore_factor": rescore_factor},
+        # The float32 copy is memory-mapped, so it costs disk but not resident memory
+        "full_precision_file_bytes": vectors.nbytes,
+        "index_types": {},
+    }
+    for index_type in index_types or INDEX_TYPES:
+        results["index_types"][index_type] = benchmark_index_type(index_type, vectors, queries, exact_ids, k, rescore_factor)
+
+    flat_bytes = results["index_types"].get("flat", {}).get("index_bytes") or vectors.nbytes
+    for run in results["index_types"].values():
+        run["memory_saving"] = 1 - run["index_bytes"] / flat_bytes
+    return results
+
+
+def print_report(results: Dict):
+    k = results["config"]["k"]
+    print("\n" + "=" * 80)
+    print("VECTOR COMPRESSION BENCHMARK")
+    print("=" * 80)
+    print(f"{results['config']['vectors']} vectors, {results['config']['queries']} queries, "
+          f"re-scoring top {k * results['config']['rescore_factor']}")
+    print(f"{'type':<6} {'bytes/vec':>10} {'code':>6} {'saving':>8} {f'recall@{k}':>10} {'rescored':>9} {'p50 ms':>8} {'rescored p50':>13}")
+    for index_type, run in results["index_types"].items():
+        print(f"{index_type:<6} {run['bytes_per_vector']:>10.0f} {run['code_bytes_per_vector']:>6} {run['memory_saving']:>8.1%} "
+              f"{run[f'recall_at_{k}']:>10.3f} {run[f'rescored_recall_at_{k}']:>9.3f} "
+              f"{run['latency_ms']['p50']:>8.3f} {run['rescored_latency_ms']['p50']:>13.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure memory savings and recall impact of compressed embedding storage.')
+    parser.add_argument('--index', default=os.path.join(settings.DOC_INDEXES_DIR, settings.DEFAULT_CORPUS), help='Index directory')
+    parser.add_argument('--queries', default=DEFAULT_QUERY_SET, help='Labelled query set (JSON) to embed as queries')
+    parser.add_argument('--sample-queries', type=int, default=0,
+                        help='Use this many perturbed stored vectors as queries instead (no embedding model needed)')
+    parser.add_argument('--k', type=int, default=5, help='Results per query')
+    parser.add_argument('--rescore-factor', type=int, default=None, help='Candidates re-scored per result')
+    parser.add_argument('--types', nargs='+', choices=INDEX_TYPES, default=list(INDEX_TYPES), help='Formats to compare')
+    parser.add_argument('--output', default=None, help='Where to write the JSON results')
+    args = parser.parse_args()
+
+    if not index_exists(args.index):
+        logger.error(f"Index not found at {args.index}. Please run: python index_data.py --rebuild")
+        sys.exit(1)
+
+    if args.sample_queries:
+        queries = sample_queries(load_index_vectors(args.index), args.sample_queries)
+    else:
+        queries = embed_queries(args.queries)
+    results = run_compression_benchmark(args.index, queries, args.k, args.rescore_factor, args.types)
+
+    output_path = args.output or os.path.join(
+        BENCHMARK_OUTPUT_DIR, f"compression_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{results['git_commit']}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    print_report(results)
+    print(f"Results saved to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
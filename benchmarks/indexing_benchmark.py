@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import random
+import pstats
+import cProfile
+import argparse
+import tempfile
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List
+
+# Add the project root to the system path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from loguru import logger
+from langchain.schema import Document
+from langchain_community.vectorstores import FAISS
+from src.data_loader import settings
+from src.data_loader.doc_indexer import create_chunker, load_document, split_documents
+from benchmarks.retrieval_benchmark import BENCHMARK_OUTPUT_DIR, git_commit, peak_rss_mb
+
+SUPPORTED_EXTENSIONS = ['.pdf', '.docx', '.doc', '.txt']
+
+_MATERIALS = ["Ti-6Al-4V", "AISI 304 stainless steel", "6061-T6 aluminium", "CFRP", "PEEK",
+              "alumina", "silicon carbide", "Inconel 718", "GFRP", "magnesium AZ31"]
+_PROPERTIES = [("density", "g/cm3", 1.0, 9.0), ("yield strength", "MPa", 30, 1200),
+               ("Young's modulus", "GPa", 2, 410), ("max service temperature", "°C", 80, 1100),
+               ("thermal conductivity", "W/m.K", 0.2, 200)]
+_SENTENCES = [
+    "The selection of {m} is governed by the material index that combines {p} with density.",
+    "For components loaded in bending, {m} offers a favourable balance of {p} and cost.",
+    "Processing of {m} requires attention to its {p}, which limits the choice of joining method.",
+    "In marine environments the corrosion resistance of {m} becomes as important as its {p}.",
+]
+
+
+def generate_synthetic_pages(num_pages: int, seed: int = 0) -> List[Document]:
+    """
+    Generate page-sized documents that resemble the textbook corpus: prose plus property tables.
+
+    Args:
+        num_pages (int): Number of pages to generate
+        seed (int): Random seed so runs are comparable
+
+    Returns:
+        List[Document]: One Document per synthetic page
+    """
+    rng = random.Random(seed)
+    pages = []
+    for page in range(num_pages):
+        lines = [f"Chapter {page // 20 + 1}. Materials selection case study {page}"]
+        for _ in range(18):
+            name, _, _, _ = rng.choice(_PROPERTIES)
+            lines.append(rng.choice(_SENTENCES).format(m=rng.choice(_MATERIALS), p=name))
+        lines.append(f"Table {page // 20 + 1}.{page % 20 + 1} Properties of candidate materials")
+        for material in rng.sample(_MATERIALS, 4):
+            values = [f"{rng.uniform(low, high):.1f} {unit}" for _, unit, low, high in _PROPERTIES]
+            lines.append(f"{material}  " + "  ".join(values))
+        pages.append(Document(
+            page_content="\n".join(lines),
+            metadata={"source": "synthetic", "page": page, "doc_name": "synthetic_corpus"}
+        ))
+    return pages
+
+
+def collect_files(corpus_path: str) -> List[str]:
+    """Collect supported files from a file or directory with a single walk"""
+    if os.path.isfile(corpus_path):
+        return [corpus_path]
+    files = []
+    for root, _, filenames in os.walk(corpus_path):
+        for fname in filenames:
+            if os.path.splitext(fname)[1].lower() in SUPPORTED_EXTENSIONS:
+                files.append(os.path.join(root, fname))
+    return sorted(files)
+
+
+class StageRecorder:
+    """Times benchmark stages and optionally tracks their peak Python allocations"""
+
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.stages: Dict[str, dict] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = self.stages.setdefault(name, {"seconds": 0.0})
+            record["seconds"] += time.perf_counter() - start
+            if self.trace_memory:
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                record["peak_alloc_mb"] = max(record.get("peak_alloc_mb", 0.0), peak / (1024 * 1024))
+
+
+def run_indexing_benchmark(
+    embeddings,
+    corpus_path: str = None,
+    synthetic_pages: int = 0,
+    trace_memory: bool = False,
+    batch_size: int = 64,
+    use_extraction_cache: bool = False,
+    chunker: str = None
+) -> dict:
+    """
+    Build an index over a sample or synthetic corpus in a scratch directory, timing each stage.
+
+    Args:
+        embeddings: The embeddings object used for the embedding stage
+        corpus_path (str): File or directory of documents to extract
+        synthetic_pages (int): Number of synthetic pages to generate instead of extracting files
+        trace_memory (bool): Track peak Python allocations per stage (slows the run down)
+        batch_size (int): Number of chunks embedded per call
+        use_extraction_cache (bool): Read extracted pages from the extraction cache instead of parsing
+        chunker (str): "recursive" or "structure" (defaults to settings.CHUNKER)
+
+    Returns:
+        dict: Per-stage seconds, throughput and memory figures
+    """
+    recorder = StageRecorder(trace_memory)
+
+    # Extraction (or generation of the synthetic corpus)
+    pages: List[Document] = []
+    files: List[str] = []
+    if synthetic_pages:
+        with recorder.stage("generate"):
+            pages = generate_synthetic_pages(synthetic_pages)
+    else:
+        files = collect_files(corpus_path or settings.DATA_DIR)
+        if not files:
+            raise ValueError(f"No supported files found in {corpus_path or settings.DATA_DIR}")
+        for file_path in files:
+            with recorder.stage("extract"):
+                try:
+                    pages.extend(load_document(file_path, use_cache=use_extraction_cache))
+                except ValueError as e:
+                    logger.error(f"Skipping {file_path}: {str(e)}")
+
+    with recorder.stage("split"):
+        chunks = []
+        for doc_name in sorted({page.metadata.get("doc_name", "") for page in pages}):
+            document_chunker = create_chunker(chunker)
+            chunks.extend(split_documents(
+                [p for p in pages if p.metadata.get("doc_name", "") == doc_name], doc_name, document_chunker
+            ))
+            if document_chunker is not None:
+                document_chunker.close()
+
+    texts = [chunk.page_content for chunk in chunks]
+    vectors = []
+    with recorder.stage("embed"):
+        for start in range(0, len(texts), batch_size):
+            vectors.extend(embeddings.embed_documents(texts[start:start + batch_size]))
+
+    with recorder.stage("faiss_add"):
+        vectorstore = FAISS.from_embeddings(
+            list(zip(texts, vectors)), embeddings, metadatas=[chunk.metadata for chunk in chunks]
+        )
+
+    # Save into a scratch directory so the live index is never touched
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        with recorder.stage("faiss_save"):
+            vectorstore.save_local(scratch_dir)
+        index_bytes = sum(os.path.getsize(os.path.join(scratch_dir, f)) for f in os.listdir(scratch_dir))
+
+    stages = recorder.stages
+    throughput = {}
+    if "extract" in stages:
+        throughput["pages_per_sec"] = len(pages) / max(stages["extract"]["seconds"], 1e-9)
+    throughput["chunks_per_sec"] = len(chunks) / max(stages["split"]["seconds"], 1e-9)
+    throughput["vectors_per_sec"] = len(vectors) / max(stages["embed"]["seconds"], 1e-9)
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "corpus": {
+            "source": "synthetic" if synthetic_pages else os.path.abspath(corpus_path or settings.DATA_DIR),
+            "files": len(files),
+            "pages": len(pages),
+            "chunks": len(chunks),
+            "table_chunks": sum(1 for chunk in chunks if chunk.metadata.get("chunk_type") == "table"),
+            "characters": sum(len(t) for t in texts),
+        },
+        "chunker": chunker or settings.CHUNKER,
+        "stages": stages,
+        "throughput": throughput,
+        "index_bytes": index_bytes,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def print_report(results: dict):
+    print("\n" + "=" * 80)
+    print("INDEXING BENCHMARK")
+    print("=" * 80)
+    corpus = results["corpus"]
+    print(f"Corpus: {corpus['source']} ({corpus['files']} files, {corpus['pages']} pages, "
+          f"{corpus['chunks']} chunks, {corpus['table_chunks']} tables, {results['chunker']} chunker)")
+    for name, record in results["stages"].items():
+        memory = f"  peak alloc {record['peak_alloc_mb']:.1f} MB" if "peak_alloc_mb" in record else ""
+        print(f"  {name:<12} {record['seconds']:>9.3f}s{memory}")
+    for name, value in results["throughput"].items():
+        print(f"  {name:<16} {value:>10.1f}")
+    print(f"Index size: {results['index_bytes'] / (1024 * 1024):.1f} MB   Peak RSS: {results['peak_rss_mb']:.0f} MB")
+
+
+def run_from_args(args, embeddings=None) -> dict:
+    """
+    Run the benchmark with optional cProfile and py-spy hooks, and save the results.
+
+    Shared by this script and `index_data.py --benchmark`.
+    """
+    if args.wait_for_profiler:
+        # Gives py-spy (py-spy record --pid <pid>) time to attach before work starts
+        logger.info(f"PID {os.getpid()}: waiting {args.wait_for_profiler}s for a profiler to attach")
+        time.sleep(args.wait_for_profiler)
+
+    if embeddings is None:
+        from src.data_loader.query_embeddings import get_embeddings
+        embeddings = get_embeddings()
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    try:
+        results = run_indexing_benchmark(
+            embeddings,
+            corpus_path=args.corpus,
+            synthetic_pages=args.synthetic_pages,
+            trace_memory=args.trace_memory,
+            batch_size=args.batch_size,
+            use_extraction_cache=args.use_extraction_cache,
+            chunker=args.chunker,
+        )
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            logger.info(f"cProfile stats written to {args.profile}")
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+
+    output_path = args.output or os.path.join(
+        BENCHMARK_OUTPUT_DIR, f"indexing_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{results['git_commit']}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    print_report(results)
+    print(f"Results saved to {output_path}")
+    return results
+
+
+def add_benchmark_arguments(parser: argparse.ArgumentParser):
+    """Register the benchmark options on a parser"""
+    parser.add_argument('--corpus', default=None, help='File or directory to benchmark (defaults to the data directory)')
+    parser.add_argument('--synthetic-pages', type=int, default=0, help='Benchmark on N generated pages instead of files')
+    parser.add_argument('--batch-size', type=int, default=64, help='Chunks per embedding call')
+    parser.add_argument('--use-extraction-cache', action='store_true', help='Read pages from the extraction cache instead of parsing')
+    parser.add_argument('--trace-memory', action='store_true', help='Track peak Python allocations per stage')
+    parser.add_argument('--profile', default=None, help='Write cProfile stats to this path')
+    parser.add_argument('--wait-for-profiler', type=float, default=0, help='Seconds to wait for py-spy to attach')
+    parser.add_argument('--output', default=None, help='Where to write the JSON results')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark indexing throughput per stage.')
+    parser.add_argument('--chunker', choices=['recursive', 'structure'], default=settings.CHUNKER, help='Chunking strategy')
+    add_benchmark_arguments(parser)
+    run_from_args(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+# Add the project root to the system path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from loguru import logger
+from src.data_loader import settings
+from src.monitoring.tracing import percentile, summarize_llm_costs
+from benchmarks.retrieval_benchmark import BENCHMARK_OUTPUT_DIR, git_commit
+
+# Opening messages of simulated materials science conversations
+MATERIAL_QUERIES = [
+    "I want to build a lightweight bicycle frame that can withstand harsh weather conditions",
+    "Which material should I use for a bracket holding an exhaust pipe at 400 C?",
+    "I need a corrosion resistant housing for a marine sensor",
+    "What material is best for a drone arm that must be stiff and light?",
+    "Recommend a material for a food-safe mixing tank that is cleaned with caustic solutions",
+]
+CONVERSATIONAL_QUERIES = [
+    "What's a good way to plan a weekend trip?",
+    "Can you explain how compound interest works?",
+    "Tell me a fun fact about octopuses",
+]
+ANSWERS = [
+    "Between -10 C and 60 C, with short spikes to 80 C.",
+    "It carries up to 100 kg with impact loads from rough roads.",
+    "Rain, UV and occasional salt spray near the coast.",
+    "Tube cutting and TIG welding in small batches.",
+    "Weight matters more than cost, budget around $500 per unit.",
+    "None",
+]
+FOLLOW_UPS = [
+    "How does the fatigue strength of the first option compare with the second?",
+    "Can the recommended material be anodised?",
+]
+
+
+class TurnTimer:
+    """Records the latency of each turn type across all simulated conversations"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.turns: Dict[str, List[float]] = {}
+
+    def time(self, turn: str, func, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self.turns.setdefault(turn, []).append(elapsed_ms)
+
+
+def classify(pf, query: str, need_questions: bool = True):
+    """Mode and initial questions, the way main.py asks for them"""
+    if settings.CONSOLIDATED_PROMPTS and need_questions:
+        return pf.analyze_query(query)
+    mode = pf.determine_query_mode(query)
+    questions = pf.generate_initial_questions(query) if mode == "MATERIAL_SCIENCE" and need_questions else []
+    return mode, questions
+
+
+def simulate_conversation(pf, embeddings, timer: TurnTimer, rng: random.Random, conversational: bool,
+                          think_time: float) -> dict:
+    """
+    Run one conversation through the same calls as the Streamlit app.
+
+    A materials science conversation answers the initial and refined questions, gets a
+    recommendation and asks one follow-up; a conversational one asks a single question.
+    """
+    from src.ai_functions.context_cache import RetrievedContextCache
+    from src.ai_functions.requirements_summary import RequirementsSummary
+
+    def pause():
+        if think_time:
+            time.sleep(rng.uniform(0, 2 * think_time))
+
+    start = time.perf_counter()
+    query = rng.choice(CONVERSATIONAL_QUERIES if conversational else MATERIAL_QUERIES)
+    mode, questions = timer.time("classify", classify, pf, query)
+    if mode == "CONVERSATIONAL":
+        timer.time("conversational_response", pf.generate_conversational_response, query)
+        return {"mode": mode, "turns": 1, "seconds": time.perf_counter() - start}
+
+    # Questions are answered one per turn; only the requirements summary is updated in between, in the background
+    requirements = RequirementsSummary(query) if settings.ROLLING_SUMMARY else None
+    initial_qa = {}
+    for question in questions:
+        pause()
+        initial_qa[question] = rng.choice(ANSWERS)
+        if requirements is not None:
+            requirements.add_answer(question, initial_qa[question])
+    refined = timer.time("refined_questions", pf.generate_refined_questions, query, initial_qa)
+    refined_qa = {}
+    for question in refined:
+        pause()
+        refined_qa[question] = rng.choice(ANSWERS)
+        if requirements is not None:
+            requirements.add_answer(question, refined_qa[question])
+
+    def recommend():
+        summary = requirements.text() if requirements is not None else None
+        sub_queries = None
+        if settings.CONSOLIDATED_PROMPTS:
+            comprehensive_query, sub_queries = pf.create_query_and_sub_queries(query, initial_qa, refined_qa,
+                                                                               requirements_summary=summary)
+        else:
+            comprehensive_query = pf.create_comprehensive_query(query, initial_qa, refined_qa, requirements_summary=summary)
+        cache = RetrievedContextCache(embeddings)
+        pf.generate_material_recommendations(comprehensive_query, context_cache=cache, sub_queries=sub_queries)
+        return comprehensive_query, cache
+
+    comprehensive_query, cache = timer.time("recommendation", recommend)
+
+    pause()
+    follow_up = rng.choice(FOLLOW_UPS)
+
+    def answer_follow_up():
+        new_mode, _ = classify(pf, follow_up, need_questions=False)
+        if new_mode == "MATERIAL_SCIENCE":
+            response = pf.generate_followup_response(
+                follow_up, cache, requirements.text() if requirements is not None else comprehensive_query
+            )
+            if requirements is not None:
+                requirements.add_answer("Follow-up question", follow_up)
+            return response
+        return pf.generate_conversational_response(follow_up)
+
+    timer.time("follow_up", answer_follow_up)
+    return {"mode": mode, "turns": 2 + len(questions) + len(refined), "seconds": time.perf_counter() - start}
+
+
+def run_load_test(conversations: int, concurrency: int, conversational_share: float = 0.2,
+                  think_time: float = 0.0, seed: int = 0, warm_up: bool = True) -> dict:
+    """
+    Simulate concurrent conversations end to end and measure throughput and tail latency.
+
+    Args:
+        conversations (int): Conversations to run
+        concurrency (int): Conversations in flight at once
+        conversational_share (float): Fraction of conversations that are not about materials
+        think_time (float): Mean seconds a simulated user takes to answer each question
+        seed (int): Seed for the conversation mix and answers
+        warm_up (bool): Warm retrieval before the timed run, as the app does at startup
+
+    Returns:
+        dict: Throughput, per-conversation and per-turn latency percentiles, and per-step LLM usage
+    """
+    import src.ai_functions.prompt_functions as pf
+
+    warm_up_stats = pf.warm_up_retrieval() if warm_up else {}
+
+    timer = TurnTimer()
+    seeds = random.Random(seed)
+    plans = [(seeds.random() < conversational_share, seeds.randrange(2 ** 32)) for _ in range(conversations)]
+    results, errors = [], 0
+
+    def run(plan):
+        conversational, conversation_seed = plan
+        return simulate_conversation(pf, pf.sentence_transformer_embeddings, timer, random.Random(conversation_seed),
+                                     conversational, think_time)
+
+    trace_start = time.time()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(run, plan) for plan in plans]
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                errors += 1
+                logger.error(f"Simulated conversation failed: {str(e)}")
+    elapsed = time.perf_counter() - start
+
+    durations = [r["seconds"] * 1000 for r in results]
+    turns = sum(r["turns"] for r in results)
+    llm_steps = summarize_llm_costs(settings.TRACE_FILE, time.time() - trace_start + 1) if settings.TRACING_ENABLED else {}
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "config": {
+            "backend": settings.LLM_BACKEND,
+            "conversations": conversations,
+            "concurrency": concurrency,
+            "conversational_share": conversational_share,
+            "think_time": think_time,
+            "consolidated_prompts": settings.CONSOLIDATED_PROMPTS,
+            "routing": settings.LLM_ROUTING,
+            "rolling_summary": settings.ROLLING_SUMMARY,
+            "rate_limited": settings.LLM_SCHEDULER,
+            "warm_up": warm_up,
+            "local_latency_ms": settings.LOCAL_LLM_LATENCY_MS,
+            "local_tokens_per_second": settings.LOCAL_LLM_TOKENS_PER_SECOND,
+        },
+        "warm_up": warm_up_stats,
+        "elapsed_seconds": elapsed,
+        "errors": errors,
+        "throughput": {
+            "conversations_per_second": len(results) / elapsed if elapsed else 0.0,
+            "turns_per_second": turns / elapsed if elapsed else 0.0,
+            "llm_calls_per_second": sum(s["count"] for s in llm_steps.values()) / elapsed if elapsed else 0.0,
+        },
+        "conversation_latency_ms": {p: percentile(durations, q) for p, q in (("p50", 50), ("p95", 95), ("p99", 99))},
+        "turn_latency_ms": {
+            turn: {"count": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95),
+                   "p99": percentile(values, 99)}
+            for turn, values in sorted(timer.turns.items())
+        },
+        "llm_steps": llm_steps,
+    }
+
+
+def print_report(results: dict):
+    config = results["config"]
+    print("\n" + "=" * 80)
+    print("LOAD TEST")
+    print("=" * 80)
+    print(f"{config['conversations']} conversations, concurrency {config['concurrency']}, {config['backend']} backend, "
+          f"{results['elapsed_seconds']:.1f}s, {results['errors']} errors")
+    if results["warm_up"]:
+        print(f"Retrieval warm-up: {results['warm_up']['seconds']:.2f}s before the run")
+    throughput = results["throughput"]
+    print(f"Throughput: {throughput['conversations_per_second']:.2f} conversations/s, "
+          f"{throughput['turns_per_second']:.2f} turns/s, {throughput['llm_calls_per_second']:.2f} LLM calls/s")
+    latency = results["conversation_latency_ms"]
+    print(f"Conversation latency (ms): p50 {latency['p50']:.0f}  p95 {latency['p95']:.0f}  p99 {latency['p99']:.0f}")
+    print(f"{'turn':<26} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for turn, stats in results["turn_latency_ms"].items():
+        print(f"{turn:<26} {stats['count']:>6} {stats['p50']:>9.0f} {stats['p95']:>9.0f} {stats['p99']:>9.0f}")
+    if results["llm_steps"]:
+        print(f"{'LLM step':<34} {'model':<26} {'calls':>6} {'p95 ms':>9} {'tokens':>8} {'cost $':>10}")
+        for key, stats in results["llm_steps"].items():
+            step, model = key.split(" ", 1)
+            tokens = stats["mean_prompt_tokens"] + stats["mean_completion_tokens"]
+            print(f"{step:<34} {model:<26} {stats['count']:>6} {stats['p95_ms']:>9.0f} {tokens:>8.0f} {stats['cost_usd']:>10.5f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate concurrent MSE-AI conversations and report throughput and tail latency.')
+    parser.add_argument('--conversations', type=int, default=50, help='Conversations to simulate')
+    parser.add_argument('--concurrency', type=int, default=10, help='Conversations in flight at once')
+    parser.add_argument('--conversational-share', type=float, default=0.2, help='Fraction of non-materials conversations')
+    parser.add_argument('--think-time', type=float, default=0.0, help='Mean seconds a user takes per answer')
+    parser.add_argument('--backend', choices=['local', 'groq'], default='local',
+                        help='LLM backend (groq sends real requests and uses quota)')
+    parser.add_argument('--latency-ms', type=float, default=None, help='Local backend median time to first token')
+    parser.add_argument('--latency-sigma', type=float, default=None, help='Local backend log-normal sigma of time to first token')
+    parser.add_argument('--tokens-per-second', type=float, default=None, help='Local backend generation rate')
+    parser.add_argument('--rate-limited', action='store_true',
+                        help='Pace the local backend against the configured per-model rate limits (always on for groq)')
+    parser.add_argument('--no-warm-up', action='store_true',
+                        help='Skip the retrieval warm-up, so the first conversations pay the cold start')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the conversation mix')
+    parser.add_argument('--output', default=None, help='Where to write the JSON results')
+    args = parser.parse_args()
+
+    # Must be set before prompt_functions creates its models
+    settings.LLM_BACKEND = args.backend
+    if args.backend == "local" and not args.rate_limited:
+        # Measure the pipeline itself rather than the provider's quota
+        settings.LLM_SCHEDULER = False
+    if args.latency_ms is not None:
+        settings.LOCAL_LLM_LATENCY_MS = args.latency_ms
+    if args.latency_sigma is not None:
+        settings.LOCAL_LLM_LATENCY_SIGMA = args.latency_sigma
+    if args.tokens_per_second is not None:
+        settings.LOCAL_LLM_TOKENS_PER_SECOND = args.tokens_per_second
+
+    results = run_load_test(args.conversations, args.concurrency, args.conversational_share, args.think_time, args.seed,
+                           warm_up=not args.no_warm_up)
+
+    output_path = args.output or os.path.join(
+        BENCHMARK_OUTPUT_DIR, f"load_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{results['git_commit']}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    print_report(results)
+    print(f"Results saved to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+from typing import Dict
+
+# Add the project root to the system path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from src.data_loader import settings
+from benchmarks.retrieval_benchmark import BENCHMARK_OUTPUT_DIR, git_commit
+
+QUERY = "I want to build a lightweight bicycle frame that can withstand harsh weather conditions"
+QA = "\n".join([
+    "Q: What is the maximum operating temperature the material will be exposed to?\nA: Between -10 C and 60 C.",
+    "Q: What are the strength requirements?\nA: It carries up to 100 kg with impact loads from rough roads.",
+    "Q: Will the material be exposed to corrosive environments?\nA: Rain, UV and occasional salt spray.",
+    "Q: What manufacturing method will be used?\nA: Tube cutting and TIG welding in small batches.",
+])
+REQUIREMENTS = ("A lightweight bicycle frame requiring yield strength above 250 MPa, corrosion resistance to salt spray "
+                "and UV, service from -10 to 60 C, and weldability for small-batch tube fabrication.")
+SEGMENTS = "\n\n---\n\n".join(
+    f"Segment {i}:\n" + "Aluminium alloy 6061-T6 has a density of 2.7 g/cm3 and a yield strength of 276 MPa. " * 12
+    for i in range(1, 9)
+)
+
+# Representative inputs of each step
+SAMPLE_INPUTS = {
+    "determine_query_mode": {"query": QUERY},
+    "analyze_query": {"query": QUERY},
+    "generate_initial_questions": {"query": QUERY},
+    "generate_refined_questions": {"original_query": QUERY, "question_answers": QA},
+    "create_comprehensive_query": {"original_query": QUERY, "requirements": QA},
+    "update_requirements_summary": {"original_query": QUERY, "max_words": 225, "summary": REQUIREMENTS, "new_answers": QA},
+    "generate_sub_queries": {"comprehensive_query": REQUIREMENTS},
+    "create_query_and_sub_queries": {"original_query": QUERY, "requirements": QA},
+    "generate_conversational_response": {"query": "Can you explain how compound interest works?"},
+    "material_analysis": {"comprehensive_query": REQUIREMENTS, "sub_queries": "- " + REQUIREMENTS, "retrieved_texts": SEGMENTS},
+    "followup_response": {"comprehensive_query": REQUIREMENTS, "query": "Can it be anodised?", "retrieved_texts": SEGMENTS},
+}
+
+
+def run_prompt_benchmark(iterations: int = 2000) -> dict:
+    """
+    Measure chain construction overhead and the static share of the tokens sent per step.
+
+    Construction is timed both ways: building a PromptTemplate, parser and chain on every
+    call (as each step used to), and looking up the chain built once. Prompt tokens are
+    estimated from the rendered prompt, split into the static system message, which is
+    identical on every call and can be served from a provider's prompt cache, and the
+    per-call inputs.
+
+    Args:
+        iterations (int): Constructions timed per step
+
+    Returns:
+        dict: Per-step construction time in microseconds and prompt token counts
+    """
+    from langchain_core.prompts.prompt import PromptTemplate
+    import src.ai_functions.prompt_functions as pf
+
+    steps = {}
+    for step, inputs in SAMPLE_INPUTS.items():
+        template, parser, json_mode = pf.STEP_PROMPTS[step]
+        llm = pf.get_llm(pf.step_tier(step))
+        model = pf._json_mode(llm) if json_mode else llm
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            PromptTemplate(input_variables=list(inputs), template=template) | model | parser.model_copy()
+        per_call_us = (time.perf_counter() - start) / iterations * 1e6
+
+        pf.get_chain(step, llm)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            pf.get_chain(step, llm)
+        reused_us = (time.perf_counter() - start) / iterations * 1e6
+
+        prompt_tokens = pf.estimate_tokens(pf.COMPILED_PROMPTS[step].format(**inputs))
+        static_tokens = pf.STATIC_PROMPT_TOKENS[step]
+        steps[step] = {
+            "per_call_build_us": per_call_us,
+            "reused_chain_us": reused_us,
+            "prompt_tokens": prompt_tokens,
+            "static_prompt_tokens": static_tokens,
+            "dynamic_prompt_tokens": prompt_tokens - static_tokens,
+            "static_share": static_tokens / prompt_tokens if prompt_tokens else 0.0,
+        }
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "config": {"iterations": iterations},
+        "steps": steps,
+    }
+
+
+def print_report(results: dict):
+    print("\n" + "=" * 80)
+    print("PROMPT CONSTRUCTION AND TOKENS")
+    print("=" * 80)
+    print(f"{'step':<34} {'build us':>9} {'reuse us':>9} {'prompt':>7} {'static':>7} {'inputs':>7} {'static %':>9}")
+    for step, stats in results["steps"].items():
+        print(f"{step:<34} {stats['per_call_build_us']:>9.1f} {stats['reused_chain_us']:>9.2f} {stats['prompt_tokens']:>7} "
+              f"{stats['static_prompt_tokens']:>7} {stats['dynamic_prompt_tokens']:>7} {stats['static_share'] * 100:>8.0f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure prompt chain construction overhead and cacheable prompt tokens per step.')
+    parser.add_argument('--iterations', type=int, default=2000, help='Constructions timed per step')
+    parser.add_argument('--output', default=None, help='Where to write the JSON results')
+    args = parser.parse_args()
+
+    # Chains are only built, never invoked, so no API key or quota is needed
+    settings.LLM_BACKEND = "local"
+    results = run_prompt_benchmark(args.iterations)
+
+    output_path = args.output or os.path.join(
+        BENCHMARK_OUTPUT_DIR, f"prompts_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{results['git_commit']}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    print_report(results)
+    print(f"Results saved to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
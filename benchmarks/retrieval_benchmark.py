@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# Add the project root to the system path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from loguru import logger
+from langchain_community.vectorstores import FAISS
+from src.data_loader import settings
+from src.data_loader.doc_indexer import retrieve_documents
+from src.data_loader.query_embeddings import get_embeddings
+from src.data_loader.sharded_index import index_exists, shard_paths
+from src.monitoring.tracing import percentile
+
+DEFAULT_QUERY_SET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "retrieval_queries.json")
+BENCHMARK_OUTPUT_DIR = os.path.join(settings.OUTPUT_DIR, "benchmarks")
+
+
+def load_query_set(path: str) -> List[dict]:
+    """
+    Load a labelled query set.
+
+    Each entry has a "query" and a list of "expected" matches, each with a doc_name and
+    optionally the "pages" (the 0-based `page` metadata) that count as relevant.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["queries"]
+
+
+def is_relevant(metadata: dict, expected: List[dict]) -> bool:
+    """Whether a retrieved chunk's metadata matches any expected doc_name/page"""
+    for match in expected:
+        if metadata.get("doc_name") != match.get("doc_name"):
+            continue
+        pages = match.get("pages")
+        if not pages or metadata.get("page") in pages:
+            return True
+    return False
+
+
+def first_relevant_rank(metadatas: List[dict], expected: List[dict]) -> Optional[int]:
+    """1-based rank of the first relevant result, or None if nothing relevant was retrieved"""
+    for rank, metadata in enumerate(metadatas, 1):
+        if is_relevant(metadata, expected):
+            return rank
+    return None
+
+
+def summarize_run(per_query: List[dict], k: int) -> dict:
+    """Aggregate recall@k, MRR and latency percentiles from per-query results"""
+    latencies = [item["latency_ms"] for item in per_query]
+    ranks = [item["first_relevant_rank"] for item in per_query]
+    return {
+        "queries": len(per_query),
+        # Fraction of queries with at least one relevant chunk in the top k
+        f"recall_at_{k}": sum(1 for r in ranks if r is not None and r <= k) / max(len(ranks), 1),
+        "mrr": sum(1.0 / r for r in ranks if r is not None) / max(len(ranks), 1),
+        "latency_ms": {
+            "mean": sum(latencies) / max(len(latencies), 1),
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+        },
+        "per_query": per_query,
+    }
+
+
+def measure_index_load(index_path: str, embeddings) -> tuple:
+    """Load every shard once and return (load seconds, list of vector stores)"""
+    start = time.perf_counter()
+    vector_stores = [
+        FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+        for path in shard_paths(index_path)
+    ]
+    return time.perf_counter() - start, vector_stores
+
+
+def benchmark_retrieve_documents(queries: List[dict], embeddings, k: int, adaptive: bool = False) -> dict:
+    """
+    Run every labelled query through retrieve_documents.
+
+    With adaptive k, recall is counted at settings.ADAPTIVE_MAX_K and the mean number of
+    results kept is reported, so thresholds can be tuned for recall against context size.
+    """
+    per_query = []
+    for item in queries:
+        start = time.perf_counter()
+        docs = retrieve_documents(embeddings=embeddings, query=item["query"], k=k, adaptive=adaptive)
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        metadatas = [doc.metadata for doc in docs]
+        per_query.append({
+            "query": item["query"],
+            "latency_ms": latency_ms,
+            "retrieved": [{"doc_name": m.get("doc_name"), "page": m.get("page")} for m in metadatas],
+            "first_relevant_rank": first_relevant_rank(metadatas, item["expected"]),
+        })
+    if not adaptive:
+        return summarize_run(per_query, k)
+    run = summarize_run(per_query, settings.ADAPTIVE_MAX_K)
+    run["mean_k"] = sum(len(item["retrieved"]) for item in per_query) / max(len(per_query), 1)
+    return run
+
+
+def benchmark_search_materials_database(queries: List[dict], vector_stores: list, k: int) -> dict:
+    """
+    Run every labelled query through search_materials_database.
+
+    That function returns bare text, so results are mapped back to chunk metadata
+    through the index's docstore.
+    """
+    from src.ai_functions.prompt_functions import search_materials_database
+
+    metadata_by_text = {
+        doc.page_content: doc.metadata
+        for vector_store in vector_stores for doc in vector_store.docstore._dict.values()
+    }
+
+    per_query = []
+    for item in queries:
+        start = time.perf_counter()
+        texts = search_materials_database([item["query"]])
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        metadatas = [metadata_by_text.get(text, {}) for text in texts]
+        per_query.append({
+            "query": item["query"],
+            "latency_ms": latency_ms,
+            "retrieved": [{"doc_name": m.get("doc_name"), "page": m.get("page")} for m in metadatas],
+            "first_relevant_rank": first_relevant_rank(metadatas, item["expected"]),
+        })
+    return summarize_run(per_query, k)
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB (ru_maxrss is KB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=project_root, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def find_regressions(results: dict, baseline: dict, max_quality_drop: float, max_latency_increase: float) -> List[str]:
+    """
+    Compare a run against a baseline run.
+
+    Args:
+        results (dict): Current benchmark results
+        baseline (dict): Results of a previous run
+        max_quality_drop (float): Allowed absolute drop in recall@k and MRR
+        max_latency_increase (float): Allowed relative increase in p95 latency (0.5 = +50%)
+
+    Returns:
+        List[str]: Human-readable descriptions of every regression found
+    """
+    regressions = []
+    for target in ("retrieve_documents", "retrieve_documents_adaptive", "search_materials_database"):
+        current, previous = results.get(target), baseline.get(target)
+        if not current or not previous:
+            continue
+
+        for metric in [m for m in current if m.startswith("recall_at_")] + ["mrr"]:
+            if metric in previous and current[metric] < previous[metric] - max_quality_drop:
+                regressions.append(f"{target} {metric} dropped {previous[metric]:.3f} -> {current[metric]:.3f}")
+
+        current_p95, previous_p95 = current["latency_ms"]["p95"], previous["latency_ms"]["p95"]
+        if previous_p95 and current_p95 > previous_p95 * (1 + max_latency_increase):
+            regressions.append(f"{target} p95 latency rose {previous_p95:.1f}ms -> {current_p95:.1f}ms")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark retrieval quality and latency against a labelled query set.')
+    parser.add_argument('--queries', default=DEFAULT_QUERY_SET, help='Labelled query set (JSON)')
+    parser.add_argument('--index', default=os.path.join(settings.DOC_INDEXES_DIR, settings.DEFAULT_CORPUS), help='Index directory')
+    parser.add_argument('--k', type=int, default=5, help='Results per query for retrieve_documents')
+    parser.add_argument('--adaptive', action='store_true', help='Also benchmark retrieve_documents with adaptive k')
+    parser.add_argument('--skip-search', action='store_true', help='Skip the search_materials_database benchmark (needs the LLM module)')
+    parser.add_argument('--output', default=None, help='Where to write the JSON results')
+    parser.add_argument('--baseline', default=None, help='Previous results to compare against; exit 1 on regression')
+    parser.add_argument('--max-quality-drop', type=float, default=0.05, help='Allowed absolute drop in recall@k/MRR')
+    parser.add_argument('--max-latency-increase', type=float, default=0.5, help='Allowed relative p95 latency increase')
+    args = parser.parse_args()
+
+    if not index_exists(args.index):
+        logger.error(f"Index not found at {args.index}. Please run: python index_data.py --rebuild")
+        sys.exit(1)
+
+    queries = load_query_set(args.queries)
+    embeddings = get_embeddings()
+
+    index_load_seconds, vector_stores = measure_index_load(args.index, embeddings)
+    index_vectors = sum(vector_store.index.ntotal for vector_store in vector_stores)
+    logger.info(f"Index with {index_vectors} vectors in {len(vector_stores)} shards loaded in {index_load_seconds:.3f}s")
+
+    results = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "config": {
+            "index": args.index,
+            "index_vectors": index_vectors,
+            "index_shards": len(vector_stores),
+            "query_set": os.path.abspath(args.queries),
+            "k": args.k,
+            "adaptive": {
+                "min_k": settings.ADAPTIVE_MIN_K,
+                "max_k": settings.ADAPTIVE_MAX_K,
+                "min_similarity": settings.ADAPTIVE_MIN_SIMILARITY,
+                "max_gap": settings.ADAPTIVE_MAX_GAP,
+                "margin": settings.ADAPTIVE_MARGIN,
+            } if args.adaptive else None,
+        },
+        "index_load_seconds": index_load_seconds,
+        "retrieve_documents": benchmark_retrieve_documents(queries, embeddings, args.k),
+    }
+    if args.adaptive:
+        results["retrieve_documents_adaptive"] = benchmark_retrieve_documents(queries, embeddings, args.k, adaptive=True)
+
+    if not args.skip_search:
+        try:
+            # search_materials_database asks for 3 results per sub-query
+            results["search_materials_database"] = benchmark_search_materials_database(queries, vector_stores, 3)
+        except Exception as e:
+            logger.error(f"search_materials_database benchmark failed: {str(e)}")
+
+    results["peak_rss_mb"] = peak_rss_mb()
+
+    output_path = args.output or os.path.join(
+        BENCHMARK_OUTPUT_DIR, f"retrieval_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{results['git_commit']}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    print("\n" + "=" * 80)
+    print("RETRIEVAL BENCHMARK")
+    print("=" * 80)
+    print(f"Index load: {index_load_seconds:.3f}s   Peak RSS: {results['peak_rss_mb']:.0f} MB")
+    for target in ("retrieve_documents", "retrieve_documents_adaptive", "search_materials_database"):
+        run = results.get(target)
+        if not run:
+            continue
+        recall_key = next(m for m in run if m.startswith("recall_at_"))
+        print(f"{target:<28} {recall_key}={run[recall_key]:.3f}  MRR={run['mrr']:.3f}  "
+              f"p50={run['latency_ms']['p50']:.1f}ms  p95={run['latency_ms']['p95']:.1f}ms"
+              + (f"  mean k={run['mean_k']:.1f}" if "mean_k" in run else ""))
+    print(f"Results saved to {output_path}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.max_quality_drop, args.max_latency_increase)
+        if regressions:
+            for regression in regressions:
+                logger.error(f"Regression: {regression}")
+            sys.exit(1)
+        logger.success(f"No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
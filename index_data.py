@@ -1,7 +1,6 @@
 import os
 import sys
 import argparse
-import shutil
 from loguru import logger
 from dotenv import load_dotenv
 
@@ -13,6 +12,14 @@ sys.path.insert(0, project_root)
 from src.data_loader.doc_loader import load_initial_data
 from src.ai_functions.prompt_functions import sentence_transformer_embeddings
 from src.data_loader import settings
+from src.data_loader.extraction_cache import clear_extraction_cache
+from src.data_loader.index_versions import format_versions, rollback
+from src.data_loader.vector_compression import INDEX_TYPES
+from src.data_loader.ingestion import IngestionQueue, IngestionWorker
+from src.data_loader.corpus_watcher import CorpusWatcher
+from src.data_loader.corpus_registry import corpus_data_dir, corpus_path, describe_corpus, list_corpora, read_corpora
+from src.monitoring.metrics import write_textfile
+from benchmarks.indexing_benchmark import add_benchmark_arguments, run_from_args
 
 # Load environment variables
 load_dotenv()
@@ -20,43 +27,118 @@ load_dotenv()
 # Setup logging
 logger.add("logs/indexing.log", rotation="500 MB")
 
+def watch(args):
+    """Watch a corpus's source directory and index changes as they happen, until interrupted"""
+    if args.corpus == settings.DEFAULT_CORPUS:
+        queue = IngestionQueue()
+        # A dedicated indexing process has no chat to yield to, so the worker runs flat out
+        worker = IngestionWorker(sentence_transformer_embeddings, queue, duty_cycle=1.0)
+    else:
+        # Other corpora get their own job queue, drop folder and uploads, so the app's worker never sees them
+        data_dir = corpus_data_dir(args.corpus)
+        queue = IngestionQueue(os.path.join(os.path.dirname(settings.INGESTION_DB), f"{args.corpus}.sqlite3"))
+        worker = IngestionWorker(sentence_transformer_embeddings, queue, drop_dir=os.path.join(settings.TEMP_DIR, args.corpus),
+                                 uploads_dir=os.path.join(data_dir, "uploads"), index_root=corpus_path(args.corpus),
+                                 duty_cycle=1.0)
+    watcher = CorpusWatcher(queue, corpus_data_dir(args.corpus), index_root=corpus_path(args.corpus), on_queued=worker.wake)
+    worker.start()
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        logger.info("Stopping the corpus watcher")
+    finally:
+        watcher.stop()
+        worker.stop()
+
+
 def main():
     """Index all supported files in the data directory"""
     parser = argparse.ArgumentParser(description='Index documents for the materials engineering knowledge base.')
-    parser.add_argument('--rebuild', action='store_true', help='Rebuild the index from scratch')
+    parser.add_argument('--corpus', default=settings.DEFAULT_CORPUS,
+                        help='Corpus to index or manage (sources in corpora/<name>/ for corpora other than the default)')
+    parser.add_argument('--describe', metavar='TEXT', help="Record what the corpus covers, used to route queries to it, and exit")
+    parser.add_argument('--list-corpora', action='store_true', help='List the indexed corpora and exit')
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild the index from scratch (published as a new version)')
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep running and apply additions, changes and deletions in the data directory to the live index')
+    parser.add_argument('--list-versions', action='store_true', help='List the published index versions and exit')
+    parser.add_argument('--rollback', nargs='?', const='previous', metavar='VERSION',
+                        help='Make an earlier index version live (defaults to the previous one) and exit')
+    parser.add_argument('--chunker', choices=['recursive', 'structure'], default=settings.CHUNKER,
+                        help='Chunking strategy: fixed-size splits or structure-aware (tables kept whole)')
+    parser.add_argument('--index-type', choices=INDEX_TYPES, default=settings.INDEX_TYPE,
+                        help='Embedding storage: float32, float16, 8-bit scalar or product quantization')
+    parser.add_argument('--clear-extraction-cache', action='store_true', help='Discard cached page extractions before indexing')
+    parser.add_argument('--benchmark', action='store_true', help='Benchmark indexing throughput per stage instead of indexing')
+    add_benchmark_arguments(parser)
     args = parser.parse_args()
     
+    if args.benchmark:
+        # Builds into a scratch directory; the live index is left untouched
+        run_from_args(args, sentence_transformer_embeddings)
+        return
+    
+    if args.list_corpora:
+        descriptions = read_corpora()
+        for corpus in list_corpora():
+            print(f"{corpus:<24} {descriptions.get(corpus, {}).get('description', '')}")
+        return
+    try:
+        index_root = corpus_path(args.corpus)
+    except ValueError as e:
+        logger.error(str(e))
+        sys.exit(1)
+    if args.describe:
+        describe_corpus(args.corpus, args.describe)
+        logger.info(f"Recorded the description of corpus {args.corpus}")
+        return
+    if args.list_versions:
+        print(format_versions(index_root))
+        return
+    if args.rollback:
+        try:
+            rollback(index_root, None if args.rollback == 'previous' else args.rollback)
+        except Exception as e:
+            logger.error(f"Rollback failed: {str(e)}")
+            sys.exit(1)
+        return
+    if args.watch:
+        watch(args)
+        return
+    
     try:
         logger.info("Starting data indexing process...")
         
         # Create necessary directories
         os.makedirs("logs", exist_ok=True)
-        os.makedirs("output/doc_indexes", exist_ok=True)
+        os.makedirs(settings.DOC_INDEXES_DIR, exist_ok=True)
         
-        # Handle rebuilding the index if requested
+        if args.clear_extraction_cache:
+            clear_extraction_cache()
+        
+        # A rebuild starts a new version from scratch; the live index keeps serving until it is published
         if args.rebuild:
-            unified_index_path = os.path.join(settings.DOC_INDEXES_DIR, "materials_database")
-            if os.path.exists(unified_index_path):
-                logger.info(f"Removing existing unified index at {unified_index_path}")
-                shutil.rmtree(unified_index_path, ignore_errors=True)
-                logger.success("Existing index removed for rebuilding")
-            else:
-                logger.info("No existing index found to rebuild")
+            logger.info(f"Rebuilding {index_root} as a new version")
         
         # Load and index all supported files
-        indices = load_initial_data(sentence_transformer_embeddings)
+        indices = load_initial_data(sentence_transformer_embeddings, args.chunker, rebuild=args.rebuild,
+                                    index_type=args.index_type, corpus=args.corpus)
         
         if indices:
-            logger.success(f"Successfully indexed documents into unified database:")
+            logger.success(f"Successfully indexed documents into corpus {args.corpus}:")
             for idx_path in indices:
                 logger.info(f"  - {idx_path}")
         else:
-            logger.warning("No files were indexed. Please check the data directory.")
+            logger.warning(f"No files were indexed. Please check {corpus_data_dir(args.corpus)}.")
             
     except Exception as e:
         logger.error(f"Error during indexing process: {str(e)}")
         sys.exit(1)
         
+    # Leave the indexing metrics for the node_exporter textfile collector
+    if settings.METRICS_ENABLED:
+        logger.info(f"Metrics written to {write_textfile()}")
+    
     logger.info("Indexing process completed.")
 
 if __name__ == "__main__":
@@ -12,13 +12,30 @@ sys.path.insert(0, project_root)
 # Import project modules
 from src.data_loader.doc_loader import load_initial_data
 from src.ai_functions.prompt_functions import (
+    analyze_query,
     determine_query_mode,
     generate_conversational_response,
     generate_initial_questions,
     generate_refined_questions,
     create_comprehensive_query,
+    create_query_and_sub_queries,
     generate_material_recommendations,
-    sentence_transformer_embeddings
+    generate_followup_response,
+    sentence_transformer_embeddings,
+    start_retrieval_warm_up
+)
+from src.ai_functions.context_cache import RetrievedContextCache
+from src.ai_functions.requirements_summary import RequirementsSummary
+from src.monitoring.tracing import span
+from src.monitoring.metrics import start_metrics_server
+from src.data_loader import settings
+from src.data_loader.corpus_registry import list_corpora
+from src.data_loader.ingestion import (
+    SUPPORTED_EXTENSIONS,
+    foreground_activity,
+    format_stats,
+    start_ingestion_worker,
+    store_upload,
 )
 
 # Load environment variables
@@ -27,6 +44,17 @@ load_dotenv()
 # Setup logging
 logger.add("logs/app.log", rotation="500 MB")
 
+# Expose Prometheus metrics on a local port (no-op on Streamlit reruns)
+if settings.METRICS_ENABLED:
+    start_metrics_server()
+
+# Load the index and warm the embedding model before the first query (no-op on Streamlit reruns)
+if settings.RETRIEVAL_WARM_UP:
+    start_retrieval_warm_up()
+
+# Index uploaded and dropped-in files in the background (no-op on Streamlit reruns)
+ingestion_worker = start_ingestion_worker(sentence_transformer_embeddings) if settings.INGESTION_ENABLED else None
+
 def initialize_session_state():
     """Initialize session state variables"""
     if 'conversation' not in st.session_state:
@@ -62,6 +90,25 @@ def initialize_session_state():
     # Material recommendations state
     if 'recommendation_provided' not in st.session_state:
         st.session_state.recommendation_provided = False
+    
+    # Requirements and retrieved context reused by follow-up questions
+    if 'comprehensive_query' not in st.session_state:
+        st.session_state.comprehensive_query = ""
+    
+    if 'context_cache' not in st.session_state:
+        st.session_state.context_cache = None
+    
+    # Running summary of the requirements gathered in this session
+    if 'requirements' not in st.session_state:
+        st.session_state.requirements = None
+    
+    # Corpora searched in this session (kept across "Start New Conversation")
+    if 'corpora' not in st.session_state:
+        st.session_state.corpora = [settings.DEFAULT_CORPUS]
+    
+    # Uploaded files already handed to the ingestion queue (the uploader re-sends them on every rerun)
+    if 'queued_uploads' not in st.session_state:
+        st.session_state.queued_uploads = set()
 
 
 def reset_session_state():
@@ -84,6 +131,273 @@ def reset_session_state():
         st.session_state.original_query = ""
     if 'recommendation_provided' in st.session_state:
         st.session_state.recommendation_provided = False
+    if 'comprehensive_query' in st.session_state:
+        st.session_state.comprehensive_query = ""
+    if 'context_cache' in st.session_state:
+        st.session_state.context_cache = None
+    if 'requirements' in st.session_state:
+        st.session_state.requirements = None
+
+
+def classify_query(query: str, need_questions: bool = True):
+    """
+    Mode of a query and, for materials science queries, the initial questions.
+    
+    With consolidated prompts both come from one LLM call; need_questions=False skips
+    generating questions that are unlikely to be used.
+    """
+    if settings.CONSOLIDATED_PROMPTS and need_questions:
+        return analyze_query(query)
+    mode = determine_query_mode(query)
+    questions = generate_initial_questions(query) if mode == "MATERIAL_SCIENCE" and need_questions else []
+    return mode, questions
+
+
+def start_requirements_summary(original_query: str):
+    """Start the running requirements summary of a new materials science session"""
+    st.session_state.requirements = RequirementsSummary(original_query) if settings.ROLLING_SUMMARY else None
+
+
+def add_to_requirements_summary(question: str, answer: str):
+    """Fold a user message into the running requirements summary in the background"""
+    if st.session_state.requirements is not None:
+        st.session_state.requirements.add_answer(question, answer)
+
+
+def render_assistant_message(response: str):
+    """Add an assistant reply to the conversation and render it"""
+    st.session_state.conversation.append({"role": "assistant", "content": response})
+    with span("streamlit_render", chars=len(response)):
+        with st.chat_message("assistant"):
+            st.write(response)
+
+
+def handle_user_input(user_input: str):
+    """Process a single user message according to the current conversation mode"""
+    # Add user message to conversation
+    st.session_state.conversation.append({"role": "user", "content": user_input})
+    
+    # Display user message
+    with st.chat_message("user"):
+        st.write(user_input)
+    
+    # If this is a new query (no mode set yet)
+    if st.session_state.mode is None:
+        with st.spinner("Analyzing your query..."):
+            # Determine if the query is conversational or materials science focused
+            mode, questions = classify_query(user_input)
+            st.session_state.mode = mode
+            logger.info(f"Query mode determined: {mode}")
+            
+            if mode == "CONVERSATIONAL":
+                # Generate a conversational response
+                response = generate_conversational_response(user_input)
+                
+                render_assistant_message(response)
+            
+            else:  # MATERIAL_SCIENCE mode
+                # Store the original query and the initial questions
+                st.session_state.original_query = user_input
+                st.session_state.initial_questions = questions
+                start_requirements_summary(user_input)
+                
+                # Display the first question
+                response = "Thank you for your materials science question. To provide the best recommendation, I'll need some additional information. Let's start with:"
+                response += f"\n\n{questions[0]}"
+                
+                render_assistant_message(response)
+    
+    # Handle follow-up responses in MATERIAL_SCIENCE mode - initial questions
+    elif st.session_state.mode == "MATERIAL_SCIENCE" and not st.session_state.initial_questions_answered:
+        # Store the user's answer to the current question
+        current_question_index = len(st.session_state.initial_qa)
+        current_question = st.session_state.initial_questions[current_question_index]
+        
+        # Handle empty answers or "none"/"nil" with a default assumption
+        if user_input.lower() in ["none", "nil", ""] or user_input.isspace():
+            user_input = "No specific requirement provided. Please make a best assumption."
+        
+        st.session_state.initial_qa[current_question] = user_input
+        add_to_requirements_summary(current_question, user_input)
+        
+        # Check if we have more initial questions to ask
+        if current_question_index + 1 < len(st.session_state.initial_questions):
+            # Ask the next question
+            next_question = st.session_state.initial_questions[current_question_index + 1]
+            response = f"Thank you. Next question:\n\n{next_question}"
+            
+            render_assistant_message(response)
+        else:
+            # All initial questions answered, generate refined questions
+            st.session_state.initial_questions_answered = True
+            
+            with st.spinner("Analyzing your responses and generating follow-up questions..."):
+                # Generate refined questions
+                refined_questions = generate_refined_questions(
+                    st.session_state.original_query,
+                    st.session_state.initial_qa
+                )
+                st.session_state.refined_questions = refined_questions
+                
+                # Ask the first refined question
+                response = "Great! Based on your answers, I have a few more specific questions to better understand your requirements:"
+                response += f"\n\n{refined_questions[0]}"
+                
+                render_assistant_message(response)
+    
+    # Handle follow-up responses in MATERIAL_SCIENCE mode - refined questions
+    elif st.session_state.mode == "MATERIAL_SCIENCE" and st.session_state.initial_questions_answered and not st.session_state.refined_questions_answered:
+        # Store the user's answer to the current refined question
+        current_question_index = len(st.session_state.refined_qa)
+        current_question = st.session_state.refined_questions[current_question_index]
+        
+        # Handle empty answers or "none"/"nil" with a default assumption
+        if user_input.lower() in ["none", "nil", ""] or user_input.isspace():
+            user_input = "No specific requirement provided. Please make a best assumption."
+        
+        st.session_state.refined_qa[current_question] = user_input
+        add_to_requirements_summary(current_question, user_input)
+        
+        # Check if we have more refined questions to ask
+        if current_question_index + 1 < len(st.session_state.refined_questions):
+            # Ask the next refined question
+            next_question = st.session_state.refined_questions[current_question_index + 1]
+            response = f"Thank you. Next question:\n\n{next_question}"
+            
+            render_assistant_message(response)
+        else:
+            # All refined questions answered, generate material recommendations
+            st.session_state.refined_questions_answered = True
+            
+            with st.spinner("Analyzing your requirements and searching for optimal materials..."):
+                # Create comprehensive query (and, consolidated, the search sub-queries) from all answers,
+                # or from their running summary
+                requirements_summary = st.session_state.requirements.text() if st.session_state.requirements else None
+                sub_queries = None
+                if settings.CONSOLIDATED_PROMPTS:
+                    comprehensive_query, sub_queries = create_query_and_sub_queries(
+                        st.session_state.original_query,
+                        st.session_state.initial_qa,
+                        st.session_state.refined_qa,
+                        requirements_summary=requirements_summary
+                    )
+                else:
+                    comprehensive_query = create_comprehensive_query(
+                        st.session_state.original_query,
+                        st.session_state.initial_qa,
+                        st.session_state.refined_qa,
+                        requirements_summary=requirements_summary
+                    )
+                
+                st.session_state.comprehensive_query = comprehensive_query
+                st.session_state.context_cache = RetrievedContextCache(sentence_transformer_embeddings)
+                
+                # Generate material recommendations
+                recommendations = generate_material_recommendations(
+                    comprehensive_query,
+                    context_cache=st.session_state.context_cache,
+                    sub_queries=sub_queries,
+                    corpora=st.session_state.corpora
+                )
+                st.session_state.recommendation_provided = True
+                
+                response = "Based on your requirements, here are my material recommendations:\n\n"
+                response += recommendations
+                response += "\n\nYou can ask follow-up questions about these materials or start a new inquiry at any time."
+                
+                render_assistant_message(response)
+    
+    # Handle follow-up questions after recommendations are provided or in conversational mode
+    elif (st.session_state.mode == "MATERIAL_SCIENCE" and st.session_state.recommendation_provided) or st.session_state.mode == "CONVERSATIONAL":
+        with st.spinner("Processing your question..."):
+            # Check if we should switch modes for this follow-up question
+            # (questions are only generated alongside when a switch to MATERIAL_SCIENCE is possible)
+            new_mode, questions = classify_query(user_input, need_questions=st.session_state.mode == "CONVERSATIONAL")
+            
+            if new_mode != st.session_state.mode:
+                # Mode has changed, reset the flow
+                reset_session_state()
+                st.session_state.mode = new_mode
+                
+                if new_mode == "CONVERSATIONAL":
+                    # Generate a conversational response
+                    response = generate_conversational_response(user_input)
+                    
+                    render_assistant_message(response)
+                else:  # Switched to MATERIAL_SCIENCE mode
+                    # Store the original query and the initial questions
+                    st.session_state.original_query = user_input
+                    st.session_state.initial_questions = questions
+                    start_requirements_summary(user_input)
+                    
+                    # Display the first question
+                    response = "Let me help with your materials science question. To provide the best recommendation, I'll need some additional information. Let's start with:"
+                    response += f"\n\n{questions[0]}"
+                    
+                    render_assistant_message(response)
+            else:
+                # Same mode, treat as a follow-up question
+                if st.session_state.mode == "CONVERSATIONAL":
+                    response = generate_conversational_response(user_input)
+                else:  # MATERIAL_SCIENCE follow-up
+                    # Answer from the segments retrieved for the recommendation, retrieving only what's missing;
+                    # the running summary also holds requirements stated in earlier follow-ups
+                    requirements = st.session_state.requirements
+                    response = generate_followup_response(
+                        user_input,
+                        st.session_state.context_cache,
+                        requirements.text() if requirements else st.session_state.comprehensive_query,
+                        corpora=st.session_state.corpora
+                    )
+                    add_to_requirements_summary("Follow-up question", user_input)
+                
+                render_assistant_message(response)
+
+
+@st.fragment(run_every=3)
+def render_ingestion_status():
+    """Queue depth, progress of the file being indexed and throughput, refreshed in place"""
+    st.caption(format_stats(ingestion_worker.queue.stats()).replace("\n", "  \n"))
+
+
+def render_corpus_selector():
+    """Sidebar choice of the corpora this session searches, shown when more than one is indexed"""
+    corpora = list_corpora()
+    if len(corpora) < 2:
+        return
+    selected = st.sidebar.multiselect(
+        "Corpora to search",
+        corpora,
+        default=[corpus for corpus in st.session_state.corpora if corpus in corpora] or corpora[:1]
+    )
+    st.session_state.corpora = selected or [settings.DEFAULT_CORPUS]
+
+
+def render_document_upload():
+    """Sidebar uploader that queues files for background indexing"""
+    st.sidebar.subheader("Add documents")
+    uploaded_files = st.sidebar.file_uploader(
+        "Textbooks, datasheets or notes",
+        type=[extension.lstrip(".") for extension in SUPPORTED_EXTENSIONS],
+        accept_multiple_files=True
+    )
+    for uploaded_file in uploaded_files or []:
+        upload_id = getattr(uploaded_file, "file_id", uploaded_file.name)
+        if upload_id in st.session_state.queued_uploads:
+            continue
+        try:
+            path = store_upload(uploaded_file.name, uploaded_file.getvalue())
+        except ValueError as e:
+            st.session_state.queued_uploads.add(upload_id)
+            st.sidebar.info(f"Not queued: {str(e)}.")
+            continue
+        if ingestion_worker.queue.enqueue(path) is None:
+            st.sidebar.warning(f"The indexing queue is full; try {uploaded_file.name} again shortly.")
+            continue
+        st.session_state.queued_uploads.add(upload_id)
+        st.sidebar.success(f"Queued {uploaded_file.name}; it becomes searchable once indexed.")
+    with st.sidebar:
+        render_ingestion_status()
 
 
 def main():
@@ -107,6 +421,11 @@ def main():
         reset_session_state()
         st.rerun()
     
+    render_corpus_selector()
+    
+    if ingestion_worker is not None:
+        render_document_upload()
+    
     # Display conversation history
     for message in st.session_state.conversation:
         with st.chat_message(message["role"]):
@@ -116,176 +435,11 @@ def main():
     user_input = st.chat_input("What would you like to ask or discuss?")
     
     if user_input:
-        # Add user message to conversation
-        st.session_state.conversation.append({"role": "user", "content": user_input})
-        
-        # Display user message
-        with st.chat_message("user"):
-            st.write(user_input)
-        
-        # If this is a new query (no mode set yet)
-        if st.session_state.mode is None:
-            with st.spinner("Analyzing your query..."):
-                # Determine if the query is conversational or materials science focused
-                mode = determine_query_mode(user_input)
-                st.session_state.mode = mode
-                logger.info(f"Query mode determined: {mode}")
-                
-                if mode == "CONVERSATIONAL":
-                    # Generate a conversational response
-                    response = generate_conversational_response(user_input)
-                    
-                    st.session_state.conversation.append({"role": "assistant", "content": response})
-                    with st.chat_message("assistant"):
-                        st.write(response)
-                
-                else:  # MATERIAL_SCIENCE mode
-                    # Store the original query
-                    st.session_state.original_query = user_input
-                    
-                    # Generate initial questions
-                    questions = generate_initial_questions(user_input)
-                    st.session_state.initial_questions = questions
-                    
-                    # Display the first question
-                    response = "Thank you for your materials science question. To provide the best recommendation, I'll need some additional information. Let's start with:"
-                    response += f"\n\n{questions[0]}"
-                    
-                    st.session_state.conversation.append({"role": "assistant", "content": response})
-                    with st.chat_message("assistant"):
-                        st.write(response)
-        
-        # Handle follow-up responses in MATERIAL_SCIENCE mode - initial questions
-        elif st.session_state.mode == "MATERIAL_SCIENCE" and not st.session_state.initial_questions_answered:
-            # Store the user's answer to the current question
-            current_question_index = len(st.session_state.initial_qa)
-            current_question = st.session_state.initial_questions[current_question_index]
-            
-            # Handle empty answers or "none"/"nil" with a default assumption
-            if user_input.lower() in ["none", "nil", ""] or user_input.isspace():
-                user_input = "No specific requirement provided. Please make a best assumption."
-            
-            st.session_state.initial_qa[current_question] = user_input
-            
-            # Check if we have more initial questions to ask
-            if current_question_index + 1 < len(st.session_state.initial_questions):
-                # Ask the next question
-                next_question = st.session_state.initial_questions[current_question_index + 1]
-                response = f"Thank you. Next question:\n\n{next_question}"
-                
-                st.session_state.conversation.append({"role": "assistant", "content": response})
-                with st.chat_message("assistant"):
-                    st.write(response)
-            else:
-                # All initial questions answered, generate refined questions
-                st.session_state.initial_questions_answered = True
-                
-                with st.spinner("Analyzing your responses and generating follow-up questions..."):
-                    # Generate refined questions
-                    refined_questions = generate_refined_questions(
-                        st.session_state.original_query,
-                        st.session_state.initial_qa
-                    )
-                    st.session_state.refined_questions = refined_questions
-                    
-                    # Ask the first refined question
-                    response = "Great! Based on your answers, I have a few more specific questions to better understand your requirements:"
-                    response += f"\n\n{refined_questions[0]}"
-                    
-                    st.session_state.conversation.append({"role": "assistant", "content": response})
-                    with st.chat_message("assistant"):
-                        st.write(response)
-        
-        # Handle follow-up responses in MATERIAL_SCIENCE mode - refined questions
-        elif st.session_state.mode == "MATERIAL_SCIENCE" and st.session_state.initial_questions_answered and not st.session_state.refined_questions_answered:
-            # Store the user's answer to the current refined question
-            current_question_index = len(st.session_state.refined_qa)
-            current_question = st.session_state.refined_questions[current_question_index]
-            
-            # Handle empty answers or "none"/"nil" with a default assumption
-            if user_input.lower() in ["none", "nil", ""] or user_input.isspace():
-                user_input = "No specific requirement provided. Please make a best assumption."
-            
-            st.session_state.refined_qa[current_question] = user_input
-            
-            # Check if we have more refined questions to ask
-            if current_question_index + 1 < len(st.session_state.refined_questions):
-                # Ask the next refined question
-                next_question = st.session_state.refined_questions[current_question_index + 1]
-                response = f"Thank you. Next question:\n\n{next_question}"
-                
-                st.session_state.conversation.append({"role": "assistant", "content": response})
-                with st.chat_message("assistant"):
-                    st.write(response)
-            else:
-                # All refined questions answered, generate material recommendations
-                st.session_state.refined_questions_answered = True
-                
-                with st.spinner("Analyzing your requirements and searching for optimal materials..."):
-                    # Create comprehensive query from all answers
-                    comprehensive_query = create_comprehensive_query(
-                        st.session_state.original_query,
-                        st.session_state.initial_qa,
-                        st.session_state.refined_qa
-                    )
-                    
-                    # Generate material recommendations
-                    recommendations = generate_material_recommendations(comprehensive_query)
-                    st.session_state.recommendation_provided = True
-                    
-                    response = "Based on your requirements, here are my material recommendations:\n\n"
-                    response += recommendations
-                    response += "\n\nYou can ask follow-up questions about these materials or start a new inquiry at any time."
-                    
-                    st.session_state.conversation.append({"role": "assistant", "content": response})
-                    with st.chat_message("assistant"):
-                        st.write(response)
-        
-        # Handle follow-up questions after recommendations are provided or in conversational mode
-        elif (st.session_state.mode == "MATERIAL_SCIENCE" and st.session_state.recommendation_provided) or st.session_state.mode == "CONVERSATIONAL":
-            with st.spinner("Processing your question..."):
-                # Check if we should switch modes for this follow-up question
-                new_mode = determine_query_mode(user_input)
-                
-                if new_mode != st.session_state.mode:
-                    # Mode has changed, reset the flow
-                    reset_session_state()
-                    st.session_state.mode = new_mode
-                    
-                    if new_mode == "CONVERSATIONAL":
-                        # Generate a conversational response
-                        response = generate_conversational_response(user_input)
-                        
-                        st.session_state.conversation.append({"role": "assistant", "content": response})
-                        with st.chat_message("assistant"):
-                            st.write(response)
-                    else:  # Switched to MATERIAL_SCIENCE mode
-                        # Store the original query
-                        st.session_state.original_query = user_input
-                        
-                        # Generate initial questions
-                        questions = generate_initial_questions(user_input)
-                        st.session_state.initial_questions = questions
-                        
-                        # Display the first question
-                        response = "Let me help with your materials science question. To provide the best recommendation, I'll need some additional information. Let's start with:"
-                        response += f"\n\n{questions[0]}"
-                        
-                        st.session_state.conversation.append({"role": "assistant", "content": response})
-                        with st.chat_message("assistant"):
-                            st.write(response)
-                else:
-                    # Same mode, treat as a follow-up question
-                    if st.session_state.mode == "CONVERSATIONAL":
-                        response = generate_conversational_response(user_input)
-                    else:  # MATERIAL_SCIENCE follow-up
-                        # For follow-up in material science mode, we'll treat it as a new conversation related to materials
-                        # A more sophisticated approach would use RAG to generate a response based on the vector database
-                        response = generate_conversational_response(user_input)
-                    
-                    st.session_state.conversation.append({"role": "assistant", "content": response})
-                    with st.chat_message("assistant"):
-                        st.write(response)
+        # Trace the whole turn so every stage below shares one trace
+        # The ingestion worker yields the CPU while a turn is in progress
+        with span("chat_turn", mode=st.session_state.mode or "NEW"), foreground_activity():
+            handle_user_input(user_input)
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,131 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+from src.monitoring.metrics import CACHE_REQUESTS_TOTAL
+
+
+class RetrievedContextCache:
+    """
+    Session-scoped cache of retrieved document segments and their embeddings.
+
+    Segments retrieved for a recommendation are kept here so follow-up questions
+    can be answered from the same context. Segments retrieved from the index come with
+    their stored embeddings; the rest are embedded lazily the first time the cache is
+    searched, so populating it adds nothing to the recommendation path.
+    """
+
+    def __init__(self, embeddings, similarity_threshold: float = 0.45, max_segments: int = 60):
+        """
+        Args:
+            embeddings: The embeddings object used to encode segments and queries
+            similarity_threshold (float): Minimum cosine similarity for a cached segment
+                                          to count as covering a question
+            max_segments (int): Maximum number of segments kept; oldest are evicted first
+        """
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.max_segments = max_segments
+
+        self.segments: List[str] = []
+        self._vectors: Optional[np.ndarray] = None
+        self._pending: List[Tuple[str, Optional[np.ndarray]]] = []
+        self._seen = set()
+
+        # Simple counters so callers can tell how often the cache answered on its own
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.segments) + len(self._pending)
+
+    def add_segments(self, segments: List[str], vectors: List[Optional[np.ndarray]] = None) -> int:
+        """
+        Queue new segments for the cache, skipping any already present.
+
+        Args:
+            segments (List[str]): Retrieved text segments
+            vectors (List[Optional[np.ndarray]], optional): Their stored index embeddings, where
+                                                            known; the others are embedded lazily
+
+        Returns:
+            int: Number of segments actually added
+        """
+        vectors = vectors or [None] * len(segments)
+        added = 0
+        for segment, vector in zip(segments, vectors):
+            if not segment or segment in self._seen:
+                continue
+            self._seen.add(segment)
+            self._pending.append((segment, vector))
+            added += 1
+        return added
+
+    def _embed_pending(self):
+        """Embed queued segments without a stored embedding and append them all to the cached matrix"""
+        if not self._pending:
+            return
+
+        segments = [segment for segment, _ in self._pending]
+        missing = [i for i, (_, vector) in enumerate(self._pending) if vector is None]
+        embedded = self.embeddings.embed_documents([segments[i] for i in missing]) if missing else []
+        vectors = [vector for _, vector in self._pending]
+        for i, vector in zip(missing, embedded):
+            vectors[i] = vector
+        if len(missing) < len(segments):
+            logger.info(f"Reused stored embeddings for {len(segments) - len(missing)} of {len(segments)} cached segments")
+        vectors = _normalize(np.asarray(vectors, dtype="float32"))
+
+        self.segments.extend(segments)
+        self._vectors = vectors if self._vectors is None else np.vstack([self._vectors, vectors])
+        self._pending = []
+
+        # Evict the oldest segments once the cache grows past its budget
+        overflow = len(self.segments) - self.max_segments
+        if overflow > 0:
+            for segment in self.segments[:overflow]:
+                self._seen.discard(segment)
+            self.segments = self.segments[overflow:]
+            self._vectors = self._vectors[overflow:]
+            logger.info(f"Evicted {overflow} segments from the context cache")
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """Embed a query with the cache's embeddings and normalize it for cosine scoring"""
+        vector = np.asarray(self.embeddings.embed_query(query), dtype="float32")
+        return _normalize(vector[None, :])[0]
+
+    def search(self, query_vector: np.ndarray, k: int = 4) -> List[Tuple[str, float]]:
+        """
+        Find the cached segments most similar to a query vector.
+
+        Args:
+            query_vector (np.ndarray): Normalized query embedding
+            k (int): Number of segments to return
+
+        Returns:
+            List[Tuple[str, float]]: (segment, cosine similarity) pairs, best first
+        """
+        self._embed_pending()
+        if self._vectors is None or not self.segments:
+            return []
+
+        scores = self._vectors @ query_vector
+        top = np.argsort(-scores)[:k]
+        return [(self.segments[i], float(scores[i])) for i in top]
+
+    def covers(self, query_vector: np.ndarray) -> bool:
+        """Whether at least one cached segment is similar enough to answer the query"""
+        hits = self.search(query_vector, k=1)
+        covered = bool(hits) and hits[0][1] >= self.similarity_threshold
+        if covered:
+            self.hits += 1
+        else:
+            self.misses += 1
+        CACHE_REQUESTS_TOTAL.inc(cache="context", result="hit" if covered else "miss")
+        return covered
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
@@ -0,0 +1,202 @@
+import os
+import sys
+import time
+import heapq
+import itertools
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+# Add the root project directory to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from loguru import logger
+from src.data_loader import settings
+from src.monitoring.metrics import LLM_DEADLINE_EXCEEDED_TOTAL, LLM_QUEUE_DEPTH, LLM_QUEUE_SECONDS
+
+# Lower value is served first
+PRIORITIES = {"interactive": 0, "analysis": 1}
+
+
+class DeadlineExceeded(Exception):
+    """A request could not be sent within its queueing deadline"""
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `capacity` per minute.
+
+    The level may go negative when a request turns out to use more than was reserved;
+    later requests then wait for the debt to be repaid.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available"""
+        self._refill(now)
+        # A request larger than the whole bucket only needs a full bucket
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float, now: float):
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+
+    def adjust(self, delta: float):
+        """Charge (positive) or refund (negative) the difference between used and reserved"""
+        self.level = min(self.capacity, self.level - delta)
+
+    def drain(self, now: float):
+        self._refill(now)
+        self.level = min(self.level, 0.0)
+
+
+@dataclass
+class Reservation:
+    """Capacity taken for one request, settled against the actual usage afterwards"""
+    model: str
+    tokens: int
+    waited_seconds: float
+
+
+class _ModelLane:
+    """Request and token buckets of one model, and the requests waiting for them"""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.paused_until = 0.0
+        self.waiting = []
+        self.condition = threading.Condition()
+
+
+class RequestScheduler:
+    """
+    Client-side pacing of LLM requests under per-model rate limits, shared by all sessions.
+
+    Each model has a requests-per-minute and a tokens-per-minute bucket. A request reserves
+    one request and its estimated tokens before it is sent; if they are not available it
+    waits in a priority queue (interactive steps before long analyses, first come first
+    served within a class) instead of being sent and rejected. A request that cannot start
+    before its deadline fails fast with DeadlineExceeded. After a 429 the model is paused
+    for the provider's retry-after, so queued requests do not pile onto the limit.
+    """
+
+    def __init__(self, limits: Dict[str, Dict[str, float]] = None):
+        """
+        Args:
+            limits (dict, optional): model -> {"rpm": ..., "tpm": ...} (defaults to settings.LLM_RATE_LIMITS;
+                                     models not listed use its "default" entry)
+        """
+        self.limits = limits or settings.LLM_RATE_LIMITS
+        self._lanes: Dict[str, _ModelLane] = {}
+        self._lanes_lock = threading.Lock()
+        self._sequence = itertools.count()
+
+    def _lane(self, model: str) -> _ModelLane:
+        with self._lanes_lock:
+            if model not in self._lanes:
+                limits = self.limits.get(model) or self.limits["default"]
+                self._lanes[model] = _ModelLane(limits["rpm"], limits["tpm"])
+            return self._lanes[model]
+
+    def acquire(self, model: str, tokens: int, priority: str = "interactive", deadline_seconds: float = None) -> Reservation:
+        """
+        Wait until the model has capacity for a request of `tokens` tokens, and reserve it.
+
+        Args:
+            model (str): Model the request is for
+            tokens (int): Estimated prompt plus completion tokens
+            priority (str): A key of PRIORITIES
+            deadline_seconds (float, optional): Longest the request may wait to start (None waits indefinitely)
+
+        Returns:
+            Reservation: To pass to settle() once the actual usage is known
+
+        Raises:
+            DeadlineExceeded: If the request cannot start in time
+        """
+        lane = self._lane(model)
+        start = time.monotonic()
+        deadline = start + deadline_seconds if deadline_seconds is not None else None
+        entry = (PRIORITIES[priority], next(self._sequence))
+
+        with lane.condition:
+            heapq.heappush(lane.waiting, entry)
+            LLM_QUEUE_DEPTH.set(len(lane.waiting), model=model)
+            try:
+                while True:
+                    now = time.monotonic()
+                    if lane.waiting[0] == entry:
+                        wait = max(lane.paused_until - now, lane.requests.wait_time(1, now), lane.tokens.wait_time(tokens, now))
+                        if wait <= 0:
+                            lane.requests.take(1, now)
+                            lane.tokens.take(tokens, now)
+                            waited = now - start
+                            LLM_QUEUE_SECONDS.observe(waited, model=model, priority=priority)
+                            if waited > 1:
+                                logger.info(f"Paced {priority} request to {model} by {waited:.1f}s ({tokens} tokens)")
+                            return Reservation(model, tokens, waited)
+                        # The wait is known in advance, so a request that cannot make its deadline fails now
+                        if deadline is not None and now + wait > deadline:
+                            raise DeadlineExceeded(f"{model} has no capacity for {tokens} tokens within the deadline")
+                    else:
+                        # Woken when the head of the queue is served
+                        wait = 1.0
+                    if deadline is not None:
+                        if now >= deadline:
+                            raise DeadlineExceeded(f"Request to {model} waited {now - start:.1f}s behind other requests")
+                        wait = min(wait, deadline - now)
+                    lane.condition.wait(timeout=wait)
+            except DeadlineExceeded:
+                LLM_DEADLINE_EXCEEDED_TOTAL.inc(model=model, priority=priority)
+                raise
+            finally:
+                lane.waiting.remove(entry)
+                heapq.heapify(lane.waiting)
+                LLM_QUEUE_DEPTH.set(len(lane.waiting), model=model)
+                lane.condition.notify_all()
+
+    def settle(self, reservation: Reservation, actual_tokens: int):
+        """Correct the token bucket by the difference between actual and estimated usage"""
+        if not actual_tokens:
+            return
+        lane = self._lane(reservation.model)
+        with lane.condition:
+            lane.tokens.adjust(actual_tokens - reservation.tokens)
+            lane.condition.notify_all()
+
+    def penalize(self, model: str, retry_after: float):
+        """Pause a model after the provider rejected a request for exceeding its rate limit"""
+        lane = self._lane(model)
+        with lane.condition:
+            now = time.monotonic()
+            lane.paused_until = max(lane.paused_until, now + retry_after)
+            lane.tokens.drain(now)
+        logger.warning(f"Rate limited by the provider; pausing {model} for {retry_after:.1f}s")
+
+    def queue_depth(self, model: str) -> int:
+        return len(self._lane(model).waiting)
+
+
+_scheduler: Optional[RequestScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> RequestScheduler:
+    """The process-wide scheduler, so every session draws from the same rate limits"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler()
+        return _scheduler
@@ -0,0 +1,231 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import functools
+import threading
+from typing import Any, Dict, List, Optional
+
+# Add the root project directory to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from pydantic import Field
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from src.data_loader import settings
+from src.ai_functions import prompts
+
+# Words that make the stand-in classify a query as materials science
+MATERIAL_KEYWORDS = (
+    "material", "alloy", "steel", "alumin", "titanium", "polymer", "plastic", "composite", "ceramic",
+    "metal", "corrosion", "strength", "stiffness", "temperature", "weld", "fatigue", "frame", "bracket",
+    "housing", "beam", "tube", "coating", "casing", "heat", "lightweight",
+)
+
+QUESTION_POOL = [
+    "What is the maximum operating temperature the material will be exposed to?",
+    "What are the strength requirements in terms of tensile, compressive, or impact resistance?",
+    "Will the material be exposed to corrosive chemicals, moisture or salt spray?",
+    "What manufacturing method will be used to form the material (machining, casting, welding, 3D printing)?",
+    "Is weight a critical constraint, and what is the target mass or density?",
+    "What stiffness or maximum deflection is acceptable under the design load?",
+    "How many load cycles must the component survive over its service life?",
+    "What is the acceptable material cost per kg and the expected production volume?",
+]
+
+SUB_QUERY_POOL = [
+    "Materials with high specific stiffness and yield strength above 250 MPa",
+    "Materials resistant to salt spray corrosion and UV exposure",
+    "Weldable alloys such as Ti-6Al-4V and 6061-T6 for tube fabrication",
+    "Materials with fatigue resistance under cyclic loading",
+    "Polymers and composites with service temperatures above 120 C",
+    "Low-cost materials suitable for high-volume casting or moulding",
+]
+
+CANDIDATES = [
+    ("Aluminium alloy 6061-T6", "2.7", "276", "69", "Good", "Low"),
+    ("Titanium alloy Ti-6Al-4V", "4.4", "880", "114", "Excellent", "High"),
+    ("Carbon fibre reinforced polymer", "1.6", "600", "70", "Excellent", "High"),
+    ("Low-alloy steel 4130", "7.85", "435", "205", "Moderate", "Low"),
+    ("Magnesium alloy AZ31B", "1.77", "200", "45", "Poor", "Moderate"),
+]
+
+# System messages already seen per model, standing in for a provider-side prompt prefix cache
+_seen_prefixes = set()
+_seen_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token for English text)"""
+    return max(1, len(text) // 4)
+
+
+@functools.lru_cache(maxsize=1)
+def _static_prefixes() -> Dict[str, str]:
+    """Text of each prompt template before its first variable, by template name"""
+    prefixes = {}
+    for name, value in vars(prompts).items():
+        if name.endswith("_prompt") and isinstance(value, str):
+            prefixes[name] = value.strip().split("{", 1)[0].strip()
+    return prefixes
+
+
+class LocalChatModel(BaseChatModel):
+    """
+    Deterministic offline stand-in for the Groq chat models.
+
+    Recognises which template in prompts.py a request was rendered from and returns a
+    well-formed reply of the shape that prompt asks for. The same prompt always gets the
+    same reply. Each call sleeps for a time-to-first-token drawn from a log-normal
+    distribution, plus the time to generate the reply at a jittered token rate, so load
+    tests see realistic latencies. Token usage is reported like the Groq client reports it,
+    with a repeated system message counted as cached prompt tokens.
+    """
+
+    model_name: str = "local"
+    latency_ms: float = Field(default_factory=lambda: settings.LOCAL_LLM_LATENCY_MS)
+    # Sigma of the log-normal time-to-first-token distribution (0 makes it constant)
+    latency_sigma: float = Field(default_factory=lambda: settings.LOCAL_LLM_LATENCY_SIGMA)
+    tokens_per_second: float = Field(default_factory=lambda: settings.LOCAL_LLM_TOKENS_PER_SECOND)
+    # Relative standard deviation of the token rate between calls
+    tokens_per_second_jitter: float = 0.2
+    seed: int = Field(default_factory=lambda: settings.LOCAL_LLM_SEED)
+
+    @property
+    def _llm_type(self) -> str:
+        return "local-stand-in"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model_name": self.model_name, "latency_ms": self.latency_ms, "tokens_per_second": self.tokens_per_second}
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        # Messages are joined the way the template text separates its static part from its inputs
+        prompt = "\n\n".join(str(message.content) for message in messages)
+        rng = random.Random(hashlib.sha256(f"{self.seed}:{self.model_name}:{prompt}".encode("utf-8")).digest())
+        reply = self.reply_for(prompt, rng)
+
+        prompt_tokens, completion_tokens = estimate_tokens(prompt), estimate_tokens(reply)
+        self._simulate_latency(rng, completion_tokens)
+
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens,
+                 "prompt_tokens_details": {"cached_tokens": self._cached_tokens(messages)}}
+        message = AIMessage(content=reply, usage_metadata={
+            "input_tokens": prompt_tokens, "output_tokens": completion_tokens, "total_tokens": usage["total_tokens"]
+        })
+        return ChatResult(generations=[ChatGeneration(message=message)],
+                          llm_output={"token_usage": usage, "model_name": self.model_name})
+
+    def _cached_tokens(self, messages: List[BaseMessage]) -> int:
+        if not messages or not isinstance(messages[0], SystemMessage):
+            return 0
+        key = (self.model_name, messages[0].content)
+        with _seen_lock:
+            if key not in _seen_prefixes:
+                _seen_prefixes.add(key)
+                return 0
+        return estimate_tokens(messages[0].content)
+
+    def _simulate_latency(self, rng: random.Random, completion_tokens: int):
+        # Drawn from the prompt-seeded RNG, so a run is reproducible end to end
+        first_token_ms = self.latency_ms * rng.lognormvariate(0.0, self.latency_sigma) if self.latency_sigma else self.latency_ms
+        rate = max(1.0, rng.gauss(self.tokens_per_second, self.tokens_per_second * self.tokens_per_second_jitter))
+        delay = first_token_ms / 1000 + completion_tokens / rate
+        if delay > 0:
+            time.sleep(delay)
+
+    # -------------------
+    # REPLIES PER PROMPT
+    # -------------------
+
+    def reply_for(self, prompt: str, rng: random.Random) -> str:
+        """Reply of the shape the recognised prompt asks for"""
+        template = self._match_template(prompt)
+        query = self._field(prompt, "User query") or self._field(prompt, "Original Query") \
+            or self._field(prompt, "Original query") or self._field(prompt, "Follow-up question") or ""
+
+        if template == "query_analysis_prompt":
+            return self._mode(query)
+        if template == "mode_and_questions_prompt":
+            mode = self._mode(query)
+            questions = rng.sample(QUESTION_POOL, 4) if mode == "MATERIAL_SCIENCE" else []
+            return json.dumps({"mode": mode, "confidence": round(rng.uniform(0.7, 0.99), 2), "questions": questions}, indent=2)
+        if template in ("initial_questions_prompt", "question_refiner_prompt"):
+            return json.dumps({"questions": rng.sample(QUESTION_POOL, 4)}, indent=2)
+        if template in ("process_answers_prompt", "requirements_update_prompt"):
+            return self._requirements(query, rng)
+        if template == "material_search_prompt":
+            return json.dumps({"requirements": self._requirements(query, rng),
+                               "sub_queries": rng.sample(SUB_QUERY_POOL, 4)}, indent=2)
+        if template == "requirements_and_search_prompt":
+            return json.dumps({"comprehensive_query": self._requirements(query, rng),
+                               "sub_queries": rng.sample(SUB_QUERY_POOL, 4)}, indent=2)
+        if template == "material_analysis_prompt":
+            return self._recommendation(rng)
+        return self._paragraphs(query, rng, count=2 if template == "general_response_prompt" else 3)
+
+    @staticmethod
+    def _match_template(prompt: str) -> Optional[str]:
+        # The longest matching static prefix wins, since several templates share an opening
+        text = prompt.strip()
+        matches = [(len(prefix), name) for name, prefix in _static_prefixes().items() if prefix and text.startswith(prefix)]
+        return max(matches)[1] if matches else None
+
+    @staticmethod
+    def _field(prompt: str, label: str) -> Optional[str]:
+        match = re.search(rf"^{re.escape(label)}:\s*(.+)$", prompt, re.MULTILINE)
+        return match.group(1).strip() if match else None
+
+    @staticmethod
+    def _mode(query: str) -> str:
+        lowered = query.lower()
+        return "MATERIAL_SCIENCE" if any(keyword in lowered for keyword in MATERIAL_KEYWORDS) else "CONVERSATIONAL"
+
+    @staticmethod
+    def _requirements(query: str, rng: random.Random) -> str:
+        temperature, strength = rng.choice([80, 120, 200, 350]), rng.choice([150, 250, 400, 600])
+        return (f"{query or 'A structural component'} requiring a material with yield strength above {strength} MPa, "
+                f"a maximum service temperature of at least {temperature} C, good corrosion resistance in humid and "
+                f"saline environments, low density for a high strength-to-weight ratio, and compatibility with "
+                f"welding or machining at moderate production volumes.")
+
+    @staticmethod
+    def _recommendation(rng: random.Random) -> str:
+        candidates = rng.sample(CANDIDATES, 3)
+        lines = ["## Recommended Materials", ""]
+        for i, (name, density, strength, modulus, corrosion, cost) in enumerate(candidates, 1):
+            lines += [
+                f"### {i}. {name}",
+                f"- **Key properties**: density {density} g/cm3, yield strength {strength} MPa, Young's modulus {modulus} GPa",
+                f"- **Suitability**: meets the strength-to-weight requirement with {corrosion.lower()} corrosion resistance (Segment {i})",
+                f"- **Limitations**: {cost.lower()} relative cost; check fatigue performance of joints",
+                "- **Processing**: tube drawing, TIG welding or adhesive bonding", "",
+            ]
+        lines += ["## Comparison", "",
+                  "| Material | Density (g/cm3) | Yield strength (MPa) | Modulus (GPa) | Corrosion resistance | Relative cost |",
+                  "|---|---|---|---|---|---|"]
+        lines += [f"| {' | '.join(candidate)} |" for candidate in candidates]
+        lines += ["", "## Recommendation", "",
+                  f"{candidates[0][0]} offers the best balance of the stated requirements; {candidates[1][0]} is the "
+                  f"alternative where budget allows."]
+        return "\n".join(lines)
+
+    @staticmethod
+    def _paragraphs(query: str, rng: random.Random, count: int) -> str:
+        sentences = [
+            "The answer depends on the loading, environment and manufacturing route involved.",
+            "Stiffness-limited designs favour materials with a high E/rho ratio, while strength-limited ones favour sigma_y/rho.",
+            "Corrosion resistance can often be improved with anodising, galvanising or a polymer coating.",
+            "Cost and availability frequently decide between otherwise comparable candidates.",
+            "Fatigue behaviour of joints is usually more critical than that of the parent material.",
+        ]
+        paragraphs = [f"Regarding \"{query}\": {rng.choice(sentences)}" if query else rng.choice(sentences)]
+        paragraphs += [" ".join(rng.sample(sentences, 3)) for _ in range(count - 1)]
+        return "\n\n".join(paragraphs)
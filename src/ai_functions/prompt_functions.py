@@ -3,155 +3,556 @@ from pathlib import Path
 import sys
 from typing import List, Dict, Tuple, Union
 import json
+import re
+import time
+import threading
 
 # Add the root project directory to sys.path
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
 sys.path.insert(0, project_root)
 
 from loguru import logger
-from langchain_core.output_parsers import StrOutputParser, JsonOutputParser
-from langchain_core.prompts.prompt import PromptTemplate
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
 from langchain_groq import ChatGroq
+import groq
 from dotenv import load_dotenv
 from src.data_loader import settings
 from src.ai_functions.prompts import *
 from langchain_huggingface import HuggingFaceEmbeddings
 from sentence_transformers import SentenceTransformer
-from src.data_loader.doc_indexer import retrieve_documents
+from src.data_loader.doc_indexer import retrieve_documents, warm_up_index
+from src.data_loader.query_embeddings import get_embeddings, pin_query_embeddings
+from src.data_loader.corpus_registry import corpus_path, get_registry
+from src.data_loader.property_index import lookup_property_candidates
+from src.data_loader.sharded_index import index_exists
+from src.ai_functions.context_cache import RetrievedContextCache
+from src.ai_functions.llm_scheduler import get_scheduler
+from src.ai_functions.local_llm import estimate_tokens
+from src.ai_functions.structured_output import (
+    QueryAnalysis,
+    QuestionList,
+    RequirementsAndSearch,
+    StructuredOutputParser,
+    SubQueryPlan,
+)
+from src.monitoring.tracing import span
+from src.monitoring.metrics import (
+    FALLBACKS_TOTAL,
+    LLM_REQUEST_SECONDS,
+    LLM_REQUESTS_TOTAL,
+    LLM_TOKENS_TOTAL,
+    LLM_COST_DOLLARS_TOTAL,
+    LLM_ESCALATIONS_TOTAL,
+    LLM_RETRIES_TOTAL,
+    current_llm_model,
+    install_retry_counter,
+)
 
 load_dotenv()
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
-# Initialize HuggingFace embeddings for LangChain compatibility
-from langchain_community.embeddings import HuggingFaceEmbeddings
-sentence_transformer_embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+# HuggingFace embeddings for LangChain compatibility, shared with indexing and retrieval
+sentence_transformer_embeddings = get_embeddings()
 
-# LLAMA 3.1
-llama_llm = ChatGroq(
-    model="llama-3.3-70b-versatile",
-    api_key=GROQ_API_KEY, 
-    temperature=0.0,
-    max_retries=5 
-)
+# Fallbacks used when a step's LLM call fails; the sub-queries' embeddings are precomputed
+# (see warm_up_retrieval), so a degraded session never waits on the embedding model either
+DEFAULT_INITIAL_QUESTIONS = [
+    "What is the maximum operating temperature the material will be exposed to?",
+    "What strength requirements does your application have?",
+    "What environmental conditions will the material be exposed to?",
+    "What manufacturing process do you plan to use?"
+]
+DEFAULT_REFINED_QUESTIONS = [
+    "Can you provide more specific details about the performance requirements?",
+    "Are there any specific material properties that are critical for your application?",
+    "What is your budget range for the materials?",
+    "Are there any specific materials you've considered or would like to avoid?"
+]
+DEFAULT_SUB_QUERIES = [
+    "Materials with high strength-to-weight ratio",
+    "Materials suitable for high temperature applications",
+    "Materials with excellent corrosion resistance",
+    "Materials suitable for standard manufacturing processes"
+]
 
-# QWEN LLM for conversational mode (higher temperature)
-conv_llm = ChatGroq(
-    model="qwen-2.5-32b",  
-    api_key=GROQ_API_KEY, 
-    temperature=0.7,  # Higher temperature for more creative responses
-    max_retries=5 
-)
+# Typical searches run once at startup to warm the embedding model and the index
+WARM_UP_QUERIES = [
+    "Lightweight alloy with high yield strength for a structural frame",
+    "Polymer with good chemical resistance for outdoor use",
+    "Density, Young's modulus and tensile strength of titanium alloys",
+    "Fatigue and corrosion behaviour of welded aluminium joints",
+]
+
+# -------------------
+# MODEL REGISTRY AND ROUTING
+# -------------------
+
+# Groq on-demand prices in USD per million (prompt, completion) tokens, for cost reporting
+MODEL_PRICES = {
+    "llama-3.1-8b-instant": (0.05, 0.08),
+    "llama-3.3-70b-versatile": (0.59, 0.79),
+    "qwen-2.5-32b": (0.79, 0.79),
+}
+
+# Model tiers; a routed step that fails or is unsure on a tier is retried on ESCALATION[tier]
+MODEL_TIERS = {
+    "light": {"model": settings.LLM_LIGHT_MODEL, "temperature": 0.0},
+    "heavy": {"model": settings.LLM_HEAVY_MODEL, "temperature": 0.0},
+    # Higher temperature for more creative responses
+    "conversational": {"model": settings.LLM_CONVERSATIONAL_MODEL, "temperature": 0.7},
+}
+ESCALATION = {"light": "heavy"}
+
+# Tier of each step: classifying, asking questions and reformatting requirements run on the
+# light model; only the steps that reason over retrieved documents need the 70B model
+STEP_TIERS = {
+    "determine_query_mode": "light",
+    "analyze_query": "light",
+    "generate_initial_questions": "light",
+    "generate_refined_questions": "light",
+    "create_comprehensive_query": "light",
+    "generate_sub_queries": "light",
+    "create_query_and_sub_queries": "light",
+    "update_requirements_summary": "light",
+    "generate_conversational_response": "conversational",
+    "material_analysis": "heavy",
+    "followup_response": "heavy",
+}
+
+# Scheduling class of each step
+# The user is waiting on every step except the long analysis and the summary updates, which run in the background
+STEP_PRIORITIES = {"material_analysis": "analysis", "update_requirements_summary": "analysis"}
+
+# Completion tokens reserved for a step before its first reply, then a moving average of its replies
+_completion_estimates = {"material_analysis": 1200.0, "followup_response": 600.0, "generate_conversational_response": 400.0}
+DEFAULT_COMPLETION_ESTIMATE = 300.0
+_estimates_lock = threading.Lock()
+
+_tier_llms = {}
+
+
+def get_llm(tier: str):
+    """Chat model of a tier from the configured backend, created once per process"""
+    if tier not in _tier_llms:
+        spec = MODEL_TIERS[tier]
+        if settings.LLM_BACKEND == "local":
+            # Offline stand-in; it keeps the tier's model name so cost estimates still apply
+            from src.ai_functions.local_llm import LocalChatModel
+            _tier_llms[tier] = LocalChatModel(model_name=spec["model"])
+            return _tier_llms[tier]
+        _tier_llms[tier] = ChatGroq(
+            model=spec["model"],
+            api_key=GROQ_API_KEY,
+            temperature=spec["temperature"],
+            # The scheduler paces and retries requests itself; blind client retries only add to the load
+            max_retries=0 if settings.LLM_SCHEDULER else 5
+        )
+    return _tier_llms[tier]
 
 
-def determine_query_mode(query: str, llm=llama_llm) -> str:
+def step_tier(step: str) -> str:
+    """Tier a step runs on (every tiered step runs on "heavy" when routing is disabled)"""
+    tier = STEP_TIERS.get(step, "heavy")
+    if not settings.LLM_ROUTING and tier in ESCALATION:
+        return "heavy"
+    return tier
+
+
+def llm_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Cost of a call in USD (0 for models without a known price)"""
+    prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1e6
+
+
+# -------------------
+# PROMPTS AND CHAINS
+# -------------------
+
+# A {variable} that is not an escaped {{ brace }}
+_VARIABLE = re.compile(r"(?<!\{)\{[A-Za-z_]\w*\}(?!\})")
+
+
+def compile_prompt(template: str) -> ChatPromptTemplate:
+    """
+    Compile a template from prompts.py into a system message and a human message.
+    
+    Everything before the paragraph holding the first input variable is static and goes in
+    the system message, so every call to the template starts with the same tokens and
+    provider-side prompt caching can reuse them; the inputs go in the human message.
+    
+    Args:
+        template: Template string with the per-call inputs at the end
+        
+    Returns:
+        ChatPromptTemplate: The compiled prompt
+    """
+    text = template.strip()
+    first_variable = _VARIABLE.search(text)
+    split = text.rfind("\n\n", 0, first_variable.start()) if first_variable else -1
+    if split == -1:
+        return ChatPromptTemplate.from_messages([("human", text)])
+    return ChatPromptTemplate.from_messages([("system", text[:split].strip()), ("human", text[split:].strip())])
+
+
+# Template, output parser and whether to request JSON mode, per step
+STEP_PROMPTS = {
+    "determine_query_mode": (query_analysis_prompt, StrOutputParser(), False),
+    "analyze_query": (
+        mode_and_questions_prompt,
+        StructuredOutputParser(pydantic_object=QueryAnalysis, function="analyze_query"),
+        True,
+    ),
+    "generate_initial_questions": (
+        initial_questions_prompt,
+        StructuredOutputParser(pydantic_object=QuestionList, function="generate_initial_questions", list_field="questions"),
+        True,
+    ),
+    "generate_refined_questions": (
+        question_refiner_prompt,
+        StructuredOutputParser(pydantic_object=QuestionList, function="generate_refined_questions", list_field="questions"),
+        True,
+    ),
+    "create_comprehensive_query": (process_answers_prompt, StrOutputParser(), False),
+    "update_requirements_summary": (requirements_update_prompt, StrOutputParser(), False),
+    # A reply in the old markdown format is still recovered from its numbered list
+    "generate_sub_queries": (
+        material_search_prompt,
+        StructuredOutputParser(pydantic_object=SubQueryPlan, function="generate_sub_queries", list_field="sub_queries"),
+        True,
+    ),
+    "create_query_and_sub_queries": (
+        requirements_and_search_prompt,
+        StructuredOutputParser(pydantic_object=RequirementsAndSearch, function="create_query_and_sub_queries"),
+        True,
+    ),
+    "generate_conversational_response": (general_response_prompt, StrOutputParser(), False),
+    "material_analysis": (material_analysis_prompt, StrOutputParser(), False),
+    "followup_response": (followup_response_prompt, StrOutputParser(), False),
+}
+
+# Compiled once at import; the chain of each step and model is built on first use and reused
+COMPILED_PROMPTS = {step: compile_prompt(template) for step, (template, _, _) in STEP_PROMPTS.items()}
+# Estimated tokens of each step's static system message, sent identically on every call
+STATIC_PROMPT_TOKENS = {
+    step: estimate_tokens(prompt.messages[0].prompt.template) if len(prompt.messages) > 1 else 0
+    for step, prompt in COMPILED_PROMPTS.items()
+}
+_chains = {}
+_chains_lock = threading.Lock()
+
+
+def get_chain(step: str, llm):
+    """
+    The prompt | model | parser chain of a step for a model, built once and reused.
+    
+    Args:
+        step: Name of the pipeline step (a key of STEP_PROMPTS)
+        llm: The language model to run the chain on
+        
+    Returns:
+        The LCEL chain
+    """
+    cached = _chains.get((step, id(llm)))
+    # The model is kept with its chain, so a reused id of a collected model never matches
+    if cached is not None and cached[0] is llm:
+        return cached[1]
+    _, parser, json_mode = STEP_PROMPTS[step]
+    chain = COMPILED_PROMPTS[step] | (_json_mode(llm) if json_mode else llm) | parser
+    with _chains_lock:
+        _chains[(step, id(llm))] = (llm, chain)
+    return chain
+
+
+# Kept for callers that pin a model explicitly
+llama_llm = get_llm("heavy")
+conv_llm = get_llm("conversational")
+
+# Count the Groq client's internal retries per model
+install_retry_counter()
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """Collects prompt/completion token counts reported by the LLM provider"""
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        # Prompt tokens served from the provider's prompt cache, where it reports them
+        self.cached_prompt_tokens = 0
+
+    def on_llm_end(self, response, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if usage:
+            self.prompt_tokens += usage.get("prompt_tokens", 0)
+            self.completion_tokens += usage.get("completion_tokens", 0)
+            self.cached_prompt_tokens += (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+            return
+        
+        # Fall back to the usage metadata attached to the generated message
+        for generations in response.generations:
+            for generation in generations:
+                metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                self.prompt_tokens += metadata.get("input_tokens", 0)
+                self.completion_tokens += metadata.get("output_tokens", 0)
+
+
+def _send(step: str, chain, inputs: dict, llm, tier: str, usage: TokenUsageCallback, queue_seconds: float):
+    """Send one request inside a tracing span that records the model, token usage and cost"""
+    model = getattr(llm, "model_name", type(llm).__name__)
+    model_token = current_llm_model.set(model)
+    status = "error"
+    try:
+        with span(f"llm.{step}", model=model, tier=tier, queue_seconds=round(queue_seconds, 3),
+                  static_prompt_tokens=STATIC_PROMPT_TOKENS.get(step, 0)) as llm_span:
+            try:
+                result = chain.invoke(inputs, config={"callbacks": [usage]})
+            finally:
+                # Tokens of a reply that failed to parse were still spent
+                llm_span.set_attribute("prompt_tokens", usage.prompt_tokens)
+                llm_span.set_attribute("completion_tokens", usage.completion_tokens)
+                llm_span.set_attribute("cached_prompt_tokens", usage.cached_prompt_tokens)
+                llm_span.set_attribute("cost_usd", llm_cost(model, usage.prompt_tokens, usage.completion_tokens))
+        status = "success"
+        return result
+    finally:
+        current_llm_model.reset(model_token)
+        LLM_REQUEST_SECONDS.observe(llm_span.duration_ms / 1000, model=model, step=step)
+        LLM_REQUESTS_TOTAL.inc(model=model, step=step, status=status)
+        LLM_TOKENS_TOTAL.inc(usage.prompt_tokens, model=model, kind="prompt")
+        LLM_TOKENS_TOTAL.inc(usage.completion_tokens, model=model, kind="completion")
+        LLM_TOKENS_TOTAL.inc(usage.cached_prompt_tokens, model=model, kind="cached_prompt")
+        LLM_COST_DOLLARS_TOTAL.inc(llm_cost(model, usage.prompt_tokens, usage.completion_tokens), model=model, step=step)
+
+
+def estimate_request_tokens(step: str, chain, inputs: dict) -> int:
+    """Tokens to reserve for a request: its rendered prompt plus the step's expected completion"""
+    try:
+        prompt_tokens = estimate_tokens(chain.first.format(**inputs))
+    except Exception:
+        prompt_tokens = estimate_tokens(json.dumps(inputs, default=str))
+    return prompt_tokens + int(_completion_estimates.get(step, DEFAULT_COMPLETION_ESTIMATE))
+
+
+def _record_completion(step: str, completion_tokens: int):
+    if completion_tokens:
+        with _estimates_lock:
+            previous = _completion_estimates.get(step, DEFAULT_COMPLETION_ESTIMATE)
+            _completion_estimates[step] = 0.8 * previous + 0.2 * completion_tokens
+
+
+def _retry_after(error: groq.RateLimitError) -> float:
+    """Seconds the provider asked us to wait, or a short default"""
+    try:
+        return float(error.response.headers.get("retry-after", 2.0))
+    except (AttributeError, TypeError, ValueError):
+        return 2.0
+
+
+def _invoke_chain(step: str, chain, inputs: dict, llm, tier: str = "pinned"):
+    """
+    Invoke an LCEL chain, paced by the shared rate-limit scheduler.
+    
+    The request's tokens are estimated and reserved against the model's limits before it
+    is sent, and the reservation is corrected by the tokens actually used. A request the
+    provider still rejects (429) pauses the model for its retry-after and is retried;
+    connection errors and 5xx replies are retried with exponential backoff.
+    
+    Args:
+        step: Name of the pipeline step, used as the span name suffix
+        chain: The prompt | llm | parser chain to run
+        inputs: Input variables for the prompt
+        llm: The language model used by the chain
+        tier: Model tier the step was routed to ("pinned" when the caller chose the model)
+        
+    Returns:
+        The parsed chain output
+    
+    Raises:
+        DeadlineExceeded: If the request could not start within its priority's queueing deadline
+    """
+    if not settings.LLM_SCHEDULER:
+        return _send(step, chain, inputs, llm, tier, TokenUsageCallback(), 0.0)
+    
+    model = getattr(llm, "model_name", type(llm).__name__)
+    scheduler = get_scheduler()
+    priority = STEP_PRIORITIES.get(step, "interactive")
+    tokens = estimate_request_tokens(step, chain, inputs)
+    for attempt in range(1, settings.LLM_MAX_ATTEMPTS + 1):
+        reservation = scheduler.acquire(model, tokens, priority, settings.LLM_QUEUE_DEADLINES.get(priority))
+        usage = TokenUsageCallback()
+        try:
+            return _send(step, chain, inputs, llm, tier, usage, reservation.waited_seconds)
+        except groq.RateLimitError as e:
+            if attempt == settings.LLM_MAX_ATTEMPTS:
+                raise
+            scheduler.penalize(model, _retry_after(e))
+        except (groq.APIConnectionError, groq.InternalServerError) as e:
+            if attempt == settings.LLM_MAX_ATTEMPTS:
+                raise
+            logger.warning(f"{step} request to {model} failed ({type(e).__name__}); retrying")
+            time.sleep(min(2 ** attempt, 10))
+        finally:
+            scheduler.settle(reservation, usage.prompt_tokens + usage.completion_tokens)
+            _record_completion(step, usage.completion_tokens)
+        LLM_RETRIES_TOTAL.inc(model=model)
+
+
+def _run_step(step: str, inputs: dict, llm=None, accept=None):
+    """
+    Run a pipeline step on the model of its tier, escalating when the reply is not usable.
+    
+    A reply that fails to parse, or that `accept` rejects as low-confidence, is retried on
+    the next tier up; the last tier's reply is returned (or its parse error raised) as is.
+    
+    Args:
+        step: Name of the pipeline step (a key of STEP_TIERS and STEP_PROMPTS)
+        inputs: Input variables for the prompt
+        llm: Model to use without routing or escalation (None routes by STEP_TIERS)
+        accept: Optional check of the parsed output; False escalates
+        
+    Returns:
+        The parsed chain output
+    """
+    if llm is not None:
+        return _invoke_chain(step, get_chain(step, llm), inputs, llm)
+    
+    tier = step_tier(step)
+    while True:
+        model = get_llm(tier)
+        next_tier = ESCALATION.get(tier)
+        try:
+            result = _invoke_chain(step, get_chain(step, model), inputs, model, tier)
+        except OutputParserException:
+            if next_tier is None:
+                raise
+            reason = "parse_failure"
+        else:
+            if next_tier is None or accept is None or accept(result):
+                return result
+            reason = "low_confidence"
+        logger.warning(f"Escalating {step} from {tier} to {next_tier} ({reason})")
+        LLM_ESCALATIONS_TOTAL.inc(step=step, reason=reason)
+        tier = next_tier
+
+
+def _json_mode(llm):
+    """Ask Groq models for a syntactically valid JSON object; other models rely on the prompt and the parser"""
+    if isinstance(llm, ChatGroq):
+        return llm.bind(response_format={"type": "json_object"})
+    return llm
+
+
+def _expected(items: List[str], expected: int, function: str) -> List[str]:
+    """Keep at most `expected` items, logging when the model returned a different number"""
+    if len(items) != expected:
+        logger.warning(f"{function} expected {expected} items, got {len(items)}")
+    return items[:expected]
+
+
+def determine_query_mode(query: str, llm=None) -> str:
     """
     Determine if a query is conversational or materials science focused.
     
     Args:
         query: User's input query
-        llm: The language model
+        llm: The language model (defaults to the model of the step's tier)
         
     Returns:
         str: Either "CONVERSATIONAL" or "MATERIAL_SCIENCE"
     """
-    mode_prompt = PromptTemplate(
-        input_variables=["query"],
-        template=query_analysis_prompt
-    )
-    
-    mode_chain = mode_prompt | llm | StrOutputParser()
-    
-    try:
-        mode = mode_chain.invoke({"query": query}).strip()
-        logger.info(f"Query mode determined: {mode}")
+    with span("mode_detection") as mode_span:
+        try:
+            mode = _run_step(
+                "determine_query_mode",
+                {"query": query},
+                llm,
+                accept=lambda reply: reply.strip() in ["CONVERSATIONAL", "MATERIAL_SCIENCE"]
+            ).strip()
+            logger.info(f"Query mode determined: {mode}")
         
-        # Ensure the mode is one of the expected values
-        if mode not in ["CONVERSATIONAL", "MATERIAL_SCIENCE"]:
-            logger.warning(f"Unexpected mode returned: {mode}. Defaulting to CONVERSATIONAL")
+            # Ensure the mode is one of the expected values
+            if mode not in ["CONVERSATIONAL", "MATERIAL_SCIENCE"]:
+                logger.warning(f"Unexpected mode returned: {mode}. Defaulting to CONVERSATIONAL")
+                FALLBACKS_TOTAL.inc(function="determine_query_mode")
+                return "CONVERSATIONAL"
+
+            mode_span.set_attribute("mode", mode)
+            return mode
+        except Exception as e:
+            logger.error(f"Mode determination failed: {str(e)}")
+            FALLBACKS_TOTAL.inc(function="determine_query_mode")
+            # Default to conversational mode if determination fails
             return "CONVERSATIONAL"
-        
-        return mode
-    except Exception as e:
-        logger.error(f"Mode determination failed: {str(e)}")
-        # Default to conversational mode if determination fails
-        return "CONVERSATIONAL"
 
 
-def generate_conversational_response(query: str, llm=conv_llm) -> str:
+def generate_conversational_response(query: str, llm=None) -> str:
     """
     Generate a conversational response to the user's query.
     
     Args:
         query: User's query
-        llm: The language model
+        llm: The language model (defaults to the model of the step's tier)
         
     Returns:
         str: Natural language response
     """
-    response_prompt = PromptTemplate(
-        input_variables=["query"],
-        template=general_response_prompt
-    )
-    
-    response_chain = response_prompt | llm | StrOutputParser()
-    
     try:
-        response = response_chain.invoke({"query": query})
+        response = _run_step(
+            "generate_conversational_response",
+            {"query": query},
+            llm
+        )
         logger.info("Generated conversational response")
         return response
     except Exception as e:
         logger.error(f"Conversational response generation failed: {str(e)}")
+        FALLBACKS_TOTAL.inc(function="generate_conversational_response")
         return "I'm sorry, I'm having trouble formulating a response right now. Could you try phrasing your question differently?"
 
 
-def generate_initial_questions(query: str, llm=llama_llm) -> list:
+def generate_initial_questions(query: str, llm=None) -> list:
     """
     Generate 4 initial sub-questions to gather requirements for material selection.
     
     Args:
         query: User's query
-        llm: The language model
+        llm: The language model (defaults to the model of the step's tier)
         
     Returns:
         list: List of 4 questions
     """
-    question_prompt = PromptTemplate(
-        input_variables=["query"],
-        template=initial_questions_prompt
-    )
-    question_generator = question_prompt | llm | JsonOutputParser()
-    
     try:
-        # Generate questions as JSON
-        result = question_generator.invoke({
-            "query": query,
-        })        
-        # Extract questions list from the JSON result
-        questions = result.get("questions", [])
+        # Generate questions as schema-validated JSON
+        result = _run_step(
+            "generate_initial_questions",
+            {"query": query},
+            llm,
+            accept=lambda output: len(output.questions) >= 4
+        )
+        questions = _expected(result.questions, 4, "generate_initial_questions")
         
         logger.info(f"Generated {len(questions)} initial questions")
         return questions
         
     except Exception as e:
         logger.error(f"Initial question generation failed: {str(e)}")
+        FALLBACKS_TOTAL.inc(function="generate_initial_questions")
         # Return some default questions if generation fails
-        return [
-            "What is the maximum operating temperature the material will be exposed to?",
-            "What strength requirements does your application have?",
-            "What environmental conditions will the material be exposed to?",
-            "What manufacturing process do you plan to use?"
-        ]
+        return list(DEFAULT_INITIAL_QUESTIONS)
 
 
-def generate_refined_questions(original_query: str, question_answers: Dict[str, str], llm=llama_llm) -> list:
+def generate_refined_questions(original_query: str, question_answers: Dict[str, str], llm=None) -> list:
     """
     Generate refined follow-up questions based on initial responses.
     
     Args:
         original_query: Original user query
         question_answers: Dictionary of initial questions and user answers
-        llm: The language model
+        llm: The language model (defaults to the model of the step's tier)
         
     Returns:
         list: List of 4 refined questions
@@ -159,41 +560,94 @@ def generate_refined_questions(original_query: str, question_answers: Dict[str,
     # Format the question-answer pairs for the prompt
     qa_formatted = "\n".join([f"Q: {q}\nA: {a}" for q, a in question_answers.items()])
     
-    refiner_prompt = PromptTemplate(
-        input_variables=["original_query", "question_answers"],
-        template=question_refiner_prompt
-    )
-    question_refiner = refiner_prompt | llm | JsonOutputParser()
-    
     try:
-        # Generate refined questions as JSON
-        result = question_refiner.invoke({
-            "original_query": original_query,
-            "question_answers": qa_formatted
-        })
-        
-        # Extract questions list from the JSON result
-        questions = result.get("questions", [])
+        # Generate refined questions as schema-validated JSON
+        result = _run_step(
+            "generate_refined_questions",
+            {"original_query": original_query, "question_answers": qa_formatted},
+            llm,
+            accept=lambda output: len(output.questions) >= 4
+        )
+        questions = _expected(result.questions, 4, "generate_refined_questions")
         
         logger.info(f"Generated {len(questions)} refined questions")
         return questions
         
     except Exception as e:
         logger.error(f"Refined question generation failed: {str(e)}")
+        FALLBACKS_TOTAL.inc(function="generate_refined_questions")
         # Return some default refined questions if generation fails
-        return [
-            "Can you provide more specific details about the performance requirements?",
-            "Are there any specific material properties that are critical for your application?",
-            "What is your budget range for the materials?",
-            "Are there any specific materials you've considered or would like to avoid?"
-        ]
+        return list(DEFAULT_REFINED_QUESTIONS)
+
+
+def format_requirements(initial_qa: Dict[str, str], refined_qa: Dict[str, str], requirements_summary: str = None) -> str:
+    """
+    The user's requirements for a prompt: the running summary if there is one, otherwise every answer verbatim.
+    
+    Args:
+        initial_qa: Dictionary of initial questions and answers
+        refined_qa: Dictionary of refined questions and answers
+        requirements_summary: Running summary of the answers (see RequirementsSummary)
+        
+    Returns:
+        str: Requirements block for the prompt
+    """
+    if requirements_summary:
+        return f"Summary of the user's answers:\n{requirements_summary}"
+    initial_qa_formatted = "\n".join([f"Q: {q}\nA: {a}" for q, a in initial_qa.items()])
+    refined_qa_formatted = "\n".join([f"Q: {q}\nA: {a}" for q, a in refined_qa.items()])
+    return f"Initial Question-Answer Pairs:\n{initial_qa_formatted}\n\nRefined Question-Answer Pairs:\n{refined_qa_formatted}"
+
+
+def update_requirements_summary(
+    original_query: str,
+    summary: str,
+    new_answers: List[Tuple[str, str]],
+    max_words: int,
+    llm=None
+) -> str:
+    """
+    Fold new answers into the running summary of the user's requirements.
+    
+    Args:
+        original_query: Original user query
+        summary: The current summary
+        new_answers: (question, answer) pairs not yet in the summary, oldest first
+        max_words: Length limit for the updated summary
+        llm: The language model (defaults to the model of the step's tier)
+        
+    Returns:
+        str: The updated summary (the current one with the answers appended if the update fails)
+    """
+    try:
+        updated = _run_step(
+            "update_requirements_summary",
+            {
+                "original_query": original_query,
+                "max_words": max_words,
+                "summary": summary,
+                "new_answers": "\n".join([f"Q: {q}\nA: {a}" for q, a in new_answers])
+            },
+            llm,
+            accept=lambda reply: bool(reply.strip())
+        ).strip()
+        if not updated:
+            raise ValueError("Empty summary")
+        
+        logger.info(f"Folded {len(new_answers)} answers into the requirements summary")
+        return updated
+    except Exception as e:
+        logger.error(f"Requirements summary update failed: {str(e)}")
+        FALLBACKS_TOTAL.inc(function="update_requirements_summary")
+        return " ".join([summary] + [f"{q} {a}" for q, a in new_answers])
 
 
 def create_comprehensive_query(
     original_query: str, 
     initial_qa: Dict[str, str], 
     refined_qa: Dict[str, str], 
-    llm=llama_llm
+    llm=None,
+    requirements_summary: str = None
 ) -> str:
     """
     Process all question answers to create a comprehensive query.
@@ -202,7 +656,8 @@ def create_comprehensive_query(
         original_query: Original user query
         initial_qa: Dictionary of initial questions and answers
         refined_qa: Dictionary of refined questions and answers
-        llm: The language model
+        llm: The language model (defaults to the model of the step's tier)
+        requirements_summary: Running summary of the answers, sent instead of the answers themselves
         
     Returns:
         str: Comprehensive query for material selection
@@ -211,222 +666,438 @@ def create_comprehensive_query(
     initial_qa_formatted = "\n".join([f"Q: {q}\nA: {a}" for q, a in initial_qa.items()])
     refined_qa_formatted = "\n".join([f"Q: {q}\nA: {a}" for q, a in refined_qa.items()])
     
-    process_prompt = PromptTemplate(
-        input_variables=["original_query", "initial_qa", "refined_qa"],
-        template=process_answers_prompt
-    )
-    
-    process_chain = process_prompt | llm | StrOutputParser()
-    
     try:
-        comprehensive_query = process_chain.invoke({
-            "original_query": original_query,
-            "initial_qa": initial_qa_formatted,
-            "refined_qa": refined_qa_formatted
-        })
+        comprehensive_query = _run_step(
+            "create_comprehensive_query",
+            {
+                "original_query": original_query,
+                "requirements": format_requirements(initial_qa, refined_qa, requirements_summary)
+            },
+            llm,
+            accept=lambda reply: bool(reply.strip())
+        )
         
         logger.info("Generated comprehensive query")
         return comprehensive_query
     except Exception as e:
         logger.error(f"Processing answers failed: {str(e)}")
+        FALLBACKS_TOTAL.inc(function="create_comprehensive_query")
         # Return a simplified version if processing fails
+        if requirements_summary:
+            return f"Query: {original_query}. Specifications: {requirements_summary}"
         return f"Query: {original_query}. Initial Specifications: {initial_qa_formatted}. Refined Specifications: {refined_qa_formatted}"
 
 
-def generate_sub_queries(comprehensive_query: str, llm=llama_llm) -> List[str]:
+def generate_sub_queries(comprehensive_query: str, llm=None) -> List[str]:
     """
     Generate sub-queries for material selection based on the comprehensive query.
     
     Args:
         comprehensive_query: The processed comprehensive query
-        llm: The language model
+        llm: The language model (defaults to the model of the step's tier)
         
     Returns:
         List[str]: List of 4 targeted sub-queries
     """
-    subquery_prompt = PromptTemplate(
-        input_variables=["comprehensive_query"],
-        template=material_search_prompt
-    )
-    
-    subquery_chain = subquery_prompt | llm | StrOutputParser()
     
     try:
-        result = subquery_chain.invoke({
-            "comprehensive_query": comprehensive_query
-        })
-        
-        # Extract just the sub-queries from the result
-        sub_queries = []
-        in_subqueries_section = False
-        for line in result.split('\n'):
-            if line.startswith('## Sub-Queries'):
-                in_subqueries_section = True
-                continue
-            
-            if in_subqueries_section and line.strip() and line[0].isdigit():
-                # Extract just the query part (before the explanation)
-                query_parts = line.split('-', 1)
-                if len(query_parts) > 1:
-                    # Remove the number and just get the query text
-                    query = query_parts[0].split('.', 1)[1].strip()
-                    sub_queries.append(query)
-                else:
-                    # If there's no explanation part, use the whole line
-                    sub_queries.append(line.strip())
+        result = _run_step(
+            "generate_sub_queries",
+            {"comprehensive_query": comprehensive_query},
+            llm,
+            accept=lambda output: len(output.sub_queries) >= 4
+        )
+        sub_queries = _expected(result.sub_queries, 4, "generate_sub_queries")
         
         logger.info(f"Generated {len(sub_queries)} sub-queries")
         return sub_queries
         
     except Exception as e:
         logger.error(f"Sub-query generation failed: {str(e)}")
-        # Return generic sub-queries if generation fails
-        return [
-            "Materials with high strength-to-weight ratio",
-            "Materials suitable for high temperature applications",
-            "Materials with excellent corrosion resistance",
-            "Materials suitable for standard manufacturing processes"
-        ]
+        FALLBACKS_TOTAL.inc(function="generate_sub_queries")
+        # Return generic sub-queries if generation fails (their embeddings are pinned)
+        return list(DEFAULT_SUB_QUERIES)
+
+
+def analyze_query(query: str, llm=None) -> Tuple[str, List[str]]:
+    """
+    Determine the query mode and, for materials science queries, the initial questions in one LLM call.
+    
+    Falls back to determine_query_mode and generate_initial_questions if the structured
+    output does not validate.
+    
+    Args:
+        query: User's input query
+        llm: The language model (defaults to the model of the step's tier)
+        
+    Returns:
+        tuple: ("CONVERSATIONAL" or "MATERIAL_SCIENCE", list of initial questions, empty when conversational)
+    """
+    def confident(output: QueryAnalysis) -> bool:
+        if output.confidence < settings.LLM_ESCALATE_BELOW_CONFIDENCE:
+            return False
+        return output.mode == "CONVERSATIONAL" or len(output.questions) >= 4
+    
+    with span("mode_detection", consolidated=True) as mode_span:
+        try:
+            result = _run_step(
+                "analyze_query",
+                {"query": query},
+                llm,
+                accept=confident
+            )
+            mode = result.mode
+            questions = _expected(result.questions, 4, "analyze_query") if mode == "MATERIAL_SCIENCE" else []
+            if mode == "MATERIAL_SCIENCE" and not questions:
+                raise ValueError("No initial questions in structured output")
+            
+            logger.info(f"Query mode determined: {mode} with {len(questions)} initial questions")
+            mode_span.set_attribute("mode", mode)
+            return mode, questions
+        except Exception as e:
+            logger.error(f"Consolidated query analysis failed: {str(e)}")
+            FALLBACKS_TOTAL.inc(function="analyze_query")
+    
+    mode = determine_query_mode(query, llm)
+    return mode, generate_initial_questions(query, llm) if mode == "MATERIAL_SCIENCE" else []
+
+
+def create_query_and_sub_queries(
+    original_query: str,
+    initial_qa: Dict[str, str],
+    refined_qa: Dict[str, str],
+    llm=None,
+    requirements_summary: str = None
+) -> Tuple[str, List[str]]:
+    """
+    Create the comprehensive query and the search sub-queries in one LLM call.
+    
+    Falls back to create_comprehensive_query and generate_sub_queries if the structured
+    output does not validate.
+    
+    Args:
+        original_query: Original user query
+        initial_qa: Dictionary of initial questions and answers
+        refined_qa: Dictionary of refined questions and answers
+        llm: The language model (defaults to the model of the step's tier)
+        requirements_summary: Running summary of the answers, sent instead of the answers themselves
+        
+    Returns:
+        tuple: (comprehensive query, list of 4 sub-queries)
+    """
+    
+    try:
+        result = _run_step(
+            "create_query_and_sub_queries",
+            {
+                "original_query": original_query,
+                "requirements": format_requirements(initial_qa, refined_qa, requirements_summary)
+            },
+            llm,
+            accept=lambda output: len(output.sub_queries) >= 4
+        )
+        sub_queries = _expected(result.sub_queries, 4, "create_query_and_sub_queries")
+        
+        logger.info(f"Generated comprehensive query and {len(sub_queries)} sub-queries")
+        return result.comprehensive_query.strip(), sub_queries
+    except Exception as e:
+        logger.error(f"Consolidated requirements generation failed: {str(e)}")
+        FALLBACKS_TOTAL.inc(function="create_query_and_sub_queries")
+    
+    comprehensive_query = create_comprehensive_query(original_query, initial_qa, refined_qa, llm, requirements_summary)
+    return comprehensive_query, generate_sub_queries(comprehensive_query, llm)
 
 
-def search_materials_database(sub_queries: List[str], available_indices: List[str] = None) -> List[str]:
+def search_materials_database(sub_queries: List[str], available_indices: List[str] = None, filters: dict = None,
+                              corpora: List[str] = None, return_documents: bool = False) -> list:
     """
     Search the materials database using the sub-queries.
     
     Args:
         sub_queries: List of targeted sub-queries
         available_indices: List of available document indices (deprecated, kept for compatibility)
+        filters: Optional metadata filters (doc_name, type, chunk_type, page_min/page_max, section)
+        corpora: Corpora to search, e.g. the session's (defaults to [settings.DEFAULT_CORPUS]); with
+                 several, each sub-query is routed to the corpora its topic matches
+        return_documents: Return the retrieved Document objects instead of their text
         
     Returns:
-        List[str]: Retrieved text segments
+        list: Retrieved text segments (or Documents), without duplicates
     """
     all_results = []
     
-    # Create a fresh HuggingFaceEmbeddings instance for this search
-    from langchain_community.embeddings import HuggingFaceEmbeddings
-    hf_embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-    
-    # Use a single unified database approach
+    corpora = corpora or [settings.DEFAULT_CORPUS]
     try:
-        logger.info(f"Searching in unified materials database")
+        logger.info(f"Searching in corpora {corpora}")
         
         # Retrieve documents for each sub-query
         for query in sub_queries:
             try:
-                # Use direct similarity search with our new embeddings instance
+                # Use direct similarity search with the shared embeddings
                 doc_results = retrieve_documents(
-                    embeddings=hf_embeddings,
-                    query=query,  # No document_name means using unified database
+                    embeddings=sentence_transformer_embeddings,
+                    query=query,  # No document_name means searching whole corpora
                     search_type="mmr",
-                    k=3  # Limit results per query to avoid too much data
+                    k=3,  # Limit results per query to avoid too much data
+                    filters=filters,
+                    # Fewer segments for a sharp match, more for a broad sub-query
+                    adaptive=settings.ADAPTIVE_K,
+                    corpora=corpora,
+                    route=settings.CORPUS_ROUTING
                 )
                 
-                # Handle different return types (Document objects or other)
-                for doc in doc_results:
-                    if hasattr(doc, 'page_content'):
-                        all_results.append(doc.page_content)
-                    else:
-                        all_results.append(str(doc))
+                all_results.extend(doc_results)
                 logger.info(f"Retrieved {len(doc_results)} results for query: {query}")
             except Exception as e:
                 logger.error(f"Error retrieving documents for query '{query}': {str(e)}")
                 # Continue with other queries instead of failing
     except Exception as e:
-        logger.error(f"Error searching the unified materials database: {str(e)}")
+        logger.error(f"Error searching corpora {corpora}: {str(e)}")
     
     # Remove duplicates while preserving order
     unique_results = []
     seen = set()
     for result in all_results:
-        if result not in seen:
-            seen.add(result)
-            unique_results.append(result)
+        # Handle different return types (Document objects or other)
+        text = result.page_content if hasattr(result, 'page_content') else str(result)
+        if text not in seen:
+            seen.add(text)
+            unique_results.append(result if return_documents else text)
     
     logger.info(f"Retrieved {len(unique_results)} unique document segments")
     return unique_results
 
 
-def generate_material_recommendations(comprehensive_query: str, llm=llama_llm) -> str:
+def warm_up_retrieval() -> dict:
+    """
+    Prepare retrieval before the first user query: pin the embeddings of the default
+    queries (loaded from disk once precomputed) and warm the model and the index.
+    
+    Returns:
+        dict: Warm-up statistics (see warm_up_index), or an empty dict if warm-up failed
+    """
+    try:
+        # The default questions are pinned too, so no fallback text ever needs the model
+        embedded = pin_query_embeddings(DEFAULT_SUB_QUERIES + DEFAULT_INITIAL_QUESTIONS + DEFAULT_REFINED_QUESTIONS)
+        stats = warm_up_index(WARM_UP_QUERIES)
+        stats["pinned_embedded"] = embedded
+        logger.info(f"Retrieval warmed up in {stats['seconds']:.2f}s: {stats['shards']} shards, "
+                    f"{stats['vectors']} vectors, {stats['bytes_touched'] / 1e6:.1f} MB paged in")
+        return stats
+    except Exception as e:
+        logger.error(f"Retrieval warm-up failed: {str(e)}")
+        FALLBACKS_TOTAL.inc(function="warm_up_retrieval")
+        return {}
+
+
+_warm_up_thread = None
+_warm_up_lock = threading.Lock()
+
+
+def start_retrieval_warm_up():
+    """Run warm_up_retrieval in a background thread, once per process (no-op on Streamlit reruns)"""
+    global _warm_up_thread
+    with _warm_up_lock:
+        if _warm_up_thread is None:
+            _warm_up_thread = threading.Thread(target=warm_up_retrieval, name="retrieval-warm-up", daemon=True)
+            _warm_up_thread.start()
+    return _warm_up_thread
+
+
+def generate_material_recommendations(
+    comprehensive_query: str,
+    llm=None,
+    context_cache: RetrievedContextCache = None,
+    sub_queries: List[str] = None,
+    corpora: List[str] = None
+) -> str:
     """
     Generate material recommendations based on comprehensive query.
     
     Args:
         comprehensive_query: The comprehensive query
-        llm: The language model
+        llm: The language model (defaults to the model of the step's tier)
+        context_cache: Optional session cache that keeps the retrieved segments for follow-ups
+        sub_queries: Search sub-queries, if already generated (e.g. by create_query_and_sub_queries)
+        corpora: Corpora to search (defaults to [settings.DEFAULT_CORPUS])
         
     Returns:
         str: Material recommendations
     """
     try:
-        # First, generate sub-queries for the search
-        sub_queries = generate_sub_queries(comprehensive_query)
+        # First, generate sub-queries for the search unless they came with the comprehensive query
+        if not sub_queries:
+            sub_queries = generate_sub_queries(comprehensive_query)
         
-        # Check if unified database exists
-        unified_db_path = os.path.join(settings.DOC_INDEXES_DIR, "materials_database")
-        if not os.path.exists(os.path.join(unified_db_path, "index.faiss")):
-            logger.warning("Unified materials database not found")
+        # Check that at least one of the corpora has been indexed
+        corpora = [corpus for corpus in corpora or [settings.DEFAULT_CORPUS] if index_exists(corpus_path(corpus))]
+        if not corpora:
+            logger.warning("No indexed corpus found")
             return "I couldn't find the materials database. Please ensure documents have been properly indexed using the updated indexing system."
         
-        # Search the unified materials database using the sub-queries
-        retrieved_texts = search_materials_database(sub_queries)
+        # Search the corpora using the sub-queries
+        with span("retrieval", sub_queries=len(sub_queries)):
+            retrieved_docs = search_materials_database(sub_queries, corpora=corpora, return_documents=True)
         
-        if not retrieved_texts:
+        if not retrieved_docs:
             logger.warning("No relevant document segments found in the database")
             return "I couldn't find specific materials in our database that match your requirements. Please consider adjusting your specifications or consult with a materials specialist for custom recommendations."
         
-        # Format the sub-queries for the prompt
-        formatted_sub_queries = "\n".join([f"- {q}" for q in sub_queries])
-        
-        # IMPORTANT: Limit number of document segments to avoid token limits
-        # Use all retrieved texts as they won't exceed token limits
-        truncated_texts = []
-        for text in retrieved_texts:
-            if isinstance(text, str):
-                truncated_texts.append(text)
-            else:
-                # If the text is not a string (could be an object), try to get its content
-                try:
-                    content = str(text)
-                    truncated_texts.append(content)
-                except Exception as e:
-                    logger.error(f"Error processing text segment: {str(e)}")
-                    continue
-        
-        if not truncated_texts:
-            logger.warning("No valid text segments after processing")
-            return "I couldn't process the materials data effectively. Please try a different query approach."
-        
-        # Create the analysis prompt
-        analysis_prompt = PromptTemplate(
-            input_variables=["comprehensive_query", "sub_queries", "retrieved_texts"],
-            template=material_analysis_prompt
-        )
+        with span("context_assembly") as assembly_span:
+            # Format the sub-queries for the prompt
+            formatted_sub_queries = "\n".join([f"- {q}" for q in sub_queries])
+        
+            # IMPORTANT: Limit number of document segments to avoid token limits
+            # Use all retrieved texts as they won't exceed token limits
+            truncated_texts = []
+            segment_docs = []
+            for doc in retrieved_docs:
+                if hasattr(doc, 'page_content'):
+                    truncated_texts.append(doc.page_content)
+                    segment_docs.append(doc)
+                else:
+                    # If the text is not a Document (could be another object), try to get its content
+                    try:
+                        content = str(doc)
+                        truncated_texts.append(content)
+                        segment_docs.append(None)
+                    except Exception as e:
+                        logger.error(f"Error processing text segment: {str(e)}")
+                        continue
+        
+            if not truncated_texts:
+                logger.warning("No valid text segments after processing")
+                return "I couldn't process the materials data effectively. Please try a different query approach."
         
-        analysis_chain = analysis_prompt | llm | StrOutputParser()
+            # Keep the segments around so follow-up questions can reuse them, with the
+            # embeddings the index already holds for them
+            if context_cache is not None:
+                vectors = get_registry().stored_vectors(segment_docs)
+                added = context_cache.add_segments(truncated_texts, vectors)
+                logger.info(f"Cached {added} retrieved segments for follow-up questions")
+        
+            # Numeric constraints are answered from the property index and merged in as the first segment
+            if settings.PROPERTY_INDEX_ENABLED:
+                with span("property_lookup") as property_span:
+                    property_segment = lookup_property_candidates(comprehensive_query, corpora=corpora)
+                    property_span.set_attribute("found", bool(property_segment))
+                if property_segment:
+                    truncated_texts.insert(0, property_segment)
+                    if context_cache is not None:
+                        context_cache.add_segments([property_segment])
+        
+            retrieved_block = "\n\n---\n\n".join([f"Segment {i+1}:\n{text}" for i, text in enumerate(truncated_texts)])
+            assembly_span.set_attribute("segments", len(truncated_texts))
+            assembly_span.set_attribute("context_chars", len(retrieved_block))
         
         # Generate material recommendations
-        result = analysis_chain.invoke({
-            "comprehensive_query": comprehensive_query,
-            "sub_queries": formatted_sub_queries,
-            "retrieved_texts": "\n\n---\n\n".join([f"Segment {i+1}:\n{text}" for i, text in enumerate(truncated_texts)])
-        })
+        result = _run_step(
+            "material_analysis",
+            {
+                "comprehensive_query": comprehensive_query,
+                "sub_queries": formatted_sub_queries,
+                "retrieved_texts": retrieved_block
+            },
+            llm
+        )
         
         logger.success("Successfully generated material recommendations")
         return result
         
     except Exception as e:
         logger.error(f"Material recommendation generation failed: {str(e)}")
+        FALLBACKS_TOTAL.inc(function="generate_material_recommendations")
         return "I encountered an error while generating material recommendations. Please try again with more specific requirements."
 
 
+def _split_question_aspects(query: str) -> List[str]:
+    """Split a follow-up question into its separate sentences/clauses"""
+    aspects = [part.strip() for part in re.split(r"[?;]|\.\s", query) if len(part.split()) >= 3]
+    return aspects or [query]
+
+
+def generate_followup_response(
+    query: str,
+    context_cache: RetrievedContextCache,
+    comprehensive_query: str = "",
+    llm=None,
+    k: int = 4,
+    corpora: List[str] = None
+) -> str:
+    """
+    Answer a follow-up question after a recommendation, grounded in the session's retrieved context.
+    
+    The cached segments are searched first; the index is only queried for the aspects
+    of the question the cache does not cover, and those results are added to the cache.
+    
+    Args:
+        query: User's follow-up question
+        context_cache: Session cache populated by generate_material_recommendations
+        comprehensive_query: The requirements the recommendation was based on
+        llm: The language model (defaults to the model of the step's tier)
+        k: Number of segments to include in the prompt
+        corpora: Corpora searched for uncovered aspects (defaults to [settings.DEFAULT_CORPUS])
+        
+    Returns:
+        str: Follow-up answer
+    """
+    if context_cache is None:
+        logger.warning("No context cache for follow-up, falling back to conversational response")
+        return generate_conversational_response(query)
+    
+    try:
+        # Retrieve only for aspects that the cached segments don't already cover
+        for aspect in _split_question_aspects(query):
+            if context_cache.covers(context_cache.embed_query(aspect)):
+                continue
+            
+            logger.info(f"Context cache miss, retrieving for aspect: {aspect}")
+            doc_results = retrieve_documents(
+                embeddings=sentence_transformer_embeddings,
+                query=aspect,
+                k=3,
+                adaptive=settings.ADAPTIVE_K,
+                corpora=corpora,
+                route=settings.CORPUS_ROUTING
+            )
+            context_cache.add_segments(
+                [doc.page_content if hasattr(doc, 'page_content') else str(doc) for doc in doc_results],
+                get_registry().stored_vectors(doc_results)
+            )
+        
+        segments = [segment for segment, _ in context_cache.search(context_cache.embed_query(query), k=k)]
+        logger.info(f"Context cache: {context_cache.hits} hits, {context_cache.misses} misses, {len(context_cache)} segments")
+        
+        if not segments:
+            logger.warning("No segments available for follow-up, falling back to conversational response")
+            return generate_conversational_response(query)
+        
+        response = _run_step(
+            "followup_response",
+            {
+                "comprehensive_query": comprehensive_query or "Not available",
+                "query": query,
+                "retrieved_texts": "\n\n---\n\n".join([f"Segment {i+1}:\n{text}" for i, text in enumerate(segments)])
+            },
+            llm
+        )
+        
+        logger.info("Generated follow-up response from cached context")
+        return response
+    except Exception as e:
+        logger.error(f"Follow-up response generation failed: {str(e)}")
+        FALLBACKS_TOTAL.inc(function="generate_followup_response")
+        return generate_conversational_response(query)
+
+
 # Legacy function for backward compatibility
-def generate_questions(project_description: str, llm=llama_llm) -> list:
+def generate_questions(project_description: str, llm=None) -> list:
     """Legacy function that calls generate_initial_questions"""
     return generate_initial_questions(project_description, llm)
 
 
 # Legacy function for backward compatibility
-def process_answers(project_description: str, question_answers: Dict[str, str], llm=llama_llm) -> str:
+def process_answers(project_description: str, question_answers: Dict[str, str], llm=None) -> str:
     """Legacy function for backward compatibility"""
     # This function now just creates a placeholder for refined QA
     empty_refined_qa = {}
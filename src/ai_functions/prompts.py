@@ -1,5 +1,9 @@
 import os
 
+# Every template keeps its static instructions first and the per-call inputs last, so all
+# calls to a template share one long identical prefix. prompt_functions sends that prefix as
+# the system message, where provider-side prompt caching can reuse it.
+
 # -------------------
 # MODE DETECTION PROMPTS
 # -------------------
@@ -8,15 +12,50 @@ import os
 query_analysis_prompt = """
 As an AI assistant with dual expertise in general conversation and materials science, your task is to analyze the user's query and determine whether it's a general conversational query or a materials science-related technical query.
 
-User query: {query}
-
-Determine the appropriate mode for handling this query:
+Determine the appropriate mode for handling the user query given at the end:
 1. "CONVERSATIONAL" - For general, everyday questions unrelated to materials science, metallurgy, or engineering materials
 2. "MATERIAL_SCIENCE" - For queries related to material selection, metallurgy, material properties, engineering materials, or material-focused technical questions
 
 If the query relates to materials, their properties, selection, or application in engineering contexts, classify it as "MATERIAL_SCIENCE". If it's a general question about everyday topics unrelated to materials science, classify it as "CONVERSATIONAL".
 
 Respond with ONLY ONE of the two options: "CONVERSATIONAL" or "MATERIAL_SCIENCE". Do not include any other text, explanation, or analysis in your response.
+
+User query: {query}
+"""
+
+# Prompt to classify a query and, for materials science queries, generate the initial questions in the same call
+mode_and_questions_prompt = """
+As an AI assistant with dual expertise in general conversation and materials science, your task is to classify the user's query and, if it is a materials science query, generate the first questions needed to recommend a material.
+
+Step 1 - Determine the mode:
+1. "CONVERSATIONAL" - For general, everyday questions unrelated to materials science, metallurgy, or engineering materials
+2. "MATERIAL_SCIENCE" - For queries related to material selection, metallurgy, material properties, engineering materials, or material-focused technical questions
+
+Step 2 - Only if the mode is "MATERIAL_SCIENCE", generate EXACTLY 4 focused follow-up questions that will help determine the most appropriate material selection. These questions should:
+1. Identify critical performance requirements (strength, weight, temperature resistance, etc.)
+2. Determine environmental factors (corrosion, UV exposure, chemical exposure, etc.)
+3. Clarify manufacturing considerations (production method, quantity, cost constraints, etc.)
+4. Address application-specific needs (industry standards, aesthetic requirements, etc.)
+
+Do not ask general questions about project timeline, budget, or other factors not directly related to material properties and selection. For a "CONVERSATIONAL" query, return an empty list of questions.
+
+Step 3 - Rate your confidence in the mode as a number between 0 and 1 (below 0.6 if the query could reasonably be read either way).
+
+Respond with ONLY a valid JSON object of this form, with no other text:
+```json
+{{
+  "mode": "MATERIAL_SCIENCE",
+  "confidence": 0.9,
+  "questions": [
+    "What is the maximum operating temperature the material will be exposed to?",
+    "What are the strength requirements in terms of tensile, compressive, or impact resistance?",
+    "Will the material be exposed to corrosive chemicals or environments?",
+    "What manufacturing method will be used to form the material (machining, casting, 3D printing, etc.)?"
+  ]
+}}
+```
+
+User query: {query}
 """
 
 # -------------------
@@ -27,11 +66,11 @@ Respond with ONLY ONE of the two options: "CONVERSATIONAL" or "MATERIAL_SCIENCE"
 general_response_prompt = """
 You are a friendly, helpful AI assistant engaged in a natural conversation with the user. Provide a helpful, informative, and engaging response to their query.
 
-User query: {query}
-
 Respond in a natural, conversational tone. Be concise but thorough. If the query is unclear, ask for clarification. If the query relates to a sensitive topic, handle it appropriately while being respectful and informative.
 
 For this general conversation mode, avoid giving overly technical responses unless specifically requested by the user. Focus on being helpful, accurate, and friendly.
+
+User query: {query}
 """
 
 # -------------------
@@ -42,9 +81,7 @@ For this general conversation mode, avoid giving overly technical responses unle
 initial_questions_prompt = """
 You are an expert materials science engineer specializing in material selection for various applications and industries. Your task is to generate specific questions to determine the optimal material selection for a user's project or query about materials science.
 
-User query: {query}
-
-Based on this query, generate EXACTLY 4 focused follow-up questions that will help determine the most appropriate material selection or provide the most helpful information about materials science. These questions should:
+Based on the user query given at the end, generate EXACTLY 4 focused follow-up questions that will help determine the most appropriate material selection or provide the most helpful information about materials science. These questions should:
 
 1. Identify critical performance requirements (strength, weight, temperature resistance, etc.)
 2. Determine environmental factors (corrosion, UV exposure, chemical exposure, etc.)
@@ -55,28 +92,25 @@ Your questions should be specific, technical where appropriate, and directly rel
 
 Format your response as a valid JSON object with a single key "questions" containing EXACTLY 4 strings, each representing a technical question. Example format:
 ```json
-
+{{
   "questions": [
     "What is the maximum operating temperature the material will be exposed to?",
     "What are the strength requirements in terms of tensile, compressive, or impact resistance?",
     "Will the material be exposed to corrosive chemicals or environments?",
     "What manufacturing method will be used to form the material (machining, casting, 3D printing, etc.)?"
   ]
-
+}}
 ```
 
-Ensure your output is properly formatted as valid JSON that can be parsed directly.
+Respond with ONLY the JSON object, with no other text.
+
+User query: {query}
 """
 
 # Prompt to process answers and generate refined questions
 question_refiner_prompt = """
 You are an expert materials scientist specializing in material selection. Your task is to analyze a user's initial query and their responses to follow-up questions, then generate a new set of more refined, technical questions.
 
-Original query: {original_query}
-
-Initial questions and user responses:
-{question_answers}
-
 Based on the user's original query and their responses to the initial questions, generate EXACTLY 4 more refined, technical follow-up questions that will help pinpoint the optimal material recommendation. These questions should:
 
 1. Dive deeper into specific technical requirements based on the user's responses
@@ -86,31 +120,28 @@ Based on the user's original query and their responses to the initial questions,
 
 Format your response as a valid JSON object with a single key "questions" containing EXACTLY 4 strings, each representing a refined technical question. Example format:
 ```json
-
+{{
   "questions": [
     "Given your operating temperature of 200°C, what is the maximum short-term temperature spike the material might experience?",
     "You mentioned high strength requirements - can you specify the minimum yield strength in MPa that would be acceptable?",
     "Besides the salt spray exposure you mentioned, are there any other chemicals (oils, solvents, etc.) that the material will contact?",
     "For the injection molding process, what is the maximum acceptable material cost per kg and what production volume do you anticipate?"
   ]
-
+}}
 ```
 
-Ensure your output is properly formatted as valid JSON that can be parsed directly.
+Respond with ONLY the JSON object, with no other text.
+
+Original query: {original_query}
+
+Initial questions and user responses:
+{question_answers}
 """
 
 # Prompt to process all the answers and create a comprehensive query
 process_answers_prompt = """
 You are an expert materials scientist specializing in converting project requirements into precise material selection parameters. Your task is to synthesize a user query and their specifications into a comprehensive search query for material selection.
 
-Original Query: {original_query}
-
-Initial Question-Answer Pairs:
-{initial_qa}
-
-Refined Question-Answer Pairs:
-{refined_qa}
-
 Based on all the information provided, create a detailed and comprehensive query that precisely captures all material requirements. Your query should:
 
 1. Clearly articulate the type of component or structure being built
@@ -123,14 +154,39 @@ Based on all the information provided, create a detailed and comprehensive query
 Your output should be formatted as a detailed, technically precise paragraph that can be used to query a materials database. Focus on translating user inputs into specific material properties and requirements using precise materials science terminology where appropriate.
 
 The query should be comprehensive but concise, covering all critical information while eliminating redundancies.
+
+Original Query: {original_query}
+
+{requirements}
+"""
+
+# Prompt to fold the user's latest answers into the running requirements summary
+requirements_update_prompt = """
+You are an expert materials scientist keeping a running summary of a user's material requirements while they answer questions about their project. Your task is to update the summary with the user's latest answers.
+
+Rewrite the current summary so that it also captures every requirement, constraint or preference in the new answers:
+1. Keep every requirement already in the summary unless a new answer changes it, in which case keep only the new value
+2. Record quantities with their units (temperatures, loads, dimensions, budgets, production volumes)
+3. Translate vague answers into material requirements where possible, and note when the user has no specific requirement
+4. Ignore anything in the answers that is not a requirement, such as greetings or questions to the assistant
+
+Write the summary as one dense, technically precise paragraph no longer than the maximum length given below. Respond with ONLY the updated summary, with no heading or other text.
+
+Original query: {original_query}
+
+Maximum length: {max_words} words
+
+Current summary:
+{summary}
+
+New answers:
+{new_answers}
 """
 
 # Prompt to generate multiple sub-queries for materials search
 material_search_prompt = """
 You are an expert materials scientist with extensive knowledge of material selection methodologies and the Ashby approach to materials selection. Your task is to generate targeted sub-queries to search for appropriate materials based on a comprehensive project query.
 
-Comprehensive Query: {comprehensive_query}
-
 First, analyze the comprehensive query to extract all critical material requirements and constraints. Then, generate EXACTLY 4 targeted sub-queries that will help identify appropriate materials for this application. These sub-queries should:
 
 1. Focus on different, complementary aspects of the material requirements (mechanical, thermal, environmental, processing, etc.)
@@ -138,37 +194,63 @@ First, analyze the comprehensive query to extract all critical material requirem
 3. Be formulated to identify materials that meet specific aspects of the requirements
 4. Collectively cover all critical aspects of the material selection decision
 
-Your output should include:
-1. A brief analysis of the key material requirements from the comprehensive query
-2. Four specific sub-queries, each focusing on different aspects of the material selection challenge
-3. For each sub-query, a brief explanation of what aspect of material selection it addresses
-
-Format your response as:
-```
-## Key Material Requirements
-[Brief analysis of requirements]
-
-## Sub-Queries
-1. [First sub-query] - [Brief explanation]
-2. [Second sub-query] - [Brief explanation]
-3. [Third sub-query] - [Brief explanation]
-4. [Fourth sub-query] - [Brief explanation]
+Each sub-query is a search query only, without numbering or explanation. Respond with ONLY a valid JSON object of this form, with no other text:
+```json
+{{
+  "requirements": "Brief analysis of the key material requirements",
+  "sub_queries": [
+    "First sub-query",
+    "Second sub-query",
+    "Third sub-query",
+    "Fourth sub-query"
+  ]
+}}
 ```
 
 Ensure your sub-queries are technically precise and would be effective in identifying appropriate materials from a materials database.
+
+Comprehensive Query: {comprehensive_query}
 """
 
-# Prompt to analyze document content and find material candidates
-material_analysis_prompt = """
-You are an expert materials engineer tasked with analyzing materials science reference documents to identify and recommend materials for a specific application. Your expertise covers the complete materials selection process including property analysis, manufacturing considerations, and balancing multiple competing requirements.
+# Prompt to create the comprehensive query and the search sub-queries in one call
+requirements_and_search_prompt = """
+You are an expert materials scientist specializing in converting project requirements into precise material selection parameters, with extensive knowledge of the Ashby approach to materials selection. Your task is to synthesize a user query and their specifications into a comprehensive requirements summary, and to derive targeted sub-queries for searching a materials database.
+
+1. "comprehensive_query": a detailed, technically precise paragraph that captures all material requirements. It should:
+   - Clearly articulate the type of component or structure being built
+   - Specify all critical performance parameters (mechanical, thermal, electrical, etc.)
+   - Detail all environmental conditions the material must withstand
+   - Include manufacturing constraints and considerations
+   - Mention any aesthetic, functional surface or regulatory requirements
+   Translate user inputs into specific material properties using precise materials science terminology, covering all critical information while eliminating redundancies.
+
+2. "sub_queries": EXACTLY 4 targeted sub-queries that will help identify appropriate materials. They should:
+   - Focus on different, complementary aspects of the requirements (mechanical, thermal, environmental, processing, etc.)
+   - Use precise materials science terminology and property ranges where possible
+   - Collectively cover all critical aspects of the material selection decision
+   Each sub-query is a search query only, without numbering or explanation.
+
+Respond with ONLY a valid JSON object of this form, with no other text:
+```json
+{{
+  "comprehensive_query": "A lightweight bicycle frame requiring ...",
+  "sub_queries": [
+    "Materials with high specific stiffness and yield strength above 250 MPa",
+    "Materials resistant to salt spray corrosion and UV exposure",
+    "Weldable tube materials suitable for small-batch fabrication",
+    "Materials with fatigue resistance under cyclic loading from -10 to 50 C"
+  ]
+}}
+```
 
-User requirements: {comprehensive_query}
+Original Query: {original_query}
 
-Based on searches using the following sub-queries:
-{sub_queries}
+{requirements}
+"""
 
-Retrieved document segments:
-{retrieved_texts}
+# Prompt to analyze document content and find material candidates
+material_analysis_prompt = """
+You are an expert materials engineer tasked with analyzing materials science reference documents to identify and recommend materials for a specific application. Your expertise covers the complete materials selection process including property analysis, manufacturing considerations, and balancing multiple competing requirements.
 
 Analyze the document segments in the context of the user requirements and provide a comprehensive material selection recommendation that:
 
@@ -195,15 +277,18 @@ Your analysis should demonstrate deep materials engineering expertise by:
 - Providing specific, actionable recommendations
 
 Format your response with clear headings, bullet points for key information, and a professional, technical tone suitable for an engineering audience.
-"""
 
-comprehensive_response_prompt = """
-As a materials science subject matter expert with specialist knowledge across the discipline's theoretical foundations and practical applications, synthesize the following extracted document segments to provide an authoritative, comprehensive answer to the user's query.
+User requirements: {comprehensive_query}
 
-User query: {query}
+Based on searches using the following sub-queries:
+{sub_queries}
 
-=== Extracted Document Segments ===
+Retrieved document segments:
 {retrieved_texts}
+"""
+
+comprehensive_response_prompt = """
+As a materials science subject matter expert with specialist knowledge across the discipline's theoretical foundations and practical applications, synthesize the following extracted document segments to provide an authoritative, comprehensive answer to the user's query.
 
 Compose a substantial, technically precise response that:
 
@@ -223,4 +308,23 @@ Your response should demonstrate scientific authority through:
 - Identification of key relationships between materials characteristics
 
 Format your response as a comprehensive technical analysis suitable for a materials science professional seeking authoritative information. Include appropriate section headings for clarity and organization.
-"""
\ No newline at end of file
+
+User query: {query}
+
+=== Extracted Document Segments ===
+{retrieved_texts}
+"""
+
+# Prompt to answer follow-up questions after a recommendation using the session's retrieved context
+followup_response_prompt = """
+You are an expert materials engineer continuing a conversation with a user who has already received a material recommendation from you. Answer their follow-up question using the reference document segments below.
+
+Answer the follow-up question directly and concisely. Ground your answer in the document segments where possible and say so when the segments do not contain the information needed. Keep the user's original requirements in mind when comparing or qualifying materials, use precise materials science terminology, and include quantitative property values where the segments provide them.
+
+User requirements: {comprehensive_query}
+
+Follow-up question: {query}
+
+=== Reference Document Segments ===
+{retrieved_texts}
+"""
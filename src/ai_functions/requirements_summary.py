@@ -0,0 +1,110 @@
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+from loguru import logger
+from src.data_loader import settings
+from src.ai_functions.local_llm import estimate_tokens
+from src.ai_functions.prompt_functions import update_requirements_summary
+from src.monitoring.tracing import span
+
+# Updates run here so that answering a question never waits on the LLM
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="requirements-summary")
+
+_SENTENCE_END = re.compile(r"(?<=[.;!?])\s+")
+
+
+def bound_summary(text: str, max_tokens: int) -> str:
+    """
+    Cut a summary down to about `max_tokens` tokens.
+
+    The first sentence (usually what is being built) is kept, then as many of the most
+    recent sentences as fit, so an over-long summary loses its oldest details first.
+    """
+    text = " ".join(text.split())
+    # estimate_tokens counts 4 characters per token
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    sentences = _SENTENCE_END.split(text)
+    kept, budget = [], max_chars - len(sentences[0])
+    for sentence in reversed(sentences[1:]):
+        if len(sentence) + 1 > budget:
+            break
+        kept.insert(0, sentence)
+        budget -= len(sentence) + 1
+    return " ".join([sentences[0]] + kept)[:max_chars]
+
+
+class RequirementsSummary:
+    """
+    Session-scoped running summary of the user's material requirements.
+
+    Each answer is folded into the summary by one small LLM call that sees only the
+    current summary and the answers added since the last update, never the whole
+    history, and the result is kept under a fixed token budget. Prompts built from the
+    summary therefore stay the same size however long the session runs. Updates run in
+    the background as answers arrive; reading the summary waits for any still pending,
+    and answers that arrive during an update are folded in together by the next one.
+    """
+
+    def __init__(self, original_query: str, max_tokens: int = None, background: bool = True):
+        """
+        Args:
+            original_query (str): The query that started the session, the summary's starting point
+            max_tokens (int, optional): Size limit of the summary (defaults to settings.REQUIREMENTS_SUMMARY_MAX_TOKENS)
+            background (bool): Update as answers arrive rather than when the summary is read
+        """
+        self.original_query = original_query
+        self.max_tokens = max_tokens or settings.REQUIREMENTS_SUMMARY_MAX_TOKENS
+        self.background = background
+        self.summary = bound_summary(original_query, self.max_tokens)
+        self.answers_folded = 0
+        self.updates = 0
+
+        self._pending: List[Tuple[str, str]] = []
+        self._pending_lock = threading.Lock()
+        # Held for a whole update, so updates apply in the order the answers arrived
+        self._update_lock = threading.Lock()
+
+    def add_answer(self, question: str, answer: str):
+        """
+        Queue an answer (or any user message that may state a requirement) for the summary.
+
+        Args:
+            question (str): The question it answers, or a label such as "Follow-up question"
+            answer (str): The user's reply
+        """
+        with self._pending_lock:
+            self._pending.append((question, answer))
+        if self.background:
+            _executor.submit(self.flush)
+
+    def text(self) -> str:
+        """The summary with every answer added so far folded in"""
+        return self.flush()
+
+    def flush(self) -> str:
+        """
+        Fold all pending answers into the summary.
+
+        Returns:
+            str: The updated summary
+        """
+        with self._update_lock:
+            with self._pending_lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return self.summary
+
+            with span("requirements_summary_update", answers=len(batch)) as update_span:
+                updated = update_requirements_summary(
+                    self.original_query, self.summary, batch, max_words=self.max_tokens * 3 // 4
+                )
+                self.summary = bound_summary(updated, self.max_tokens)
+                self.answers_folded += len(batch)
+                self.updates += 1
+                update_span.set_attribute("summary_tokens", estimate_tokens(self.summary))
+            logger.info(f"Requirements summary: {self.answers_folded} answers in {estimate_tokens(self.summary)} tokens")
+            return self.summary
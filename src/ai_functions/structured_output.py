@@ -0,0 +1,250 @@
+import os
+import re
+import sys
+import ast
+import json
+from typing import Annotated, Any, List, Literal, Optional, Tuple, Type
+
+# Add the root project directory to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from loguru import logger
+from pydantic import BaseModel, BeforeValidator, Field, ValidationError, field_validator
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers.transform import BaseCumulativeTransformOutputParser
+from src.monitoring.metrics import STRUCTURED_OUTPUT_TOTAL
+
+_CLOSERS = {"{": "}", "[": "]"}
+_FENCE = re.compile(r"```(?:json|JSON)?\s*\n?(.*?)(?:```|$)", re.DOTALL)
+# A bare `"key":` before any bracket means the model left out the outer braces
+_BARE_KEY = re.compile(r'"[A-Za-z_][\w ]*"\s*:')
+# "1. text", "2) text", "- text" or "* text" at the start of a line
+_LIST_ITEM = re.compile(r"^\s*(?:\d+[.)]|[-*•])\s+(.+?)\s*$")
+
+
+# -------------------
+# SCHEMAS
+# -------------------
+
+def _clean_strings(values: Any) -> Any:
+    """Strip list items and drop empty ones (non-string items are left for validation to reject)"""
+    if not isinstance(values, list):
+        return values
+    return [v.strip() if isinstance(v, str) else v for v in values if not (isinstance(v, str) and not v.strip())]
+
+
+StringList = Annotated[List[str], BeforeValidator(_clean_strings)]
+
+
+class QuestionList(BaseModel):
+    """Output of generate_initial_questions and generate_refined_questions"""
+    questions: StringList = Field(min_length=1)
+
+
+class QueryAnalysis(BaseModel):
+    """Output of analyze_query: the mode, and the initial questions for a materials science query"""
+    mode: Literal["CONVERSATIONAL", "MATERIAL_SCIENCE"]
+    questions: StringList = Field(default_factory=list)
+    # The model's own confidence in the mode, used to escalate to a larger model
+    confidence: float = Field(default=1.0, ge=0.0, le=1.0)
+
+    @field_validator("mode", mode="before")
+    @classmethod
+    def _normalise_mode(cls, value):
+        return value.strip().upper().replace(" ", "_") if isinstance(value, str) else value
+
+
+class SubQueryPlan(BaseModel):
+    """Output of generate_sub_queries"""
+    requirements: str = ""
+    sub_queries: StringList = Field(min_length=1)
+
+
+class RequirementsAndSearch(BaseModel):
+    """Output of create_query_and_sub_queries"""
+    comprehensive_query: str = Field(min_length=1)
+    sub_queries: StringList = Field(min_length=1)
+
+
+# -------------------
+# PARSING AND REPAIR
+# -------------------
+
+def _json_start(text: str) -> Tuple[int, bool]:
+    """Index where the JSON value starts, and whether its outer braces are missing"""
+    brackets = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    first_bracket = min(brackets) if brackets else -1
+    bare_key = _BARE_KEY.search(text)
+    if bare_key and (first_bracket == -1 or bare_key.start() < first_bracket):
+        return bare_key.start(), True
+    return first_bracket, False
+
+
+def _candidates(text: str) -> List[str]:
+    """
+    Scan text once and return completions of its first JSON value, most complete first.
+
+    Tracks strings and open brackets so that truncated output can be closed, drops
+    trailing commas, escapes raw newlines in strings, and ignores anything after the
+    value. Besides the full completion, the text cut back to each earlier element
+    boundary is offered, for output truncated in the middle of a key or number.
+    """
+    start, wrap = _json_start(text)
+    if start == -1:
+        return []
+    out: List[str] = []
+    stack: List[str] = ["{"] if wrap else []
+    if wrap:
+        out.append("{")
+    boundaries: List[Tuple[int, Tuple[str, ...]]] = []
+    in_string = escaped = False
+
+    for char in text[start:]:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            elif char == "\n":
+                char = "\\n"
+            out.append(char)
+            continue
+        if char == '"':
+            in_string = True
+        elif char in _CLOSERS:
+            stack.append(char)
+        elif char in "}]":
+            if not stack or _CLOSERS[stack[-1]] != char:
+                break
+            while out and (out[-1].isspace() or out[-1] == ","):
+                out.pop()
+            stack.pop()
+            out.append(char)
+            if not stack:
+                break
+            continue
+        elif char == ",":
+            boundaries.append((len(out), tuple(stack)))
+        out.append(char)
+
+    def close(body: List[str], open_brackets) -> str:
+        closed = "".join(body).rstrip().rstrip(",").rstrip()
+        if closed.endswith(":"):
+            closed += " null"
+        return closed + "".join(_CLOSERS[b] for b in reversed(open_brackets))
+
+    candidates = [close(out + (['"'] if in_string else []), stack)]
+    for length, open_brackets in reversed(boundaries):
+        candidates.append(close(out[:length], open_brackets))
+    return candidates
+
+
+def parse_json_output(text: str) -> Tuple[Any, bool]:
+    """
+    Parse the JSON value in an LLM reply, repairing it if needed.
+
+    Handles code fences, prose around the value, missing outer braces, trailing commas,
+    raw newlines in strings, Python-style literals and output truncated mid-value.
+
+    Args:
+        text: Raw model output
+
+    Returns:
+        tuple: (parsed value, whether it had to be repaired)
+
+    Raises:
+        ValueError: If no JSON value can be recovered
+    """
+    stripped = text.strip()
+    try:
+        return json.loads(stripped), False
+    except json.JSONDecodeError:
+        pass
+
+    fenced = _FENCE.search(stripped)
+    candidates = _candidates(fenced.group(1)) if fenced else []
+    candidates += _candidates(stripped)
+    for candidate in candidates:
+        try:
+            return json.loads(candidate), True
+        except json.JSONDecodeError:
+            try:
+                value = ast.literal_eval(candidate)
+            except (ValueError, SyntaxError, MemoryError, RecursionError):
+                continue
+            if isinstance(value, (dict, list)):
+                return value, True
+    raise ValueError("No JSON value found in model output")
+
+
+def list_items(text: str) -> List[str]:
+    """Numbered or bulleted list items in free text, without the explanation after ' - '"""
+    items = []
+    for line in text.splitlines():
+        match = _LIST_ITEM.match(line)
+        if match:
+            # Only " - " separates an explanation, so hyphenated names like Ti-6Al-4V stay whole
+            item = match.group(1).split(" - ", 1)[0].strip().strip("*").strip()
+            if item:
+                items.append(item)
+    return items
+
+
+class StructuredOutputParser(BaseCumulativeTransformOutputParser[Any]):
+    """
+    Parses an LLM reply into a pydantic schema, repairing malformed JSON first.
+
+    While streaming it yields the repaired partial JSON as a dict; the final output is
+    validated against the schema. Every final parse is counted under
+    mse_structured_output_total by function and outcome, so failures are visible per
+    prompt rather than only as fallbacks.
+    """
+
+    pydantic_object: Type[BaseModel]
+    function: str
+    # Field to fill from a numbered/bulleted list when the reply contains no JSON at all
+    list_field: Optional[str] = None
+
+    def parse_result(self, result, *, partial: bool = False) -> Any:
+        text = result[0].text
+        if partial:
+            try:
+                return parse_json_output(text)[0]
+            except ValueError:
+                return None
+        return self.parse(text)
+
+    def parse(self, text: str) -> BaseModel:
+        try:
+            value, repaired = parse_json_output(text)
+        except ValueError as e:
+            items = list_items(text) if self.list_field else []
+            if not items:
+                self._record("invalid_json")
+                raise OutputParserException(f"{self.function}: {str(e)}", llm_output=text) from e
+            value, repaired = {self.list_field: items}, True
+
+        try:
+            parsed = self.pydantic_object.model_validate(value)
+        except ValidationError as e:
+            self._record("schema_error")
+            raise OutputParserException(f"{self.function}: output does not match {self.pydantic_object.__name__}: {str(e)}",
+                                        llm_output=text) from e
+
+        if repaired:
+            logger.warning(f"Repaired malformed structured output from {self.function}")
+        self._record("repaired" if repaired else "valid")
+        return parsed
+
+    def _record(self, outcome: str):
+        STRUCTURED_OUTPUT_TOTAL.inc(function=self.function, outcome=outcome)
+
+    def get_format_instructions(self) -> str:
+        return f"Respond with ONLY a JSON object matching this schema:\n{json.dumps(self.pydantic_object.model_json_schema())}"
+
+    @property
+    def _type(self) -> str:
+        return "structured_output"
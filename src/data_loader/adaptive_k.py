@@ -0,0 +1,79 @@
+from dataclasses import dataclass
+from typing import List
+
+from src.data_loader import settings
+
+
+def similarity_from_distance(distance: float) -> float:
+    """
+    Cosine similarity of two unit vectors from their squared L2 distance.
+
+    The index stores all-MiniLM-L6-v2 embeddings, which the model normalizes, and FAISS
+    reports squared L2 distances, so ||a - b||^2 = 2 - 2 cos(a, b).
+    """
+    return 1.0 - distance / 2.0
+
+
+@dataclass
+class Cutoff:
+    """How many ranked results to keep, and why the list was cut there"""
+    k: int
+    # "threshold", "gap", "margin", "max_k", or "exhausted" when fewer than max_k were found
+    reason: str
+    top_similarity: float
+    # Similarity of the last kept result and of the first dropped one (None if nothing was dropped)
+    last_similarity: float
+    next_similarity: float = None
+
+    @property
+    def gap(self) -> float:
+        """Similarity drop between the last kept and the first dropped result"""
+        return None if self.next_similarity is None else self.last_similarity - self.next_similarity
+
+
+def choose_k(distances: List[float], min_k: int = None, max_k: int = None, min_similarity: float = None,
+             max_gap: float = None, margin: float = None) -> Cutoff:
+    """
+    Choose how many of a query's ranked results to keep from their score distribution.
+
+    Results are kept best first until one falls below the similarity threshold, drops from
+    the previous one by more than the gap, or trails the best result by more than the margin.
+    A strong match followed by a drop therefore keeps few results, while a broad query whose
+    scores decline slowly keeps up to max_k. At least min_k results are kept when available.
+
+    Args:
+        distances (List[float]): Squared L2 distances, best first
+        min_k (int, optional): Fewest results kept (defaults to settings.ADAPTIVE_MIN_K)
+        max_k (int, optional): Most results kept (defaults to settings.ADAPTIVE_MAX_K)
+        min_similarity (float, optional): Similarity threshold (defaults to settings.ADAPTIVE_MIN_SIMILARITY)
+        max_gap (float, optional): Largest similarity drop between neighbours (defaults to settings.ADAPTIVE_MAX_GAP)
+        margin (float, optional): Largest distance from the best similarity (defaults to settings.ADAPTIVE_MARGIN)
+
+    Returns:
+        Cutoff: The number of results to keep, with the reason and the scores around the cut
+    """
+    min_k = settings.ADAPTIVE_MIN_K if min_k is None else min_k
+    max_k = settings.ADAPTIVE_MAX_K if max_k is None else max_k
+    min_similarity = settings.ADAPTIVE_MIN_SIMILARITY if min_similarity is None else min_similarity
+    max_gap = settings.ADAPTIVE_MAX_GAP if max_gap is None else max_gap
+    margin = settings.ADAPTIVE_MARGIN if margin is None else margin
+
+    similarities = [similarity_from_distance(distance) for distance in distances[:max_k]]
+    if not similarities:
+        return Cutoff(0, "exhausted", 0.0, 0.0)
+
+    top = similarities[0]
+    for i in range(max(1, min_k), len(similarities)):
+        similarity = similarities[i]
+        if similarity < min_similarity:
+            reason = "threshold"
+        elif similarities[i - 1] - similarity > max_gap:
+            reason = "gap"
+        elif top - similarity > margin:
+            reason = "margin"
+        else:
+            continue
+        return Cutoff(i, reason, top, similarities[i - 1], similarity)
+
+    reason = "max_k" if len(similarities) == max_k and len(distances) >= max_k else "exhausted"
+    return Cutoff(len(similarities), reason, top, similarities[-1])
@@ -0,0 +1,241 @@
+import os
+import re
+import json
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain.schema import Document
+from loguru import logger
+from src.data_loader import settings
+from src.data_loader.query_embeddings import embed_query
+from src.data_loader.sharded_index import ShardedIndex, index_exists, search_indexes
+from src.monitoring.metrics import CORPUS_EVICTIONS_TOTAL, CORPUS_MEMORY_BYTES
+
+# Descriptions of the corpora, used to route queries, kept next to the indexes
+CORPORA_FILE = "corpora.json"
+
+_CORPUS_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]*$")
+_corpora_lock = threading.Lock()
+
+
+def corpus_path(corpus: str = None) -> str:
+    """Index directory of a corpus (defaults to settings.DEFAULT_CORPUS)"""
+    corpus = corpus or settings.DEFAULT_CORPUS
+    if not _CORPUS_NAME.match(corpus):
+        raise ValueError(f"Invalid corpus name: {corpus!r} (letters, digits, '_' and '-' only)")
+    return os.path.join(settings.DOC_INDEXES_DIR, corpus)
+
+
+def corpus_data_dir(corpus: str = None) -> str:
+    """Source documents of a corpus: settings.DATA_DIR for the default corpus, settings.CORPORA_DIR/<name> otherwise"""
+    corpus = corpus or settings.DEFAULT_CORPUS
+    if corpus == settings.DEFAULT_CORPUS:
+        return settings.DATA_DIR
+    corpus_path(corpus)
+    return os.path.join(settings.CORPORA_DIR, corpus)
+
+
+def read_corpora() -> Dict[str, dict]:
+    """Corpus name -> {"description": ...} for every described corpus"""
+    path = os.path.join(settings.DOC_INDEXES_DIR, CORPORA_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def describe_corpus(corpus: str, description: str):
+    """
+    Record what a corpus covers, so queries can be routed to it.
+
+    Args:
+        corpus (str): Corpus name
+        description (str): A sentence naming the materials and topics it covers
+    """
+    corpus_path(corpus)
+    with _corpora_lock:
+        corpora = read_corpora()
+        corpora.setdefault(corpus, {})["description"] = description
+        path = os.path.join(settings.DOC_INDEXES_DIR, CORPORA_FILE)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(corpora, f, indent=2)
+        os.replace(tmp_path, path)
+
+
+def list_corpora() -> List[str]:
+    """Names of the corpora that have an index, the default corpus first"""
+    if not os.path.isdir(settings.DOC_INDEXES_DIR):
+        return []
+    names = sorted(
+        entry.name for entry in os.scandir(settings.DOC_INDEXES_DIR)
+        if entry.is_dir() and _CORPUS_NAME.match(entry.name) and index_exists(entry.path)
+    )
+    return sorted(names, key=lambda name: name != settings.DEFAULT_CORPUS)
+
+
+class CorpusRegistry:
+    """
+    Process-wide set of corpus indexes, loaded lazily and unloaded least recently used first.
+
+    Each corpus is a sharded index under settings.DOC_INDEXES_DIR. Its shards load on the
+    first search that needs them. When the estimated memory of all loaded corpora exceeds
+    the budget, the corpora used least recently are unloaded until it fits again. A corpus
+    is never unloaded while a search is using it. Searches over several corpora are
+    scattered across all their shards at once and merged by distance.
+    """
+
+    def __init__(self, memory_budget_mb: int = None):
+        """
+        Args:
+            memory_budget_mb (int, optional): Memory the loaded corpora may hold (defaults to settings.CORPUS_MEMORY_BUDGET_MB)
+        """
+        self.memory_budget_bytes = (memory_budget_mb or settings.CORPUS_MEMORY_BUDGET_MB) * 1024 * 1024
+        # Least recently used first
+        self._indexes: "OrderedDict[str, ShardedIndex]" = OrderedDict()
+        self._in_use: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def index(self, corpus: str = None) -> ShardedIndex:
+        """The corpus's index reader (its shards are not loaded until searched)"""
+        corpus = corpus or settings.DEFAULT_CORPUS
+        with self._lock:
+            if corpus not in self._indexes:
+                self._indexes[corpus] = ShardedIndex(corpus_path(corpus))
+            self._indexes.move_to_end(corpus)
+            return self._indexes[corpus]
+
+    @contextmanager
+    def use(self, corpora: List[str]) -> Iterator[List[ShardedIndex]]:
+        """Hold corpora loaded for the duration of a search, then enforce the memory budget"""
+        indexes = [self.index(corpus) for corpus in corpora]
+        with self._lock:
+            for corpus in corpora:
+                self._in_use[corpus] = self._in_use.get(corpus, 0) + 1
+        try:
+            yield indexes
+        finally:
+            with self._lock:
+                for corpus in corpora:
+                    self._in_use[corpus] -= 1
+            self.evict()
+
+    def memory_bytes(self) -> Dict[str, int]:
+        """Estimated memory held by each registered corpus"""
+        with self._lock:
+            return {corpus: index.memory_bytes for corpus, index in self._indexes.items()}
+
+    def evict(self) -> List[str]:
+        """
+        Unload the least recently used idle corpora until the loaded ones fit the budget.
+
+        Returns:
+            List[str]: Corpora unloaded
+        """
+        evicted = []
+        with self._lock:
+            sizes = {corpus: index.memory_bytes for corpus, index in self._indexes.items()}
+            total = sum(sizes.values())
+            for corpus, index in list(self._indexes.items()):
+                if total <= self.memory_budget_bytes:
+                    break
+                if self._in_use.get(corpus) or not sizes[corpus]:
+                    continue
+                total -= index.unload()
+                evicted.append(corpus)
+                CORPUS_EVICTIONS_TOTAL.inc(corpus=corpus)
+            for corpus, index in self._indexes.items():
+                CORPUS_MEMORY_BYTES.set(index.memory_bytes, corpus=corpus)
+        if evicted:
+            logger.info(f"Unloaded corpora {evicted} to stay within {self.memory_budget_bytes / 2 ** 20:.0f} MB; "
+                        f"{total / 2 ** 20:.0f} MB still loaded")
+        elif total > self.memory_budget_bytes:
+            logger.warning(f"Corpora in use hold {total / 2 ** 20:.0f} MB, over the "
+                           f"{self.memory_budget_bytes / 2 ** 20:.0f} MB budget")
+        return evicted
+
+    def search(self, corpora: List[str], embeddings, query_vector: List[float], k: int,
+               filters: dict = None) -> List[Tuple[Document, float]]:
+        """
+        Search one or more corpora and merge their results.
+
+        Args:
+            corpora (List[str]): Corpora to search
+            embeddings: Embeddings object handed to FAISS.load_local
+            query_vector (List[float]): Embedded query
+            k (int): Number of results overall
+            filters (dict, optional): Metadata filters (see MetadataTable.mask)
+
+        Returns:
+            List[Tuple[Document, float]]: Chunks and their distances, best first
+        """
+        with self.use(corpora) as indexes:
+            return search_indexes(indexes, embeddings, query_vector, k, filters)
+
+    def stored_vectors(self, documents: List[Document]) -> List[Optional[np.ndarray]]:
+        """
+        Stored embeddings of retrieved chunks, looked up in the loaded corpora.
+
+        Args:
+            documents (List[Document]): Chunks returned by a search
+
+        Returns:
+            List[Optional[np.ndarray]]: One embedding per document, None where it is no longer
+                                        loaded (e.g. its corpus was unloaded since the search)
+        """
+        with self._lock:
+            indexes = list(self._indexes.values())
+        vectors = {}
+        try:
+            for index in indexes:
+                vectors.update(index.stored_vectors([doc for doc in documents if getattr(doc, "id", None) not in vectors]))
+        except Exception as e:
+            logger.warning(f"Could not read stored embeddings, they will be recomputed: {str(e)}")
+        return [vectors.get(getattr(doc, "id", None)) for doc in documents]
+
+    def route(self, query_vector: List[float], corpora: List[str], margin: float = None) -> List[str]:
+        """
+        Pick the corpora a query should be sent to.
+
+        The query is compared with the embedded description of each corpus. Corpora whose
+        similarity is within `margin` of the best are kept. Corpora without a description
+        are always kept, since nothing says what they cover.
+
+        Args:
+            query_vector (List[float]): Embedded query
+            corpora (List[str]): Candidate corpora (e.g. the session's)
+            margin (float, optional): Cosine similarity margin (defaults to settings.CORPUS_ROUTING_MARGIN)
+
+        Returns:
+            List[str]: The corpora to search, in the order given
+        """
+        margin = settings.CORPUS_ROUTING_MARGIN if margin is None else margin
+        descriptions = {corpus: entry.get("description") for corpus, entry in read_corpora().items()}
+        described = [corpus for corpus in corpora if descriptions.get(corpus)]
+        if len(corpora) < 2 or not described:
+            return list(corpora)
+
+        query = np.asarray(query_vector, dtype="float32")
+        # Descriptions are embedded once, then served from the query embedding cache
+        vectors = np.asarray([embed_query(descriptions[corpus]) for corpus in described], dtype="float32")
+        similarities = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query) + 1e-12)
+        best = float(similarities.max())
+        selected = {corpus for corpus, similarity in zip(described, similarities) if similarity >= best - margin}
+        return [corpus for corpus in corpora if corpus in selected or corpus not in described]
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> CorpusRegistry:
+    """The process-wide registry, so every session shares the loaded corpora and the memory budget"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = CorpusRegistry()
+        return _registry
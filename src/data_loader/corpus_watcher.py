@@ -0,0 +1,182 @@
+import os
+import time
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+from src.data_loader import settings
+from src.data_loader.doc_loader import SUPPORTED_EXTENSIONS, list_corpus_files
+from src.data_loader.extraction_cache import file_hash
+from src.data_loader.corpus_registry import corpus_path
+from src.data_loader.ingestion import SETTLE_SECONDS, IngestionQueue
+from src.data_loader.sharded_index import indexed_doc_names, indexed_sources
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # Optional: without watchdog the corpus is rescanned on a timer
+    FileSystemEventHandler = object
+    Observer = None
+
+
+class _ChangeHandler(FileSystemEventHandler):
+    """Marks the watcher dirty on any change to a supported file or a directory"""
+
+    def __init__(self, watcher: "CorpusWatcher"):
+        super().__init__()
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        paths = [event.src_path, getattr(event, "dest_path", "")]
+        if event.is_directory or any(Path(path).suffix.lower() in SUPPORTED_EXTENSIONS for path in paths if path):
+            self.watcher.mark_dirty()
+
+
+class CorpusWatcher:
+    """
+    Keeps the live index in step with a corpus directory.
+
+    Changes are picked up from filesystem events (watchdog/inotify) or, without watchdog,
+    by rescanning on a timer. After a quiet period the corpus is diffed against the files
+    recorded in the live index manifest, and the differences are queued as add (new or
+    changed content) and delete (file removed) jobs for the ingestion worker.
+    """
+
+    def __init__(self, queue: IngestionQueue, root: str = None, index_root: str = None,
+                 debounce_seconds: float = None, poll_seconds: float = None,
+                 on_queued: Callable[[], None] = None):
+        """
+        Args:
+            queue (IngestionQueue): Queue the changes are sent to
+            root (str, optional): Corpus directory (defaults to settings.DATA_DIR)
+            index_root (str, optional): Index to compare against (defaults to the default corpus)
+            debounce_seconds (float, optional): Quiet period before syncing (defaults to settings.WATCH_DEBOUNCE_SECONDS)
+            poll_seconds (float, optional): Rescan interval without watchdog (defaults to settings.WATCH_POLL_SECONDS)
+            on_queued (Callable, optional): Called after jobs were queued (e.g. to wake the worker)
+        """
+        self.queue = queue
+        self.root = os.path.abspath(root or settings.DATA_DIR)
+        self.index_root = index_root or corpus_path()
+        self.debounce_seconds = debounce_seconds if debounce_seconds is not None else settings.WATCH_DEBOUNCE_SECONDS
+        self.poll_seconds = poll_seconds or settings.WATCH_POLL_SECONDS
+        self.on_queued = on_queued
+        # path -> (size, mtime_ns, sha256), so unchanged files are not hashed again
+        self._hashes: Dict[str, Tuple[int, int, str]] = {}
+        self._dirty = threading.Event()
+        self._last_change = 0.0
+        self._stop = threading.Event()
+
+    def mark_dirty(self):
+        self._last_change = time.monotonic()
+        self._dirty.set()
+
+    def snapshot(self) -> Tuple[Dict[str, str], bool]:
+        """
+        Content hash of every settled file in the corpus.
+
+        Returns:
+            tuple: (path -> sha256, whether some files were skipped because they are still being written)
+        """
+        hashes, unsettled = {}, False
+        now = time.time()
+        for path in list_corpus_files(self.root):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime < SETTLE_SECONDS:
+                unsettled = True
+                continue
+            cached = self._hashes.get(path)
+            if cached is None or cached[:2] != (stat.st_size, stat.st_mtime_ns):
+                cached = (stat.st_size, stat.st_mtime_ns, file_hash(path))
+                self._hashes[path] = cached
+            hashes[path] = cached[2]
+        for path in set(self._hashes) - set(hashes):
+            if not os.path.exists(path):
+                del self._hashes[path]
+        return hashes, unsettled
+
+    def diff(self, corpus: Dict[str, str]) -> Tuple[List[str], List[str]]:
+        """
+        Compare the corpus with the files recorded in the live index.
+
+        Files indexed before source files were recorded (e.g. a pre-sharding index) are
+        matched by document name, so they are not embedded a second time.
+
+        Returns:
+            tuple: (files to add or re-index, files to remove), both sorted
+        """
+        sources = indexed_sources(self.index_root)
+        added = [path for path, sha256 in corpus.items() if sources.get(path) != sha256]
+        if added:
+            recorded_names = {Path(path).stem for path in sources}
+            unrecorded_names = indexed_doc_names(self.index_root) - recorded_names
+            added = [path for path in added if path in sources or Path(path).stem not in unrecorded_names]
+        # Only files under the watched directory are this watcher's to remove
+        removed = [path for path in sources if path not in corpus and path.startswith(self.root + os.sep)
+                   and not os.path.exists(path)]
+        return sorted(added), sorted(removed)
+
+    def sync(self) -> int:
+        """
+        Queue the differences between the corpus and the live index.
+
+        Returns:
+            int: Jobs queued (changes that could not be queued are retried on the next sync)
+        """
+        corpus, unsettled = self.snapshot()
+        added, removed = self.diff(corpus)
+        queued, refused = 0, False
+        for path, action in [(path, "add") for path in added] + [(path, "delete") for path in removed]:
+            if self.queue.enqueue(path, action) is None:
+                refused = True
+                continue
+            queued += 1
+        if unsettled or refused:
+            # Check again once the copy finishes or the queue drains
+            self.mark_dirty()
+        if added or removed:
+            logger.info(f"Corpus sync: {len(added)} to index, {len(removed)} to remove, {queued} queued")
+        if queued and self.on_queued is not None:
+            self.on_queued()
+        return queued
+
+    def run(self):
+        """Watch until stop() is called, syncing after each quiet period"""
+        observer = None
+        if Observer is not None:
+            try:
+                observer = Observer()
+                observer.schedule(_ChangeHandler(self), self.root, recursive=True)
+                observer.start()
+                logger.info(f"Watching {self.root} for changes")
+            except Exception as e:
+                logger.warning(f"Filesystem events unavailable ({str(e)}); polling {self.root} instead")
+                observer = None
+        else:
+            logger.info(f"watchdog is not installed; polling {self.root} every {self.poll_seconds:.0f}s")
+
+        # With events, a slow rescan still catches anything the observer missed
+        rescan_seconds = self.poll_seconds if observer is None else max(self.poll_seconds, 60.0)
+        last_sync = 0.0
+        try:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                quiet = now - self._last_change >= self.debounce_seconds
+                if (self._dirty.is_set() and quiet) or now - last_sync >= rescan_seconds:
+                    self._dirty.clear()
+                    try:
+                        self.sync()
+                    except Exception as e:
+                        logger.error(f"Corpus sync failed: {str(e)}")
+                    last_sync = time.monotonic()
+                self._stop.wait(0.2)
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+
+    def stop(self):
+        self._stop.set()
@@ -1,5 +1,7 @@
 import os
 import sys
+from itertools import islice
+from typing import Callable, Iterator, List
 
 import docx
 from langchain_community.document_loaders import TextLoader
@@ -8,92 +10,289 @@ from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
 from src.data_loader import settings
 from loguru import logger
-from src.data_loader.pdf_loader import load_pdf 
+from src.data_loader.pdf_loader import iter_pdf_pages
+from src.data_loader.extraction_cache import file_hash, iter_cached_pages
+from src.data_loader.structure_chunker import StructureAwareChunker
+from src.data_loader.property_index import PROPERTY_INDEX_FILE, PropertyIndex
+from src.data_loader.sharded_index import (
+    SHARDS_DIR,
+    index_exists,
+    read_manifest,
+    register_shard,
+    remove_source,
+    search_indexes,
+    shard_name_for_source,
+    shard_path,
+)
+from src.data_loader.index_versions import new_version
+from src.data_loader.adaptive_k import choose_k
+from src.data_loader.corpus_registry import corpus_path, get_registry
+from src.data_loader.query_embeddings import embed_query, get_embeddings
+from src.data_loader.vector_compression import load_full_vectors, save_vector_store, to_flat_index
+from src.monitoring.tracing import span
+from src.monitoring.metrics import (
+    RETRIEVAL_ADAPTIVE_K,
+    RETRIEVAL_ERRORS_TOTAL,
+    RETRIEVAL_RESULTS_TOTAL,
+    RETRIEVAL_SECONDS,
+)
 
-def create_and_save_document_index(embeddings, document_path):
+def iter_document_pages(document_path: str, use_cache: bool = None) -> Iterator[Document]:
     """
-    Processes documents (PDF, DOCX/DOC, TXT), creates embeddings, and saves to a single FAISS index.
+    Lazily extract a document (PDF, DOCX/DOC, TXT) as LangChain Documents.
+    
+    PDFs are yielded one page at a time so large textbooks never have to be held in memory whole.
+    Extractions are cached by file content, so re-indexing an unchanged file skips parsing.
     
     Args:
-        embeddings: The embeddings object to use
         document_path (str): Path to the document
+        use_cache (bool): Read/write the extraction cache (defaults to settings.EXTRACTION_CACHE_ENABLED)
         
-    Returns:
-        str: Path where the index was saved
+    Yields:
+        Document: Extracted documents (one per page for PDFs)
     """
-    # Ensure output directory exists
-    os.makedirs(settings.DOC_INDEXES_DIR, exist_ok=True)
-    
-    # Use a common index name for all documents
-    save_path = os.path.join(settings.DOC_INDEXES_DIR, "materials_database")
-    
-    # Load document based on file type
+    if use_cache is None:
+        use_cache = settings.EXTRACTION_CACHE_ENABLED
+    if use_cache:
+        return iter_cached_pages(document_path, _extract_document_pages)
+    return _extract_document_pages(document_path)
+
+
+def _extract_document_pages(document_path: str) -> Iterator[Document]:
+    """Extract a document's pages with the loader for its file type"""
     file_ext = os.path.splitext(document_path)[1].lower()
     doc_name = os.path.splitext(os.path.basename(document_path))[0]
     
     try:
         if file_ext == '.pdf':
-            # Use the load_pdf function from pdf_loader.py
-            documents = load_pdf(document_path)
+            for page in iter_pdf_pages(document_path):
+                page.metadata["doc_name"] = doc_name
+                yield page
         elif file_ext in ['.docx', '.doc']:
             doc = docx.Document(document_path)
             paragraphs = [p.text for p in doc.paragraphs if p.text.strip()]
             text = "\n\n".join(paragraphs)
-            documents = [Document(page_content=text, metadata={"source": document_path, "type": "word", "doc_name": doc_name})]
+            yield Document(page_content=text, metadata={"source": document_path, "type": "word", "doc_name": doc_name})
         elif file_ext == '.txt':
             loader = TextLoader(document_path)
-            documents = loader.load()
-            # Add doc_name to metadata
-            for doc in documents:
+            for doc in loader.lazy_load():
+                # Add doc_name to metadata
                 doc.metadata["doc_name"] = doc_name
+                yield doc
         else:
             raise ValueError(f"Unsupported file format: {file_ext}")
     except Exception as e:
         logger.error(f"Error loading document {document_path}: {str(e)}")
         raise ValueError(f"Failed to load or process document: {document_path} due to {str(e)}")
 
-    # Split text into chunks
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=2000,
-        chunk_overlap=150,  # Increased overlap for better context preservation
-        length_function=len,
-        separators=["\n\n", "\n", ". ", " ", ""]
-    )
-    split_documents = text_splitter.split_documents(documents)
+
+def load_document(document_path: str, use_cache: bool = None) -> list:
+    """
+    Extract a document (PDF, DOCX/DOC, TXT) into LangChain Documents.
+    
+    Args:
+        document_path (str): Path to the document
+        use_cache (bool): Read/write the extraction cache (defaults to settings.EXTRACTION_CACHE_ENABLED)
+        
+    Returns:
+        List[Document]: Extracted documents (one per page for PDFs)
+    """
+    return list(iter_document_pages(document_path, use_cache))
+
+
+def create_chunker(chunker: str = None):
+    """
+    Create the chunker for one document.
+    
+    Args:
+        chunker (str): "recursive" or "structure" (defaults to settings.CHUNKER)
+        
+    Returns:
+        StructureAwareChunker or None: None means plain recursive character splitting
+    """
+    chunker = chunker or settings.CHUNKER
+    if chunker == "structure":
+        return StructureAwareChunker(use_pdfplumber_tables=settings.CHUNKER_PDF_TABLES)
+    if chunker != "recursive":
+        raise ValueError(f"Unknown chunker: {chunker}")
+    return None
+
+
+def split_documents(documents: list, doc_name: str, chunker: StructureAwareChunker = None) -> list:
+    """
+    Split extracted documents into overlapping chunks for embedding.
+    
+    Args:
+        documents (List[Document]): Extracted documents
+        doc_name (str): Name recorded in each chunk's metadata if not already set
+        chunker (StructureAwareChunker, optional): Structure-aware chunker to use instead of
+                                                  fixed-size character splitting
+        
+    Returns:
+        List[Document]: Chunked documents
+    """
+    if chunker is not None:
+        chunks = chunker.split_documents(documents)
+    else:
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=2000,
+            chunk_overlap=150,  # Increased overlap for better context preservation
+            length_function=len,
+            separators=["\n\n", "\n", ". ", " ", ""]
+        )
+        chunks = text_splitter.split_documents(documents)
     
     # Add document name to metadata if not already present
-    for doc in split_documents:
+    for doc in chunks:
         if "doc_name" not in doc.metadata:
             doc.metadata["doc_name"] = doc_name
     
-    logger.info(f"Split document {doc_name} into {len(split_documents)} chunks")
+    return chunks
 
+
+def create_and_save_document_index(embeddings, document_path, chunker: str = None, index_path: str = None,
+                                   index_type: str = None, replace: bool = False,
+                                   on_batch: Callable[[int, int], None] = None, corpus: str = None):
+    """
+    Processes documents (PDF, DOCX/DOC, TXT), creates embeddings, and saves them to the
+    document's shard of the unified FAISS index. Other documents' shards are not rewritten.
+    
+    Args:
+        embeddings: The embeddings object to use
+        document_path (str): Path to the document
+        chunker (str, optional): "recursive" or "structure" (defaults to settings.CHUNKER)
+        index_path (str, optional): Unpublished index version to write into (from begin_version).
+                                    Without one, a new version is built and published for this document.
+        index_type (str, optional): Embedding storage format, "flat", "fp16", "sq8" or "pq"
+                                    (defaults to settings.INDEX_TYPE)
+        replace (bool): Start the document's shard afresh instead of adding to it (for a changed file)
+        on_batch (Callable[[int, int], None], optional): Called with the pages and chunks processed so far
+                                                         after each batch (used for progress and throttling)
+        corpus (str, optional): Corpus to publish into when no index_path is given (defaults to settings.DEFAULT_CORPUS)
+        
+    Returns:
+        str: Path where the shard was saved
+    """
+    # Ensure output directory exists
+    os.makedirs(settings.DOC_INDEXES_DIR, exist_ok=True)
+    
+    # One index per corpus, with one shard per document
+    index_root = corpus_path(corpus)
+    
+    if index_path is None:
+        with new_version(index_root) as version_path:
+            return create_and_save_document_index(embeddings, document_path, chunker, index_path=version_path,
+                                                  index_type=index_type, replace=replace, on_batch=on_batch)
+    
+    doc_name = os.path.splitext(os.path.basename(document_path))[0]
+    # Keyed by the file's path, so files with the same name in different folders don't share a shard
+    shard_name = shard_name_for_source(document_path)
+    # Published shards are immutable: the current shard (possibly in an older version) is
+    # read, and the updated shard is always written into this version
+    existing_path = shard_path(index_path, shard_name)
+    save_path = os.path.join(index_path, SHARDS_DIR, shard_name)
+    
     try:
-        # Create a proper HuggingFaceEmbeddings wrapper around SentenceTransformer
-        # This is needed because SentenceTransformer uses .encode() while LangChain expects .embed_documents()
-        from langchain_community.embeddings import HuggingFaceEmbeddings
+        # The process-wide HuggingFaceEmbeddings wrapper, so indexing never loads a second model
+        hf_embeddings = get_embeddings()
+
+        # Check if the document's shard already exists; other shards are left untouched
+        vectorstore = None
+        if not replace and os.path.exists(os.path.join(existing_path, "index.faiss")):
+            # Load existing shard
+            logger.info(f"Loading existing shard at {existing_path}")
+            vectorstore = FAISS.load_local(existing_path, hf_embeddings, allow_dangerous_deserialization=True)
+            # New vectors are added at full precision; the shard is compressed again on save
+            vectorstore.index = to_flat_index(vectorstore.index, load_full_vectors(existing_path))
+    except Exception as e:
+        logger.error(f"Error loading FAISS index for {document_path}: {str(e)}")
+        raise ValueError(f"Failed to create or save index for document: {document_path} due to {str(e)}")
+    
+    # Property values are extracted from whole pages, so tables aren't cut by chunk boundaries
+    property_index = None
+    if settings.PROPERTY_INDEX_ENABLED:
+        property_index = PropertyIndex() if replace else PropertyIndex.load_or_create(os.path.join(existing_path, PROPERTY_INDEX_FILE))
+    property_values = 0
+    
+    # Stream pages through the splitter and embedder in batches so peak memory
+    # stays flat regardless of how long the document is
+    pages = iter_document_pages(document_path)
+    document_chunker = create_chunker(chunker)
+    total_pages = 0
+    total_chunks = 0
+    while True:
+        # Load document based on file type
+        with span("index.extract", document=doc_name) as extract_span:
+            batch = list(islice(pages, settings.INDEX_PAGE_BATCH_SIZE))
+            extract_span.set_attribute("pages", len(batch))
+        if not batch:
+            break
+        total_pages += len(batch)
+        
+        if property_index is not None:
+            with span("index.properties", document=doc_name) as property_span:
+                added = property_index.add_documents(batch)
+                property_span.set_attribute("values", added)
+            property_values += added
         
-        # Create HuggingFace embeddings from the model
-        hf_embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+        # Split text into chunks
+        with span("index.split", document=doc_name) as split_span:
+            chunks = split_documents(batch, doc_name, document_chunker)
+            split_span.set_attribute("chunks", len(chunks))
+        if not chunks:
+            if on_batch is not None:
+                on_batch(total_pages, total_chunks)
+            continue
+        total_chunks += len(chunks)
         
-        # Check if index already exists
-        if os.path.exists(os.path.join(save_path, "index.faiss")):
-            # Load existing index
-            logger.info(f"Loading existing index at {save_path}")
-            vectorstore = FAISS.load_local(save_path, hf_embeddings, allow_dangerous_deserialization=True)
+        try:
+            # Embed explicitly so embedding and FAISS insertion are timed as separate stages
+            texts = [chunk.page_content for chunk in chunks]
+            metadatas = [chunk.metadata for chunk in chunks]
+            with span("index.embed", vectors=len(texts)):
+                vectors = hf_embeddings.embed_documents(texts)
             
-            # Add new documents to existing index
-            vectorstore.add_documents(split_documents)
-        else:
-            # Create new vector store from split documents
-            logger.info(f"Creating new index at {save_path}")
-            vectorstore = FAISS.from_documents(split_documents, hf_embeddings)
+            with span("index.faiss_add", vectors=len(texts)):
+                if vectorstore is not None:
+                    # Add new documents to existing index
+                    vectorstore.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas)
+                else:
+                    # Create new vector store from split documents
+                    logger.info(f"Creating new shard at {save_path}")
+                    vectorstore = FAISS.from_embeddings(list(zip(texts, vectors)), hf_embeddings, metadatas=metadatas)
+        except Exception as e:
+            logger.error(f"Error creating or saving FAISS index for {document_path}: {str(e)}")
+            if document_chunker is not None:
+                document_chunker.close()
+            raise ValueError(f"Failed to create or save index for document: {document_path} due to {str(e)}")
         
-        # Ensure directory exists for saving the index
-        os.makedirs(os.path.dirname(save_path), exist_ok=True)
+        if on_batch is not None:
+            on_batch(total_pages, total_chunks)
+    
+    if document_chunker is not None:
+        document_chunker.close()
+    logger.info(f"Split document {doc_name} ({total_pages} pages) into {total_chunks} chunks")
+    if not total_chunks:
+        raise ValueError(f"No text could be extracted from document: {document_path}")
+    
+    try:
+        # Ensure directory exists for saving the shard
+        os.makedirs(save_path, exist_ok=True)
         
         # Save the FAISS index
-        vectorstore.save_local(save_path)
+        with span("index.save", vectors=vectorstore.index.ntotal) as save_span:
+            saved_type = save_vector_store(vectorstore, save_path, index_type)
+            save_span.set_attribute("index_type", saved_type)
+            if property_index is not None:
+                property_index.save(os.path.join(save_path, PROPERTY_INDEX_FILE))
+                logger.info(f"Extracted {property_values} property values from {doc_name}")
+        # Source files and their content hashes let the corpus watcher tell what is already indexed
+        sources = {} if replace else dict(read_manifest(index_path)["shards"].get(shard_name, {}).get("sources") or {})
+        sources[os.path.abspath(document_path)] = file_hash(document_path)
+        register_shard(index_path, shard_name, doc_name, vectorstore.index.ntotal, path=save_path,
+                       index_type=saved_type, sources=sources)
+        # Chunks of this file in another shard (one keyed by document name in an older index) are superseded
+        remove_source(index_path, document_path, hf_embeddings, keep=shard_name)
     except Exception as e:
         logger.error(f"Error creating or saving FAISS index for {document_path}: {str(e)}")
         raise ValueError(f"Failed to create or save index for document: {document_path} due to {str(e)}")
@@ -101,50 +300,123 @@ def create_and_save_document_index(embeddings, document_path):
     logger.success(f"Successfully indexed {document_path} → {save_path}")
     return save_path
 
+def warm_up_index(queries: List[str], corpus: str = None) -> dict:
+    """
+    Take the cold-start costs of retrieval before the first user query does.
+
+    Runs representative queries through the embedding model (loading it and warming its
+    tokenizer and kernels) and through the index, then loads every shard and pages in its
+    memory-mapped vectors.
+
+    Args:
+        queries (List[str]): Representative search queries
+        corpus (str, optional): Corpus to warm (defaults to settings.DEFAULT_CORPUS)
+
+    Returns:
+        dict: Queries run, shards loaded, vectors loaded and bytes paged in
+    """
+    corpus = corpus or settings.DEFAULT_CORPUS
+    stats = {"queries": len(queries), "shards": 0, "vectors": 0, "bytes_touched": 0}
+    with span("retrieval_warm_up", queries=len(queries)) as warm_span:
+        hf_embeddings = get_embeddings()
+        # Embedded directly, not through the cache, so the model really runs
+        vectors = hf_embeddings.embed_documents(list(queries)) if queries else []
+        if index_exists(corpus_path(corpus)):
+            registry = get_registry()
+            for vector in vectors:
+                registry.search([corpus], hf_embeddings, vector, 5)
+            with registry.use([corpus]) as (sharded_index,):
+                stats["bytes_touched"] = sharded_index.warm(hf_embeddings)
+                stats["shards"] = len(sharded_index.shards)
+                stats["vectors"] = sharded_index.loaded_vectors
+        for key, value in stats.items():
+            warm_span.set_attribute(key, value)
+    RETRIEVAL_SECONDS.observe(warm_span.duration_ms / 1000, stage="warm_up")
+    stats["seconds"] = warm_span.duration_ms / 1000
+    return stats
+
+
 def retrieve_documents(
     embeddings,
     query: str,
     document_name: str = None,  # Now optional
     search_type: str = "similarity",  # Changed default to similarity
-    k: int = 5
+    k: int = 5,
+    filters: dict = None,
+    adaptive: bool = False,
+    corpora: List[str] = None,
+    route: bool = False
 ) -> list:
     """
-    Retrieve relevant documents from the materials database based on a query.
+    Retrieve relevant documents from one or more corpora based on a query.
     
     Args:
-        embeddings: The embeddings object to use (ignored, we create our own)
+        embeddings: The embeddings object to use (ignored, the process-wide model is used)
         query (str): Search query or question
-        document_name (str, optional): Name of the specific document index to search.
-                                      If None, searches the unified database.
+        document_name (str, optional): Restrict the search to one document of the unified
+                                      database (shorthand for filters={"doc_name": ...})
         search_type (str): Type of search ('mmr' or 'similarity')
-        k (int): Number of documents to return
+        k (int): Number of documents to return (ignored when adaptive)
+        filters (dict, optional): Metadata filters applied inside the FAISS search: doc_name,
+                                  type, chunk_type, page_min/page_max (0-based, inclusive), section
+        adaptive (bool): Choose the number of documents from the score distribution, between
+                         settings.ADAPTIVE_MIN_K and settings.ADAPTIVE_MAX_K (see choose_k)
+        corpora (List[str], optional): Corpora to search, with results merged by distance
+                                       (defaults to [settings.DEFAULT_CORPUS])
+        route (bool): Search only the corpora whose description matches the query (see CorpusRegistry.route)
     
     Returns:
         List[str]: Relevant document chunks
     """
-    # Use unified index by default, or specific document index if provided
+    corpora = list(corpora or [settings.DEFAULT_CORPUS])
+    filters = dict(filters or {})
     if document_name:
-        index_path = os.path.join(settings.DOC_INDEXES_DIR, document_name)
-    else:
-        index_path = os.path.join(settings.DOC_INDEXES_DIR, "materials_database")
+        filters["doc_name"] = document_name
     
     try:
-        # Create a proper HuggingFaceEmbeddings wrapper
-        from langchain_community.embeddings import HuggingFaceEmbeddings
-        hf_embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+        hf_embeddings = get_embeddings()
+        registry = get_registry()
+        
+        # Embed the query separately so embedding and search time are traced on their own
+        # Repeated and pinned queries are served from the query embedding cache
+        with span("embedding", query_chars=len(query)) as embed_span:
+            query_vector = embed_query(query, hf_embeddings)
+        RETRIEVAL_SECONDS.observe(embed_span.duration_ms / 1000, stage="embedding")
         
-        logger.info(f"Loading index from {index_path}")
-        vector_store = FAISS.load_local(index_path, hf_embeddings, allow_dangerous_deserialization=True)
+        if route and len(corpora) > 1:
+            corpora = registry.route(query_vector, corpora)
+            logger.info(f"Routed query to corpora {corpora}: {query}")
         
-        # Simple similarity search - most reliable approach
-        docs = vector_store.similarity_search(query, k=k)
-        index_name = document_name if document_name else "unified materials database"
+        # Shards (of every corpus searched) are searched in parallel; filters are applied inside
+        # each shard's search through an IDSelector, not by over-fetching
+        fetch = settings.ADAPTIVE_MAX_K if adaptive else k
+        with span("faiss_search", k=fetch, filtered=bool(filters), adaptive=adaptive,
+                  corpora=",".join(corpora)) as search_span, registry.use(corpora) as indexes:
+            hits = search_indexes(indexes, hf_embeddings, query_vector, fetch, filters)
+            if adaptive:
+                # Only max_k candidates are fetched; the cut is made on their scores
+                cutoff = choose_k([distance for _, distance in hits])
+                hits = hits[:cutoff.k]
+                search_span.set_attribute("chosen_k", cutoff.k)
+                search_span.set_attribute("cutoff_reason", cutoff.reason)
+            docs = [doc for doc, _ in hits]
+            search_span.set_attribute("index_size", sum(index.loaded_vectors for index in indexes))
+            search_span.set_attribute("shards", sum(len(index.shards) for index in indexes))
+        RETRIEVAL_SECONDS.observe(search_span.duration_ms / 1000, stage="faiss_search")
+        if adaptive:
+            RETRIEVAL_ADAPTIVE_K.observe(cutoff.k, reason=cutoff.reason)
+            gap = f"{cutoff.gap:.3f}" if cutoff.gap is not None else "n/a"
+            logger.info(f"Adaptive k={cutoff.k} ({cutoff.reason}): top similarity {cutoff.top_similarity:.3f}, "
+                        f"last kept {cutoff.last_similarity:.3f}, gap to next {gap}")
+        RETRIEVAL_RESULTS_TOTAL.inc(len(docs), index="+".join(corpora))
+        index_name = f"{', '.join(corpora)} ({filters})" if filters else ", ".join(corpora)
         logger.success(f"Retrieved {len(docs)} documents from {index_name} for query: {query}")
         return docs
     except Exception as e:
-        index_name = document_name if document_name else "unified materials database"
+        index_name = f"{', '.join(corpora)} ({filters})" if filters else ", ".join(corpora)
         logger.error(f"Failed to retrieve documents for {index_name}: {str(e)}")
+        RETRIEVAL_ERRORS_TOTAL.inc(index="+".join(corpora))
         
         # Return empty list instead of raising an exception
         logger.warning(f"Returning empty results due to retrieval error")
-        return []
\ No newline at end of file
+        return []
@@ -1,15 +1,13 @@
 import os
-import docx
-import glob
 from typing import Dict, List, Optional
 from pathlib import Path
-from langchain_community.document_loaders import TextLoader
 from loguru import logger
 from src.data_loader import settings
-from src.data_loader.doc_indexer import create_and_save_document_index
-
-# Import the PDF loading functions from pdf_loader.py
-from src.data_loader.pdf_loader import load_pdf  
+from src.data_loader.doc_indexer import create_and_save_document_index, load_document
+from src.data_loader.index_versions import new_version
+from src.data_loader.extraction_cache import file_hash
+from src.data_loader.sharded_index import indexed_sources
+from src.data_loader.corpus_registry import corpus_data_dir, corpus_path
 
 class DataLoader:
     """
@@ -60,26 +58,24 @@ class DataLoader:
 
         if ext == '.pdf':
             try:
-                documents = load_pdf(file_path)
-                return documents
+                # Extraction goes through the content-hash cache shared with the indexer
+                documents = load_document(file_path)
+                return documents or None
             except Exception as e:
                 logger.error(f"PDF extraction failed for {file_path}: {str(e)}")
                 return None
 
         elif ext in ['.docx', '.doc']:
             try:
-                doc = docx.Document(file_path)
-                paragraphs = [p.text for p in doc.paragraphs if p.text.strip()]
-                text = "\n\n".join(paragraphs)
-                return text
+                documents = load_document(file_path)
+                return documents[0].page_content if documents else None
             except Exception as e:
                 logger.error(f"Word document extraction failed for {file_path}: {str(e)}")
                 return None
 
         elif ext == '.txt':
             try:
-                loader = TextLoader(file_path)
-                documents = loader.load()
+                documents = load_document(file_path)
                 return documents[0].page_content if documents else None
             except Exception as e:
                 logger.error(f"Text file extraction failed for {file_path}: {str(e)}")
@@ -117,50 +113,78 @@ class DataLoader:
 
         return data_dict
 
-def load_initial_data(embeddings) -> List[str]:
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.doc', '.txt')
+
+
+def list_corpus_files(root: str = None) -> List[str]:
     """
-    Load and index all document files in the data directory.
+    Every supported document under a directory, found with a single walk.
+    
+    Hidden files and directories (such as editor or sync temporaries) are skipped.
     
     Args:
-        embeddings: The embeddings object to use for indexing
+        root (str, optional): Directory to walk (defaults to settings.DATA_DIR)
     
     Returns:
-        List[str]: Paths to the created indices
+        List[str]: Absolute file paths, sorted
     """
-    # Get all supported files in the data directory
-    all_files = []
-    
-    # Get PDF files
-    pdf_files = glob.glob(os.path.join(settings.DATA_DIR, "**/*.pdf"), recursive=True)
-    all_files.extend(pdf_files)
+    root = os.path.abspath(root or settings.DATA_DIR)
+    files = []
+    for directory, subdirectories, filenames in os.walk(root):
+        subdirectories[:] = [name for name in subdirectories if not name.startswith(".")]
+        for filename in filenames:
+            if not filename.startswith(".") and Path(filename).suffix.lower() in SUPPORTED_EXTENSIONS:
+                files.append(os.path.join(directory, filename))
+    return sorted(files)
+
+
+def load_initial_data(embeddings, chunker: str = None, rebuild: bool = False, index_type: str = None,
+                      corpus: str = None) -> List[str]:
+    """
+    Load and index all document files of a corpus (the data directory for the default corpus).
     
-    # Get DOCX files
-    docx_files = glob.glob(os.path.join(settings.DATA_DIR, "**/*.docx"), recursive=True)
-    all_files.extend(docx_files)
+    The files are indexed into a new index version that is published only once every file
+    has been processed, so the live index keeps serving queries throughout. Unless rebuilding,
+    files already indexed with the same content are skipped.
     
-    # Get DOC files
-    doc_files = glob.glob(os.path.join(settings.DATA_DIR, "**/*.doc"), recursive=True)
-    all_files.extend(doc_files)
+    Args:
+        embeddings: The embeddings object to use for indexing
+        chunker (str, optional): "recursive" or "structure" (defaults to settings.CHUNKER)
+        rebuild (bool): Start the new version empty instead of from the live version
+        index_type (str, optional): Embedding storage format (defaults to settings.INDEX_TYPE)
+        corpus (str, optional): Corpus to index (defaults to settings.DEFAULT_CORPUS)
     
-    # Get TXT files
-    txt_files = glob.glob(os.path.join(settings.DATA_DIR, "**/*.txt"), recursive=True)
-    all_files.extend(txt_files)
+    Returns:
+        List[str]: Paths to the created indices
+    """
+    # Get all supported files in the corpus's source directory
+    data_dir = corpus_data_dir(corpus)
+    all_files = list_corpus_files(data_dir) if os.path.isdir(data_dir) else []
     
     if not all_files:
-        logger.warning("No supported files found in the data directory.")
+        logger.warning(f"No supported files found in {data_dir}.")
         return []
     
     logger.info(f"Found {len(all_files)} files to index.")
     
-    # Index each file into the unified database
-    unified_index_path = os.path.join(settings.DOC_INDEXES_DIR, "materials_database")
-    
-    for file_path in all_files:
-        try:
-            logger.info(f"Indexing {file_path}...")
-            index_path = create_and_save_document_index(embeddings, file_path)
-            logger.success(f"Successfully indexed {file_path} -> {index_path}")
-        except Exception as e:
-            logger.error(f"Failed to index {file_path}: {str(e)}")
+    # Index each file into the corpus's index
+    index_root = corpus_path(corpus)
+    # Files recorded with the same content in the live index are skipped; changed ones replace their shard
+    indexed_files = {} if rebuild else indexed_sources(index_root)
+    indexed = 0
+    with new_version(index_root, incremental=not rebuild) as version_path:
+        for file_path in all_files:
+            try:
+                if indexed_files.get(file_path) == file_hash(file_path):
+                    logger.info(f"Already indexed and unchanged: {file_path}")
+                    indexed += 1
+                    continue
+                logger.info(f"Indexing {file_path}...")
+                index_path = create_and_save_document_index(embeddings, file_path, chunker, index_path=version_path,
+                                                            index_type=index_type, replace=file_path in indexed_files)
+                logger.success(f"Successfully indexed {file_path} -> {index_path}")
+                indexed += 1
+            except Exception as e:
+                logger.error(f"Failed to index {file_path}: {str(e)}")
     
-    return [unified_index_path]
\ No newline at end of file
+    return [index_root] if indexed else []
\ No newline at end of file
@@ -0,0 +1,90 @@
+import os
+import gzip
+import json
+import shutil
+import hashlib
+from typing import Callable, Iterator
+
+from langchain.schema import Document
+from loguru import logger
+from src.data_loader import settings
+from src.monitoring.metrics import CACHE_REQUESTS_TOTAL
+
+# Bump whenever extraction output changes (new loader, new metadata) so stale entries are ignored
+EXTRACTION_LOADER_VERSION = "1"
+
+
+def file_hash(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file's contents, read in blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_path_for(file_path: str) -> str:
+    """Location of the cached extraction for a file's current contents"""
+    return os.path.join(
+        settings.EXTRACTION_CACHE_DIR,
+        f"{file_hash(file_path)}-v{EXTRACTION_LOADER_VERSION}.jsonl.gz"
+    )
+
+
+def _read_cached_pages(cache_file: str, file_path: str) -> Iterator[Document]:
+    doc_name = os.path.splitext(os.path.basename(file_path))[0]
+    with gzip.open(cache_file, "rt", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            metadata = record["metadata"]
+            # The same content may have been cached under another path or name
+            metadata["source"] = file_path
+            metadata["doc_name"] = doc_name
+            yield Document(page_content=record["page_content"], metadata=metadata)
+
+
+def iter_cached_pages(file_path: str, extractor: Callable[[str], Iterator[Document]]) -> Iterator[Document]:
+    """
+    Yield a file's extracted pages from the cache, extracting and caching them on a miss.
+
+    Pages are streamed through to the caller while they are written, and the cache entry
+    is only published once extraction has finished, so an interrupted run never leaves
+    a truncated entry behind.
+
+    Args:
+        file_path (str): Document to extract
+        extractor (Callable): Generator function that extracts the file's pages
+
+    Yields:
+        Document: Extracted pages
+    """
+    cache_file = cache_path_for(file_path)
+    if os.path.exists(cache_file):
+        CACHE_REQUESTS_TOTAL.inc(cache="extraction", result="hit")
+        logger.info(f"Using cached extraction for {file_path}")
+        yield from _read_cached_pages(cache_file, file_path)
+        return
+
+    CACHE_REQUESTS_TOTAL.inc(cache="extraction", result="miss")
+    os.makedirs(settings.EXTRACTION_CACHE_DIR, exist_ok=True)
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    completed = False
+    try:
+        with gzip.open(tmp_file, "wt", encoding="utf-8") as f:
+            for page in extractor(file_path):
+                f.write(json.dumps({"page_content": page.page_content, "metadata": page.metadata}, default=str) + "\n")
+                yield page
+        completed = True
+    finally:
+        if completed:
+            os.replace(tmp_file, cache_file)
+            logger.info(f"Cached extraction of {file_path}")
+        elif os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
+def clear_extraction_cache():
+    """Delete every cached extraction"""
+    if os.path.exists(settings.EXTRACTION_CACHE_DIR):
+        shutil.rmtree(settings.EXTRACTION_CACHE_DIR, ignore_errors=True)
+        logger.info(f"Cleared extraction cache at {settings.EXTRACTION_CACHE_DIR}")
@@ -0,0 +1,290 @@
+import os
+import time
+import shutil
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialised within one process
+    fcntl = None
+
+from loguru import logger
+from src.data_loader import settings
+from src.data_loader.sharded_index import (
+    CURRENT_FILE,
+    VERSIONS_DIR,
+    index_exists,
+    read_manifest,
+    resolve_index_path,
+    shard_path,
+    write_manifest,
+)
+
+# Unpublished versions older than this are assumed to be left over from a crashed run
+STALE_BUILD_SECONDS = 24 * 3600
+WRITER_LOCK_FILE = ".writer.lock"
+
+_writer_lock = threading.RLock()
+
+
+def current_version(index_root: str) -> Optional[str]:
+    """Name of the live version, or None for an index that predates versioning"""
+    current_file = os.path.join(index_root, CURRENT_FILE)
+    if not os.path.exists(current_file):
+        return None
+    with open(current_file, "r", encoding="utf-8") as f:
+        return f.read().strip()
+
+
+def _write_current(index_root: str, version: str):
+    # os.replace is atomic, so readers see either the old or the new version, never neither
+    current_file = os.path.join(index_root, CURRENT_FILE)
+    tmp_file = f"{current_file}.{os.getpid()}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_file, current_file)
+
+
+def begin_version(index_root: str, incremental: bool = True) -> str:
+    """
+    Create an unpublished version directory to index into.
+
+    An incremental version starts from the live version's manifest: its shards are
+    referenced where they are, and only shards that get rewritten are saved into the new
+    version, so published shards are never modified.
+
+    Args:
+        index_root (str): Index directory
+        incremental (bool): Start from the live version (False starts empty, for a rebuild)
+
+    Returns:
+        str: Path of the new version directory
+    """
+    version = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{os.getpid()}"
+    version_path = os.path.join(index_root, VERSIONS_DIR, version)
+    os.makedirs(version_path)
+
+    manifest = {"format": 1, "shards": {}}
+    parent = current_version(index_root)
+    if incremental:
+        live_path = resolve_index_path(index_root)
+        live_manifest = read_manifest(live_path)
+        for name, entry in live_manifest["shards"].items():
+            rebased = dict(entry)
+            rebased["path"] = os.path.relpath(shard_path(live_path, name, live_manifest), version_path)
+            manifest["shards"][name] = rebased
+        if parent is None and live_manifest["shards"]:
+            parent = "unversioned"
+
+    manifest.update({
+        "version": version,
+        "parent": parent if incremental else None,
+        "status": "building",
+        "created": datetime.now().isoformat(timespec="seconds"),
+    })
+    write_manifest(version_path, manifest)
+    logger.info(f"Building index version {version} ({'incremental' if incremental else 'rebuild'})")
+    return version_path
+
+
+@contextmanager
+def writer_lock(index_root: str):
+    """
+    Serialise index writers across threads and processes.
+
+    Every version starts from the live one, so two writers building at the same time would
+    each publish without the other's shards; holding this from begin to publish prevents it.
+    """
+    os.makedirs(index_root, exist_ok=True)
+    with _writer_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(index_root, WRITER_LOCK_FILE), "a+") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                logger.info(f"Waiting for another process writing to {index_root}")
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+@contextmanager
+def new_version(index_root: str, incremental: bool = True):
+    """
+    Build a version under the writer lock, publishing it if it changed and discarding it otherwise.
+
+    Args:
+        index_root (str): Index directory
+        incremental (bool): Start from the live version (False starts empty, for a rebuild)
+
+    Yields:
+        str: Path of the version directory to write into
+    """
+    with writer_lock(index_root):
+        version_path = begin_version(index_root, incremental)
+        initial_shards = read_manifest(version_path)["shards"]
+        try:
+            yield version_path
+        except BaseException:
+            discard_version(version_path)
+            raise
+        if read_manifest(version_path)["shards"] == initial_shards:
+            logger.info("Nothing changed; the live index version is kept")
+            discard_version(version_path)
+        else:
+            publish_version(index_root, version_path)
+
+
+def publish_version(index_root: str, version_path: str):
+    """
+    Make a built version live by swapping the CURRENT pointer, then prune old versions.
+
+    Processes serving queries pick the new version up on their next search; the versions
+    kept for rollback stay on disk, so searches already running finish unaffected.
+
+    Args:
+        index_root (str): Index directory
+        version_path (str): Version directory created by begin_version
+    """
+    if not index_exists(version_path):
+        raise ValueError(f"Refusing to publish {version_path}: it contains no index shards")
+    manifest = read_manifest(version_path)
+    manifest["status"] = "published"
+    manifest["published"] = datetime.now().isoformat(timespec="seconds")
+    write_manifest(version_path, manifest)
+
+    _write_current(index_root, os.path.basename(version_path))
+    logger.success(f"Published index version {os.path.basename(version_path)}")
+    prune_versions(index_root)
+
+
+def discard_version(version_path: str):
+    """Delete an unpublished version after a failed build"""
+    if read_manifest(version_path).get("status") == "published":
+        raise ValueError(f"Refusing to discard published version {version_path}")
+    shutil.rmtree(version_path, ignore_errors=True)
+    logger.warning(f"Discarded unpublished index version {os.path.basename(version_path)}")
+
+
+def list_versions(index_root: str) -> List[dict]:
+    """
+    Describe every version of an index, oldest first.
+
+    Returns:
+        List[dict]: version, status, created/published times, shard and vector counts, and whether it is live
+    """
+    versions_dir = os.path.join(index_root, VERSIONS_DIR)
+    if not os.path.isdir(versions_dir):
+        return []
+    live = current_version(index_root)
+    versions = []
+    for version in sorted(os.listdir(versions_dir)):
+        try:
+            manifest = read_manifest(os.path.join(versions_dir, version))
+        except Exception as e:
+            logger.error(f"Unreadable manifest for index version {version}: {str(e)}")
+            continue
+        versions.append({
+            "version": version,
+            "status": manifest.get("status", "unknown"),
+            "created": manifest.get("created"),
+            "published": manifest.get("published"),
+            "shards": len(manifest["shards"]),
+            "vectors": sum(entry.get("vectors") or 0 for entry in manifest["shards"].values()),
+            "current": version == live,
+        })
+    return versions
+
+
+def rollback(index_root: str, version: str = None) -> str:
+    """
+    Point CURRENT back at an earlier published version.
+
+    Args:
+        index_root (str): Index directory
+        version (str, optional): Version to restore (defaults to the one published before the live version)
+
+    Returns:
+        str: The version now live
+    """
+    published = [v["version"] for v in list_versions(index_root) if v["status"] == "published"]
+    live = current_version(index_root)
+    if version is None:
+        earlier = [v for v in published if live is None or v < live]
+        if not earlier:
+            raise ValueError("No earlier published version to roll back to")
+        version = earlier[-1]
+    elif version not in published:
+        raise ValueError(f"Unknown or unpublished index version: {version}")
+
+    _write_current(index_root, version)
+    logger.success(f"Rolled {index_root} back from {live} to {version}")
+    return version
+
+
+def prune_versions(index_root: str, keep: int = None):
+    """
+    Delete published versions beyond the newest `keep` and stale unpublished ones.
+
+    The live version is always kept, and so is any version whose shards are still
+    referenced by a kept version.
+
+    Args:
+        index_root (str): Index directory
+        keep (int, optional): Published versions to keep (defaults to settings.INDEX_KEEP_VERSIONS)
+    """
+    keep = keep or settings.INDEX_KEEP_VERSIONS
+    versions_dir = os.path.join(index_root, VERSIONS_DIR)
+    versions = list_versions(index_root)
+    published = [v["version"] for v in versions if v["status"] == "published"]
+    kept = set(published[-keep:]) | {current_version(index_root)}
+
+    candidates = [v["version"] for v in versions if v["status"] == "published" and v["version"] not in kept]
+    now = time.time()
+    for v in versions:
+        path = os.path.join(versions_dir, v["version"])
+        if v["status"] == "building" and now - os.path.getmtime(path) > STALE_BUILD_SECONDS:
+            candidates.append(v["version"])
+        elif v["status"] == "building":
+            # A build in progress may reference shards of older versions too
+            kept.add(v["version"])
+
+    # A version whose shards are referenced survives, and so do the versions it references
+    def referenced_dirs(version):
+        version_path = os.path.join(versions_dir, version)
+        manifest = read_manifest(version_path)
+        return {os.path.abspath(shard_path(version_path, name, manifest)) for name in manifest["shards"]}
+
+    referenced = set()
+    for version in kept - {None}:
+        referenced |= referenced_dirs(version)
+    changed = True
+    while changed:
+        changed = False
+        for version in list(candidates):
+            version_path = os.path.abspath(os.path.join(versions_dir, version))
+            if any(path == version_path or path.startswith(version_path + os.sep) for path in referenced):
+                candidates.remove(version)
+                referenced |= referenced_dirs(version)
+                changed = True
+
+    for version in candidates:
+        shutil.rmtree(os.path.join(versions_dir, version), ignore_errors=True)
+        logger.info(f"Pruned index version {version}")
+
+
+def format_versions(index_root: str) -> str:
+    """Human-readable table of an index's versions"""
+    lines = []
+    for v in list_versions(index_root):
+        marker = "*" if v["current"] else " "
+        lines.append(f"{marker} {v['version']:<36} {v['status']:<10} {v['shards']:>4} shards {v['vectors']:>8} vectors  "
+                     f"published {v['published'] or '-'}")
+    return "\n".join(lines) or f"No versions under {index_root}"
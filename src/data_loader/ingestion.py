@@ -0,0 +1,578 @@
+import os
+import sys
+import time
+import shutil
+import hashlib
+import sqlite3
+import argparse
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+# Add the root project directory to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.data_loader import settings
+from src.data_loader.extraction_cache import file_hash
+from src.data_loader.corpus_registry import corpus_path
+from src.monitoring.metrics import REGISTRY
+
+SUPPORTED_EXTENSIONS = ['.pdf', '.docx', '.doc', '.txt']
+# Files in the drop folder are picked up once they have not changed for this long
+SETTLE_SECONDS = 2.0
+# A failed job waits this long times its attempt count before it is retried
+RETRY_BACKOFF_SECONDS = 30.0
+
+INGESTION_JOBS_TOTAL = REGISTRY.counter(
+    "mse_ingestion_jobs_total", "Ingestion jobs finished by outcome", ("status",)
+)
+INGESTION_PAGES_TOTAL = REGISTRY.counter(
+    "mse_ingestion_pages_total", "Pages indexed by the ingestion worker"
+)
+INGESTION_QUEUE_DEPTH = REGISTRY.gauge(
+    "mse_ingestion_queue_depth", "Ingestion jobs by status", ("status",)
+)
+INGESTION_THROTTLE_SECONDS = REGISTRY.counter(
+    "mse_ingestion_throttle_seconds_total", "Time the ingestion worker spent yielding to the app", ("reason",)
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL,
+    action TEXT NOT NULL DEFAULT 'add',
+    sha256 TEXT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    pages INTEGER NOT NULL DEFAULT 0,
+    chunks INTEGER NOT NULL DEFAULT 0,
+    worker_pid INTEGER,
+    error TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+"""
+
+
+class IngestionQueue:
+    """
+    Persistent queue of indexing jobs in a local SQLite database.
+
+    Jobs survive restarts; a job left running by a process that died is queued again. The
+    queue is shared by every process on the machine (the app, index_data.py, a headless worker).
+    """
+
+    def __init__(self, db_path: str = None, max_pending: int = None, max_attempts: int = None):
+        """
+        Args:
+            db_path (str, optional): SQLite file (defaults to settings.INGESTION_DB)
+            max_pending (int, optional): Queued jobs beyond which enqueue refuses new work
+                                         (defaults to settings.INGESTION_MAX_PENDING)
+            max_attempts (int, optional): Attempts before a job is marked failed
+                                          (defaults to settings.INGESTION_MAX_ATTEMPTS)
+        """
+        self.db_path = db_path or settings.INGESTION_DB
+        self.max_pending = max_pending or settings.INGESTION_MAX_PENDING
+        self.max_attempts = max_attempts or settings.INGESTION_MAX_ATTEMPTS
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with self._connect() as connection:
+            # WAL lets the UI read progress while the worker writes
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def enqueue(self, path: str, action: str = "add") -> Optional[int]:
+        """
+        Queue a file to be indexed ("add") or removed from the index ("delete").
+
+        A file already queued, running or indexed with the same content is not queued again.
+
+        Args:
+            path (str): File to ingest
+            action (str): "add" or "delete"
+
+        Returns:
+            int or None: Job id, or None if the queue is full (back-pressure) or the file is unreadable
+        """
+        path = os.path.abspath(path)
+        try:
+            sha256 = file_hash(path) if action == "add" else None
+        except OSError as e:
+            logger.error(f"Cannot queue {path}: {str(e)}")
+            return None
+
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                existing = connection.execute(
+                    "SELECT id FROM jobs WHERE path = ? AND action = ? AND sha256 IS ? "
+                    "AND status IN ('queued', 'running', 'done') ORDER BY id DESC LIMIT 1",
+                    (path, action, sha256)
+                ).fetchone()
+                latest = connection.execute(
+                    "SELECT id, action FROM jobs WHERE path = ? AND status != 'failed' ORDER BY id DESC LIMIT 1", (path,)
+                ).fetchone()
+                if existing is not None and latest is not None and latest["id"] == existing["id"]:
+                    connection.execute("COMMIT")
+                    return existing["id"]
+
+                pending = self._pending(connection)
+                if pending >= self.max_pending:
+                    connection.execute("COMMIT")
+                    logger.warning(f"Ingestion queue full ({pending} jobs); not queueing {path}")
+                    return None
+
+                job_id = connection.execute(
+                    "INSERT INTO jobs (path, action, sha256, created) VALUES (?, ?, ?, ?)",
+                    (path, action, sha256, time.time())
+                ).lastrowid
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        logger.info(f"Queued ingestion job {job_id}: {action} {path}")
+        return job_id
+
+    @staticmethod
+    def _pending(connection) -> int:
+        return connection.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def pending(self) -> int:
+        """Number of jobs waiting to run"""
+        with self._connect() as connection:
+            return self._pending(connection)
+
+    def claim(self) -> Optional[Dict]:
+        """Take the oldest queued job that is due and mark it running, or return None if there is none"""
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' AND (finished IS NULL OR finished + attempts * ? <= ?) "
+                "ORDER BY id LIMIT 1", (RETRY_BACKOFF_SECONDS, time.time())
+            ).fetchone()
+            if row is None:
+                connection.execute("COMMIT")
+                return None
+            connection.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, started = ?, worker_pid = ?, "
+                "pages = 0, chunks = 0, error = NULL WHERE id = ?",
+                (time.time(), os.getpid(), row["id"])
+            )
+            connection.execute("COMMIT")
+        return dict(row)
+
+    def update_progress(self, job_id: int, pages: int, chunks: int):
+        with self._connect() as connection:
+            connection.execute("UPDATE jobs SET pages = ?, chunks = ? WHERE id = ?", (pages, chunks, job_id))
+
+    def complete(self, job_id: int):
+        with self._connect() as connection:
+            connection.execute("UPDATE jobs SET status = 'done', finished = ? WHERE id = ?", (time.time(), job_id))
+        INGESTION_JOBS_TOTAL.inc(status="done")
+
+    def fail(self, job_id: int, error: str):
+        """Record a failed attempt; the job is queued again until it runs out of attempts"""
+        with self._connect() as connection:
+            attempts = connection.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+            status = "failed" if attempts >= self.max_attempts else "queued"
+            connection.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ?", (status, error, time.time(), job_id)
+            )
+        INGESTION_JOBS_TOTAL.inc(status="failed" if status == "failed" else "retried")
+
+    def requeue_interrupted(self) -> int:
+        """Queue again the running jobs whose worker process no longer exists"""
+        requeued = 0
+        with self._connect() as connection:
+            for row in connection.execute("SELECT id, worker_pid FROM jobs WHERE status = 'running'").fetchall():
+                if row["worker_pid"] == os.getpid() or _process_alive(row["worker_pid"]):
+                    continue
+                connection.execute("UPDATE jobs SET status = 'queued' WHERE id = ?", (row["id"],))
+                requeued += 1
+        if requeued:
+            logger.warning(f"Re-queued {requeued} ingestion jobs interrupted by a worker that exited")
+        return requeued
+
+    def jobs(self, limit: int = 20) -> List[Dict]:
+        """Most recent jobs, newest first"""
+        with self._connect() as connection:
+            rows = connection.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def stats(self, window_seconds: float = 3600) -> Dict:
+        """
+        Queue depth, running jobs and throughput over the recent window.
+
+        Returns:
+            dict: counts by status, running jobs (path, pages, chunks, elapsed seconds),
+                  pages_per_second and files_per_hour over jobs finished in the window
+        """
+        now = time.time()
+        with self._connect() as connection:
+            counts = {row["status"]: row["n"] for row in connection.execute(
+                "SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"
+            )}
+            running = [dict(row) for row in connection.execute(
+                "SELECT id, path, action, pages, chunks, started FROM jobs WHERE status = 'running' ORDER BY id"
+            )]
+            recent = connection.execute(
+                "SELECT COUNT(*) AS files, SUM(pages) AS pages, SUM(finished - started) AS seconds FROM jobs "
+                "WHERE status = 'done' AND finished >= ?", (now - window_seconds,)
+            ).fetchone()
+
+        for status in ("queued", "running", "done", "failed"):
+            INGESTION_QUEUE_DEPTH.set(counts.get(status, 0), status=status)
+        for job in running:
+            job["elapsed_seconds"] = now - (job.pop("started") or now)
+        return {
+            "counts": counts,
+            "running": running,
+            "pages_per_second": (recent["pages"] or 0) / recent["seconds"] if recent["seconds"] else 0.0,
+            "files_per_hour": recent["files"] * 3600 / window_seconds,
+        }
+
+
+def _process_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # Exists but belongs to someone else
+        return True
+    return True
+
+
+# Chat turns in progress; the worker pauses between page batches while any are running
+_foreground_count = 0
+_foreground_lock = threading.Lock()
+
+
+@contextmanager
+def foreground_activity():
+    """Mark latency-sensitive work (a chat turn) so background ingestion yields the CPU to it"""
+    global _foreground_count
+    with _foreground_lock:
+        _foreground_count += 1
+    try:
+        yield
+    finally:
+        with _foreground_lock:
+            _foreground_count -= 1
+
+
+def foreground_busy() -> bool:
+    return _foreground_count > 0
+
+
+def upload_path(file_name: str, sha256: str, uploads_dir: str = None, corpus_dir: str = None) -> str:
+    """
+    Where an uploaded or dropped-in file is saved in the corpus.
+
+    A file with the same name replaces the earlier upload (and its shard, once indexed). A
+    file named like one elsewhere in the corpus is given a numbered name instead
+    ("Callister-2.pdf"), so the two keep separate shards and document names.
+
+    Args:
+        file_name (str): Name of the uploaded file
+        sha256 (str): Its content hash
+        uploads_dir (str, optional): Uploads folder (defaults to settings.UPLOADS_DIR)
+        corpus_dir (str, optional): Corpus directory (defaults to the uploads folder's parent)
+
+    Returns:
+        str: Path to save the file to
+
+    Raises:
+        ValueError: The corpus already holds the same content under that name
+    """
+    from src.data_loader.doc_loader import list_corpus_files
+
+    uploads_dir = os.path.abspath(uploads_dir or settings.UPLOADS_DIR)
+    corpus_dir = os.path.abspath(corpus_dir or os.path.dirname(uploads_dir))
+    name = os.path.basename(file_name)
+    stem, extension = os.path.splitext(name)
+    taken: Dict[str, List[str]] = {}
+    for path in list_corpus_files(corpus_dir) if os.path.isdir(corpus_dir) else []:
+        if os.path.dirname(path) != uploads_dir:
+            taken.setdefault(os.path.basename(path), []).append(path)
+
+    candidate, number = name, 1
+    while candidate in taken:
+        duplicate = next((path for path in taken[candidate] if file_hash(path) == sha256), None)
+        if duplicate is not None:
+            raise ValueError(f"{name} is already in the corpus as {os.path.relpath(duplicate, corpus_dir)}")
+        number += 1
+        candidate = f"{stem}-{number}{extension}"
+    if candidate != name:
+        logger.info(f"{name} is named like a corpus file; saving it as {candidate}")
+    return os.path.join(uploads_dir, candidate)
+
+
+def store_upload(file_name: str, data: bytes, uploads_dir: str = None) -> str:
+    """
+    Save an uploaded file into the corpus so it is included in later rebuilds (see upload_path).
+
+    Returns:
+        str: Path the file was saved to
+
+    Raises:
+        ValueError: The corpus already holds the same content under that name
+    """
+    path = upload_path(file_name, hashlib.sha256(data).hexdigest(), uploads_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.part"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return path
+
+
+class IngestionWorker:
+    """
+    Background thread that indexes queued files into the live index.
+
+    Each job is indexed into a new index version and published, so uploads become
+    searchable without restarting the app. Files dropped into settings.TEMP_DIR are moved
+    into the corpus and queued. The worker applies back-pressure: it runs at a lower CPU
+    priority, pauses between page batches while a chat turn is in progress, and sleeps
+    enough between batches to stay within settings.INGESTION_DUTY_CYCLE.
+    """
+
+    def __init__(self, embeddings, queue: IngestionQueue = None, drop_dir: str = None, uploads_dir: str = None,
+                 index_root: str = None, duty_cycle: float = None):
+        """
+        Args:
+            embeddings: The embeddings object to use for indexing
+            queue (IngestionQueue, optional): Job queue (defaults to the shared SQLite queue)
+            drop_dir (str, optional): Folder watched for new files (defaults to settings.TEMP_DIR)
+            uploads_dir (str, optional): Where dropped files are moved before indexing (defaults to settings.UPLOADS_DIR)
+            index_root (str, optional): Index to add to (defaults to the default corpus)
+            duty_cycle (float, optional): Share of wall time spent indexing (defaults to settings.INGESTION_DUTY_CYCLE)
+        """
+        self.embeddings = embeddings
+        self.queue = queue or IngestionQueue()
+        self.drop_dir = drop_dir or settings.TEMP_DIR
+        self.uploads_dir = uploads_dir or settings.UPLOADS_DIR
+        self.index_root = index_root or corpus_path()
+        self.duty_cycle = duty_cycle or settings.INGESTION_DUTY_CYCLE
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ingestion-worker", daemon=True)
+        self._thread.start()
+
+    def wake(self):
+        """Check the queue now instead of at the next poll"""
+        self._wake.set()
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        _lower_thread_priority(settings.INGESTION_NICE)
+        self.queue.requeue_interrupted()
+        logger.info(f"Ingestion worker watching {self.drop_dir}")
+        while not self._stop.is_set():
+            try:
+                self.scan_drop_folder()
+                if self.run_once():
+                    continue
+            except Exception as e:
+                logger.error(f"Ingestion worker error: {str(e)}")
+            self._wake.wait(settings.INGESTION_POLL_SECONDS)
+            self._wake.clear()
+
+    def scan_drop_folder(self) -> int:
+        """Move settled files from the drop folder into the corpus and queue them"""
+        if not os.path.isdir(self.drop_dir):
+            return 0
+        queued = 0
+        now = time.time()
+        for entry in os.scandir(self.drop_dir):
+            if not entry.is_file() or Path(entry.name).suffix.lower() not in SUPPORTED_EXTENSIONS:
+                continue
+            if now - entry.stat().st_mtime < SETTLE_SECONDS:
+                # Possibly still being copied in
+                continue
+            if self.queue.pending() >= self.queue.max_pending:
+                # Leave the rest in the drop folder until the queue drains
+                break
+            try:
+                target = upload_path(entry.name, file_hash(entry.path), self.uploads_dir)
+            except ValueError as e:
+                # An identical copy is already indexed; the dropped one is redundant
+                logger.warning(f"Discarding dropped file: {str(e)}")
+                os.remove(entry.path)
+                continue
+            os.makedirs(self.uploads_dir, exist_ok=True)
+            shutil.move(entry.path, target)
+            if self.queue.enqueue(target) is not None:
+                queued += 1
+        return queued
+
+    def run_once(self) -> bool:
+        """Process one queued job; returns False if there was nothing to do"""
+        job = self.queue.claim()
+        if job is None:
+            return False
+        logger.info(f"Ingesting job {job['id']}: {job['action']} {job['path']}")
+        try:
+            self._process(job)
+        except Exception as e:
+            logger.error(f"Ingestion job {job['id']} failed: {str(e)}")
+            self.queue.fail(job["id"], str(e))
+            return True
+        self.queue.complete(job["id"])
+        logger.success(f"Ingestion job {job['id']} done: {job['path']}")
+        return True
+
+    def _process(self, job: Dict):
+        from src.data_loader.doc_indexer import create_and_save_document_index
+        from src.data_loader.index_versions import new_version
+        from src.data_loader.sharded_index import remove_source
+
+        if job["action"] == "delete":
+            with new_version(self.index_root) as version_path:
+                # Only the deleted file's chunks go; a file with the same name elsewhere keeps its own
+                if not remove_source(version_path, job["path"], self.embeddings):
+                    logger.warning(f"No indexed chunks found for deleted file {job['path']}")
+            return
+        if job["action"] != "add":
+            raise ValueError(f"Unsupported ingestion action: {job['action']}")
+
+        last_pages = 0
+        batch_started = time.perf_counter()
+
+        def on_batch(pages: int, chunks: int):
+            nonlocal last_pages, batch_started
+            INGESTION_PAGES_TOTAL.inc(pages - last_pages)
+            last_pages = pages
+            self.queue.update_progress(job["id"], pages, chunks)
+            self._yield_cpu(time.perf_counter() - batch_started)
+            batch_started = time.perf_counter()
+
+        with new_version(self.index_root) as version_path:
+            # A re-uploaded file replaces its earlier chunks instead of adding to them
+            create_and_save_document_index(self.embeddings, job["path"], index_path=version_path,
+                                           replace=True, on_batch=on_batch)
+
+    def _yield_cpu(self, busy_seconds: float):
+        """Back-pressure between page batches"""
+        waited = 0.0
+        while foreground_busy() and not self._stop.is_set():
+            time.sleep(0.1)
+            waited += 0.1
+        if waited:
+            INGESTION_THROTTLE_SECONDS.inc(waited, reason="foreground")
+
+        duty_cycle = min(max(self.duty_cycle, 0.05), 1.0)
+        pause = busy_seconds * (1 - duty_cycle) / duty_cycle
+        if pause > 0:
+            self._stop.wait(pause)
+            INGESTION_THROTTLE_SECONDS.inc(pause, reason="duty_cycle")
+
+
+def _lower_thread_priority(nice: int):
+    """Raise the calling thread's nice value (Linux schedules threads individually)"""
+    if not nice:
+        return
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), nice)
+    except (AttributeError, OSError) as e:
+        logger.debug(f"Could not lower the ingestion thread's priority: {str(e)}")
+
+
+_worker: Optional[IngestionWorker] = None
+_worker_lock = threading.Lock()
+
+
+def start_ingestion_worker(embeddings) -> Optional[IngestionWorker]:
+    """
+    Start the background ingestion worker for this process. Safe to call more than once.
+
+    Returns:
+        IngestionWorker: The running worker, or None if it could not be started
+    """
+    global _worker
+    with _worker_lock:
+        if _worker is not None:
+            return _worker
+        try:
+            _worker = IngestionWorker(embeddings)
+            _worker.start()
+        except Exception as e:
+            logger.error(f"Could not start the ingestion worker: {str(e)}")
+            _worker = None
+        return _worker
+
+
+def format_stats(stats: Dict) -> str:
+    """Human-readable queue status"""
+    counts = stats["counts"]
+    lines = [
+        f"queued {counts.get('queued', 0)}  running {counts.get('running', 0)}  "
+        f"done {counts.get('done', 0)}  failed {counts.get('failed', 0)}",
+        f"throughput {stats['pages_per_second']:.1f} pages/s, {stats['files_per_hour']:.1f} files/h (last hour)",
+    ]
+    for job in stats["running"]:
+        lines.append(f"  indexing {os.path.basename(job['path'])}: {job['pages']} pages, "
+                     f"{job['chunks']} chunks, {job['elapsed_seconds']:.0f}s")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Queue files for background indexing or run the ingestion worker.')
+    parser.add_argument('--enqueue', nargs='+', metavar='PATH', help='Queue files to be indexed')
+    parser.add_argument('--run', action='store_true', help='Run the worker in the foreground until interrupted')
+    parser.add_argument('--status', action='store_true', help='Show queue depth, progress and throughput')
+    args = parser.parse_args()
+
+    queue = IngestionQueue()
+    for path in args.enqueue or []:
+        job_id = queue.enqueue(path)
+        print(f"{path}: {'job ' + str(job_id) if job_id else 'not queued'}")
+
+    if args.run:
+        from src.data_loader.query_embeddings import get_embeddings
+        worker = IngestionWorker(get_embeddings(), queue)
+        worker.start()
+        try:
+            while True:
+                time.sleep(10)
+                logger.info(format_stats(queue.stats()))
+        except KeyboardInterrupt:
+            worker.stop()
+
+    if args.status or not (args.enqueue or args.run):
+        print(format_stats(queue.stats()))
+        for job in queue.jobs(10):
+            print(f"  #{job['id']:<5} {job['status']:<8} {job['action']:<6} {os.path.basename(job['path'])}"
+                  f"{'  ' + job['error'] if job['error'] else ''}")
+
+
+if __name__ == "__main__":
+    main()
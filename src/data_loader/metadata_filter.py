@@ -0,0 +1,167 @@
+import os
+from typing import Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain.schema import Document
+from src.data_loader import settings
+from src.data_loader.vector_compression import rescore, supports_selector
+
+# Metadata keys that retrieve_documents can filter on
+FILTER_KEYS = ("doc_name", "type", "page_min", "page_max", "section", "chunk_type")
+
+_TYPES_BY_EXTENSION = {".pdf": "pdf", ".docx": "word", ".doc": "word", ".txt": "text"}
+
+
+def document_type(metadata: dict) -> str:
+    """The chunk's document type, derived from the source extension when the loader didn't record one"""
+    if metadata.get("type"):
+        return metadata["type"]
+    return _TYPES_BY_EXTENSION.get(os.path.splitext(metadata.get("source", ""))[1].lower(), "")
+
+
+class MetadataTable:
+    """
+    Columnar copy of a FAISS index's chunk metadata, aligned with the FAISS ids.
+
+    Filters are evaluated as NumPy masks over these columns and handed to FAISS as an
+    IDSelector, so the search itself only visits the matching vectors.
+    """
+
+    def __init__(self, vector_store):
+        """
+        Args:
+            vector_store: A loaded LangChain FAISS vector store
+        """
+        ntotal = vector_store.index.ntotal
+        self.doc_names = np.empty(ntotal, dtype=object)
+        self.types = np.empty(ntotal, dtype=object)
+        self.sections = np.empty(ntotal, dtype=object)
+        self.chunk_types = np.empty(ntotal, dtype=object)
+        self.pages = np.full(ntotal, -1, dtype=np.int64)
+
+        for faiss_id, docstore_id in vector_store.index_to_docstore_id.items():
+            metadata = vector_store.docstore.search(docstore_id).metadata
+            self.doc_names[faiss_id] = metadata.get("doc_name", "")
+            self.types[faiss_id] = document_type(metadata)
+            self.sections[faiss_id] = metadata.get("section", "")
+            self.chunk_types[faiss_id] = metadata.get("chunk_type", "text")
+            page = metadata.get("page")
+            self.pages[faiss_id] = page if isinstance(page, int) else -1
+
+    def mask(self, filters: Dict) -> np.ndarray:
+        """
+        Boolean mask of the FAISS ids matching every filter.
+
+        Args:
+            filters (dict): Any of doc_name, type, chunk_type (a value or list of values),
+                            page_min/page_max (0-based, inclusive) and section (case-insensitive substring)
+
+        Returns:
+            np.ndarray: Mask over FAISS ids
+        """
+        unknown = set(filters) - set(FILTER_KEYS)
+        if unknown:
+            raise ValueError(f"Unsupported metadata filters: {sorted(unknown)}")
+
+        mask = np.ones(len(self.pages), dtype=bool)
+        for key, column in (("doc_name", self.doc_names), ("type", self.types), ("chunk_type", self.chunk_types)):
+            wanted = filters.get(key)
+            if wanted:
+                values = [wanted] if isinstance(wanted, str) else list(wanted)
+                mask &= np.isin(column, values)
+        if filters.get("page_min") is not None:
+            mask &= self.pages >= filters["page_min"]
+        if filters.get("page_max") is not None:
+            mask &= self.pages <= filters["page_max"]
+        if filters.get("section"):
+            needle = filters["section"].lower()
+            mask &= np.array([needle in (section or "").lower() for section in self.sections], dtype=bool)
+        return mask
+
+
+def build_selector(ids: np.ndarray) -> Optional[faiss.IDSelector]:
+    """
+    Turn a sorted array of FAISS ids into the cheapest IDSelector for it.
+
+    Chunks of one document are added together, so a doc_name filter usually selects one
+    contiguous id range and can use an IDSelectorRange instead of a batch lookup.
+
+    Returns:
+        faiss.IDSelector or None: None if nothing matches
+    """
+    if not len(ids):
+        return None
+    if ids[-1] - ids[0] + 1 == len(ids):
+        return faiss.IDSelectorRange(int(ids[0]), int(ids[-1]) + 1)
+    return faiss.IDSelectorBatch(ids)
+
+
+def search_by_vector(vector_store, query_vector: List[float], k: int, ids: np.ndarray = None,
+                     full_vectors: np.ndarray = None) -> List[Tuple[Document, float]]:
+    """
+    Search a store, optionally restricted to some FAISS ids, re-scoring compressed results exactly.
+
+    With full-precision vectors (a compressed shard's memory-mapped float32 copy), the top
+    k * settings.INDEX_RESCORE_FACTOR candidates from the compressed index are re-ranked by
+    their exact distance, so compression costs memory-resident bytes rather than recall.
+
+    Args:
+        vector_store: A loaded LangChain FAISS vector store
+        query_vector (List[float]): Embedded query
+        k (int): Number of results
+        ids (np.ndarray, optional): FAISS ids to restrict the search to
+        full_vectors (np.ndarray, optional): Full-precision vectors aligned with the FAISS ids
+
+    Returns:
+        List[Tuple[Document, float]]: Chunks and their distances, best first
+    """
+    query = np.array([query_vector], dtype=np.float32)
+    if vector_store._normalize_L2:
+        faiss.normalize_L2(query)
+    index = vector_store.index
+    fetch = k * settings.INDEX_RESCORE_FACTOR if full_vectors is not None else k
+
+    if ids is not None and not len(ids):
+        return []
+    if ids is not None and not supports_selector(index):
+        # Product-quantized indexes take no IDSelector; decode just the selected codes instead
+        candidates = np.asarray(ids, dtype=np.int64)
+        distances = ((index.reconstruct_batch(candidates) - query) ** 2).sum(axis=1)
+        order = np.argsort(distances)[:fetch]
+        found_ids, scores = candidates[order], distances[order]
+    else:
+        params = faiss.SearchParameters(sel=build_selector(ids)) if ids is not None else None
+        scores, found_ids = index.search(query, fetch, params=params)
+        scores, found_ids = scores[0], found_ids[0]
+        keep = found_ids != -1
+        scores, found_ids = scores[keep], found_ids[keep]
+
+    if full_vectors is not None:
+        found_ids, scores = rescore(full_vectors, query[0], found_ids, k)
+
+    results = []
+    for faiss_id, score in zip(found_ids[:k], scores[:k]):
+        document = vector_store.docstore.search(vector_store.index_to_docstore_id[int(faiss_id)])
+        results.append((document, float(score)))
+    return results
+
+
+def filtered_search_with_score(vector_store, table: MetadataTable, query_vector: List[float], k: int, filters: Dict,
+                               full_vectors: np.ndarray = None) -> List[Tuple[Document, float]]:
+    """
+    Search only the vectors whose metadata matches the filters.
+
+    Args:
+        vector_store: A loaded LangChain FAISS vector store
+        table (MetadataTable): The store's metadata columns
+        query_vector (List[float]): Embedded query
+        k (int): Number of results
+        filters (dict): Metadata filters (see MetadataTable.mask)
+        full_vectors (np.ndarray, optional): Full-precision vectors for re-scoring a compressed store
+
+    Returns:
+        List[Tuple[Document, float]]: Matching chunks and their distances, best first
+    """
+    ids = np.flatnonzero(table.mask(filters)).astype(np.int64)
+    return search_by_vector(vector_store, query_vector, k, ids=ids, full_vectors=full_vectors)
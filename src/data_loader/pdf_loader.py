@@ -1,3 +1,5 @@
+from typing import Iterator
+
 import pdfplumber
 from langchain_community.document_loaders import PyPDFLoader
 from langchain.schema import Document
@@ -29,10 +31,98 @@ def load_pdf_with_pdfplumber(document_path: str):
         logger.error(f"Failed to load PDF with pdfplumber: {document_path}, Error: {str(e)}")
         return None
 
+class _PdfplumberFallback:
+    """Opens the PDF with pdfplumber on first use and extracts single pages on demand"""
+
+    def __init__(self, document_path: str):
+        self.document_path = document_path
+        self._pdf = None
+
+    def extract_page(self, page_number: int):
+        try:
+            if self._pdf is None:
+                self._pdf = pdfplumber.open(self.document_path)
+            if page_number >= len(self._pdf.pages):
+                return None
+            page = self._pdf.pages[page_number]
+            text = page.extract_text()
+            # Drop the parsed layout objects so memory doesn't grow with the page count
+            page.close()
+            return text
+        except Exception as e:
+            logger.error(f"pdfplumber failed on page {page_number} of {self.document_path}: {str(e)}")
+            return None
+
+    def page_count(self) -> int:
+        try:
+            if self._pdf is None:
+                self._pdf = pdfplumber.open(self.document_path)
+            return len(self._pdf.pages)
+        except Exception as e:
+            logger.error(f"pdfplumber could not open {self.document_path}: {str(e)}")
+            return 0
+
+    def close(self):
+        if self._pdf is not None:
+            self._pdf.close()
+            self._pdf = None
+
+
+def iter_pdf_pages(document_path: str) -> Iterator[Document]:
+    """
+    Lazily yield a PDF's pages as Documents, one page at a time.
+    
+    Pages are read with PyPDFLoader; pdfplumber is only used for the individual pages
+    that PyPDF fails on or returns no text for. If PyPDF stops part-way through the file,
+    the remaining pages are read with pdfplumber.
+    
+    Args:
+        document_path (str): The path to the PDF document.
+    
+    Yields:
+        Document: One Document per page with extractable text.
+    """
+    fallback = _PdfplumberFallback(document_path)
+    next_page = 0
+    fallback_pages = 0
+    try:
+        try:
+            for document in PyPDFLoader(document_path).lazy_load():
+                page_number = document.metadata.get("page", next_page)
+                next_page = page_number + 1
+                
+                if document.page_content.strip():
+                    yield document
+                    continue
+                
+                text = fallback.extract_page(page_number)
+                if text and text.strip():
+                    fallback_pages += 1
+                    document.page_content = text
+                    yield document
+        except Exception as e:
+            logger.error(f"PyPDFLoader stopped at page {next_page} of {document_path}: {str(e)}")
+            
+            # Read whatever PyPDF didn't get to with pdfplumber
+            for page_number in range(next_page, fallback.page_count()):
+                text = fallback.extract_page(page_number)
+                if text and text.strip():
+                    fallback_pages += 1
+                    yield Document(
+                        page_content=text,
+                        metadata={"source": document_path, "type": "pdf", "page": page_number}
+                    )
+    finally:
+        fallback.close()
+    
+    if fallback_pages:
+        logger.info(f"Used pdfplumber for {fallback_pages} pages of {document_path}")
+
+
 def load_pdf(document_path: str):
     """
-    Attempts to load a PDF file using both PyPDFLoader and pdfplumber, 
-    returning the first successful result.
+    Loads a PDF file page by page, using PyPDFLoader and falling back to pdfplumber
+    only for the pages PyPDFLoader can't extract.
     
     Args:
         document_path (str): The path to the PDF document.
@@ -40,13 +130,7 @@ def load_pdf(document_path: str):
     Returns:
         List[Document]: A list of Document objects if successful, or None if both methods fail.
     """
-    # First try PyPDFLoader
-    documents = load_pdf_with_pdfloader(document_path)
-    if documents:
-        return documents
-    
-    # If PyPDFLoader fails, try pdfplumber
-    documents = load_pdf_with_pdfplumber(document_path)
+    documents = list(iter_pdf_pages(document_path))
     if documents:
         return documents
     
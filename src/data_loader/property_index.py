@@ -0,0 +1,598 @@
+import os
+import re
+import sys
+import pickle
+import argparse
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain.schema import Document
+from loguru import logger
+
+# Add the root project directory to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.data_loader import settings
+from src.data_loader.sharded_index import shard_paths
+from src.data_loader.corpus_registry import corpus_path
+
+PROPERTY_INDEX_FILE = "properties.npz"
+
+# Canonical unit and the aliases used to recognise each property in text, table headers and queries
+PROPERTIES = {
+    "density": ("g/cm3", r"density|specific gravity"),
+    "strength": ("MPa", r"(?:yield|tensile|ultimate|failure|compressive|flexural)?\s*strength|uts|yield stress"),
+    "youngs_modulus": ("GPa", r"young'?s modulus|elastic modulus|modulus of elasticity|stiffness|modulus"),
+    "max_service_temperature": ("°C", r"(?:max(?:imum)?[\s-]+)?(?:service|operating|working|use)\s+temp(?:erature)?s?|max(?:imum)?\s+temp(?:erature)?s?"),
+    "melting_point": ("°C", r"melting (?:point|temperature)"),
+    "thermal_conductivity": ("W/m.K", r"thermal conductivity|conductivity"),
+    "fracture_toughness": ("MPa.m1/2", r"fracture toughness|toughness|k1c|kic"),
+}
+
+# A bare "temperature" in a requirement ("must withstand temperatures above 500 °C") is a service
+# temperature; in the corpus it is too often a glass transition or melting temperature to count
+QUERY_TEMPERATURE_ALIAS = r"(?<!transition\s)(?<!melting\s)temperatures?"
+
+# Multiplier (or converter) from each recognised unit to the property's canonical unit
+UNIT_CONVERSIONS = {
+    "density": {"g/cm3": 1.0, "g/cc": 1.0, "mg/m3": 1.0, "kg/m3": 0.001, "lb/in3": 27.68, "lb/ft3": 0.016018},
+    "strength": {"mpa": 1.0, "gpa": 1000.0, "kpa": 0.001, "ksi": 6.895, "psi": 0.006895, "n/mm2": 1.0},
+    "youngs_modulus": {"gpa": 1.0, "mpa": 0.001, "msi": 6.895, "psi": 6.895e-6, "ksi": 6.895e-3},
+    "max_service_temperature": {"c": lambda v: v, "k": lambda v: v - 273.15, "f": lambda v: (v - 32) * 5 / 9},
+    "melting_point": {"c": lambda v: v, "k": lambda v: v - 273.15, "f": lambda v: (v - 32) * 5 / 9},
+    "thermal_conductivity": {"w/m.k": 1.0},
+    "fracture_toughness": {"mpa.m1/2": 1.0, "ksi.in1/2": 1.099},
+}
+
+# Units that identify the property on their own (table columns and cells without a named header)
+UNIT_ONLY_PROPERTIES = {
+    "g/cm3": "density", "g/cc": "density", "mg/m3": "density", "kg/m3": "density", "lb/in3": "density",
+    "gpa": "youngs_modulus", "msi": "youngs_modulus", "mpa": "strength", "ksi": "strength", "n/mm2": "strength",
+    "w/m.k": "thermal_conductivity", "mpa.m1/2": "fracture_toughness",
+}
+
+UNIT_PATTERN = (
+    r"g\s*/\s*cm(?:3|³|\^3)|g/cc|[Mk]g\s*/\s*m(?:3|³|\^3)|lb\s*/\s*(?:in|ft)(?:3|³|\^3)"
+    r"|MPa\s*(?:\.|·|\s)?\s*(?:m(?:1/2|½|\^0\.5)|√m)|ksi\s*(?:\.|·|\s)?\s*in(?:1/2|½|\^0\.5)"
+    r"|[GMk]Pa|ksi|psi|Msi|N\s*/\s*mm(?:2|²|\^2)"
+    r"|W\s*(?:/|\s)\s*\(?m\s*(?:\.|·|\s)?\s*K\)?|W\s*m-1\s*K-1"
+    r"|°\s*[CF]|º\s*[CF]|deg\s*[CF]|K\b"
+)
+VALUE_PATTERN = r"[-+]?\d+(?:[.,]\d+)?(?:\s*(?:-|–|to)\s*[-+]?\d+(?:[.,]\d+)?)?"
+VALUE_UNIT_REGEX = re.compile(rf"(?P<value>{VALUE_PATTERN})\s*(?P<unit>{UNIT_PATTERN})(?![A-Za-z])")
+VALUE_REGEX = re.compile(rf"(?<![\w.\-/])(?P<value>{VALUE_PATTERN})(?![\w.])")
+UNIT_TOKEN_REGEX = re.compile(rf"^\(?(?:{UNIT_PATTERN})\)?$", re.IGNORECASE)
+
+# Material names recognised in running text (tables take the material from the row label)
+MATERIAL_REGEX = re.compile(
+    r"\b(?:AISI\s*\d{3,4}L?|\d{4}-T\d+|Ti-\d+Al-\d+V|Ti-6-4|AZ\d{2}[A-Z]?|Inconel\s*\d{3}|Hastelloy\s*[A-Z]\d*"
+    r"|(?:low|medium|high)[- ]carbon steels?|stainless steels?|tool steels?|cast irons?|steels?"
+    r"|alumin(?:i)?um(?: alloys?)?|titanium(?: alloys?)?|magnesium(?: alloys?)?|copper(?: alloys?)?|nickel(?: alloys?)?"
+    r"|zinc(?: alloys?)?|brass|bronze|tungsten|lead|gold|silver"
+    r"|CFRP|GFRP|KFRP|PEEK|PTFE|PVC|PMMA|nylons?|polyethylene|polypropylene|polystyrene|polycarbonate|epoxy|epoxies|rubber"
+    r"|alumina|silicon carbide|silicon nitride|zirconia|boron carbide|glass(?:es)?(?!\s+transition)|concrete|woods?|diamond)\b",
+    re.IGNORECASE
+)
+
+CONSTRAINT_OPERATORS = [
+    (r"<=|≤|at most|no more than|not exceeding|maximum of|max\.?|up to|under|below|less than|lower than|<", "<"),
+    (r">=|≥|at least|no less than|minimum of|min\.?|above|over|exceeding|more than|greater than|higher than|>", ">"),
+]
+
+
+def _parse_value(value: str) -> Tuple[float, float]:
+    """Parse "7.8" or "5-8" / "5 to 8" into a (low, high) range"""
+    parts = re.split(r"\s*(?:–|to|(?<=\d)-)\s*", value.replace(",", "."), maxsplit=1)
+    numbers = [float(part) for part in parts if part.strip()]
+    return min(numbers), max(numbers)
+
+
+def _unit_key(unit: str) -> str:
+    """Reduce a unit as written in the text to the keys used in UNIT_CONVERSIONS"""
+    unit = unit.strip("() ").lower().replace("³", "3").replace("²", "2").replace("^3", "3").replace("^2", "2")
+    unit = re.sub(r"\s+", "", unit).replace("·", ".")
+    if re.fullmatch(r"(°|º|deg)?c", unit):
+        return "c"
+    if re.fullmatch(r"(°|º|deg)?f", unit):
+        return "f"
+    if unit.startswith("w") and "k" in unit:
+        return "w/m.k"
+    if unit.startswith("mpa") and ("m" in unit[3:] or "√" in unit):
+        return "mpa.m1/2"
+    if unit.startswith("ksi") and "in" in unit:
+        return "ksi.in1/2"
+    return unit
+
+
+def normalize_value(prop: str, low: float, high: float, unit: Optional[str]) -> Optional[Tuple[float, float]]:
+    """
+    Convert a value range to the property's canonical unit.
+
+    Args:
+        prop (str): Canonical property name
+        low (float): Lower bound as written
+        high (float): Upper bound as written
+        unit (str, optional): Unit as written; None means the value is already canonical
+
+    Returns:
+        Tuple[float, float] or None: Converted range, or None if the unit doesn't fit the property
+    """
+    if unit is None:
+        return low, high
+    conversion = UNIT_CONVERSIONS[prop].get(_unit_key(unit))
+    if conversion is None:
+        return None
+    if callable(conversion):
+        return round(conversion(low), 6), round(conversion(high), 6)
+    return round(low * conversion, 6), round(high * conversion, 6)
+
+
+# Order in which properties are tried when a phrase could name several ("melting temperature")
+PROPERTY_PRIORITY = ("melting_point", "fracture_toughness", "thermal_conductivity", "density",
+                     "youngs_modulus", "max_service_temperature", "strength")
+PROPERTY_REGEXES = {prop: re.compile(rf"\b(?:{PROPERTIES[prop][1]})\b", re.IGNORECASE) for prop in PROPERTY_PRIORITY}
+
+
+def match_property(text: str) -> Optional[str]:
+    """Canonical property named in a header cell or phrase, if any"""
+    for prop in PROPERTY_PRIORITY:
+        if PROPERTY_REGEXES[prop].search(text):
+            return prop
+    return None
+
+
+def nearest_property(text: str) -> Optional[str]:
+    """
+    Property whose mention ends closest to the end of the text, i.e. the one a value
+    following the text belongs to ("density 8.0 g/cm3 and yield strength" -> strength).
+    """
+    best, best_key = None, None
+    for priority, prop in enumerate(PROPERTY_PRIORITY):
+        for match in PROPERTY_REGEXES[prop].finditer(text):
+            key = (match.end(), -priority)
+            if best_key is None or key > best_key:
+                best, best_key = prop, key
+    return best
+
+
+def _clean_material(name: str) -> str:
+    name = re.sub(r"\s+", " ", name).strip(" .:;,-|*")
+    if name.count("(") > name.count(")"):
+        # Drop a dangling parenthetical, e.g. "Nodular cast iron (ASTM"; balanced ones such as
+        # "HSLA steel 4140 (o.q. T-315)" are part of the name
+        name = name[:name.rfind("(")]
+    elif name.count(")") > name.count("("):
+        name = name.strip(")")
+    return name.strip(" .:;,-|*")[:80]
+
+
+def _table_rows(lines: List[str], columns: List[Tuple[Optional[str], Optional[str]]], start: int) -> Iterable[Tuple[str, List[Tuple[str, float, float, Optional[str]]], str]]:
+    """
+    Read the rows of a table whose columns have been identified.
+
+    The rightmost numbers of each row are matched to the columns positionally, since
+    extracted rows often carry numbers in the material label too ("HSLA steel 4140").
+    """
+    for line in lines[start:]:
+        values = list(VALUE_REGEX.finditer(line))
+        # Rows that carry their own units belong to a different layout
+        if len(values) < max(2, len(columns) // 2) or len(VALUE_UNIT_REGEX.findall(line)) >= 2:
+            break
+        row_values = values[-len(columns):] if len(values) >= len(columns) else values
+        material = _clean_material(line[:row_values[0].start()])
+        if not material or not re.search(r"[A-Za-z]{2}", material):
+            continue
+        offset = len(columns) - len(row_values)
+        parsed = []
+        for position, match in enumerate(row_values):
+            prop, unit = columns[offset + position]
+            if prop is None:
+                continue
+            low, high = _parse_value(match.group("value"))
+            parsed.append((prop, low, high, unit))
+        yield material, parsed, line.strip()
+
+
+def extract_properties(text: str) -> List[dict]:
+    """
+    Extract material/property/value/unit tuples from a page or chunk of text.
+
+    Three layouts are recognised: table rows that carry their own units ("Ti-6Al-4V  4.4 g/cm3
+    880 MPa"), tables whose header or units row names the columns ("kg/m3 GPa MPa"), and
+    sentences naming a material, a property and a value ("the density of alumina is 3.9 g/cm3").
+
+    Args:
+        text (str): Extracted text
+
+    Returns:
+        List[dict]: Records with material, property, low, high (canonical units) and evidence
+    """
+    records = []
+
+    def add(material, prop, low, high, unit, evidence):
+        converted = normalize_value(prop, low, high, unit)
+        if converted is not None:
+            records.append({"material": material, "property": prop, "low": converted[0],
+                            "high": converted[1], "evidence": evidence[:240]})
+
+    lines = [line for line in text.splitlines() if line.strip()]
+    table_lines = set()
+    for position, line in enumerate(lines):
+        tokens = line.split()
+        # Units row under a table header: "kg/m3 GPa MPa kg kg kg"
+        unit_tokens = [token for token in tokens if UNIT_TOKEN_REGEX.match(token) or token.lower() in ("kg", "$/kg", "-")]
+        if len(tokens) >= 2 and len(unit_tokens) == len(tokens) and any(UNIT_TOKEN_REGEX.match(t) for t in tokens):
+            columns = []
+            for token in tokens:
+                key = _unit_key(token) if UNIT_TOKEN_REGEX.match(token) else None
+                columns.append((UNIT_ONLY_PROPERTIES.get(key), token) if key else (None, None))
+            for offset, (material, parsed, evidence) in enumerate(_table_rows(lines, columns, position + 1)):
+                table_lines.add(position + 1 + offset)
+                for prop, low, high, unit in parsed:
+                    add(material, prop, low, high, unit, evidence)
+            continue
+
+        # Header with named, unit-annotated columns: "Material  Density (g/cm3)  Yield strength (MPa)"
+        header_cells = re.findall(r"([A-Za-z'][A-Za-z' .]*?)\s*\(([^)]+)\)", line)
+        header_columns = [(match_property(name), unit) for name, unit in header_cells if match_property(name)]
+        if len(header_columns) >= 2 and not VALUE_UNIT_REGEX.search(line):
+            for offset, (material, parsed, evidence) in enumerate(_table_rows(lines, header_columns, position + 1)):
+                table_lines.add(position + 1 + offset)
+                for prop, low, high, unit in parsed:
+                    add(material, prop, low, high, unit, evidence)
+
+    for position, line in enumerate(lines):
+        if position in table_lines:
+            continue
+        pairs = list(VALUE_UNIT_REGEX.finditer(line))
+        if len(pairs) < 2:
+            continue
+        material_label = _clean_material(line[:pairs[0].start()])
+        # Rows carrying units in each cell, labelled by the material: nothing but values after the label
+        leftover = VALUE_UNIT_REGEX.sub(" ", line[pairs[0].start():]).split()
+        if (material_label and len(material_label.split()) <= 6 and len(leftover) <= 1
+                and not re.search(r"[=.:]\s|=$", material_label) and not match_property(material_label)):
+            for pair in pairs:
+                prop = UNIT_ONLY_PROPERTIES.get(_unit_key(pair.group("unit")))
+                if prop:
+                    low, high = _parse_value(pair.group("value"))
+                    add(material_label, prop, low, high, pair.group("unit"), line.strip())
+
+    # Sentences: a material, a property and a value with its unit
+    for sentence in re.split(r"(?<=[.;])\s+|\n(?=[A-Z])", text):
+        sentence = " ".join(sentence.split())
+        materials = list(MATERIAL_REGEX.finditer(sentence))
+        if not materials:
+            continue
+        for pair in VALUE_UNIT_REGEX.finditer(sentence):
+            before = sentence[max(0, pair.start() - 60):pair.start()]
+            prop = nearest_property(before)
+            if prop is None:
+                continue
+            preceding = [m for m in materials if m.start() < pair.start()]
+            material = (preceding[-1] if preceding else materials[0]).group(0)
+            low, high = _parse_value(pair.group("value"))
+            add(material, prop, low, high, pair.group("unit"), sentence)
+
+    return records
+
+
+class PropertyIndex:
+    """
+    Columnar store of material property values extracted from the corpus.
+
+    Each property is held as parallel NumPy arrays (material id, low, high, source document,
+    page, evidence), so range constraints are answered with vectorised comparisons instead
+    of text search. Values are stored in the property's canonical unit (see PROPERTIES).
+    """
+
+    def __init__(self):
+        self.materials: List[str] = []
+        self.sources: List[str] = []
+        self._material_ids: Dict[str, int] = {}
+        self._source_ids: Dict[str, int] = {}
+        self._pending: Dict[str, List[tuple]] = {prop: [] for prop in PROPERTIES}
+        self.columns: Dict[str, Dict[str, np.ndarray]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(column["material"]) for column in self.columns.values()) + \
+            sum(len(rows) for rows in self._pending.values())
+
+    def _intern(self, value: str, values: List[str], ids: Dict[str, int]) -> int:
+        key = value.lower()
+        if key not in ids:
+            ids[key] = len(values)
+            values.append(value)
+        return ids[key]
+
+    def add_documents(self, documents: List[Document]) -> int:
+        """
+        Extract property records from pages or chunks and add them to the index.
+
+        Args:
+            documents (List[Document]): Documents with doc_name/page metadata
+
+        Returns:
+            int: Number of records added
+        """
+        added = 0
+        for document in documents:
+            source = document.metadata.get("doc_name", "")
+            page = document.metadata.get("page", -1)
+            for record in extract_properties(document.page_content):
+                material_id = self._intern(record["material"], self.materials, self._material_ids)
+                source_id = self._intern(source, self.sources, self._source_ids)
+                self._pending[record["property"]].append(
+                    (material_id, record["low"], record["high"], source_id, int(page), record["evidence"])
+                )
+                added += 1
+        return added
+
+    def _consolidate(self):
+        """Merge pending records into the column arrays, dropping duplicates from overlapping chunks"""
+        for prop, rows in self._pending.items():
+            if not rows:
+                continue
+            column = self.columns.get(prop)
+            if column is not None:
+                rows = list(zip(column["material"].tolist(), column["low"].tolist(), column["high"].tolist(),
+                                column["source"].tolist(), column["page"].tolist(), column["evidence"].tolist())) + rows
+            unique = list(dict.fromkeys(rows))
+            self.columns[prop] = {
+                "material": np.array([row[0] for row in unique], dtype=np.int32),
+                "low": np.array([row[1] for row in unique], dtype=np.float64),
+                "high": np.array([row[2] for row in unique], dtype=np.float64),
+                "source": np.array([row[3] for row in unique], dtype=np.int32),
+                "page": np.array([row[4] for row in unique], dtype=np.int32),
+                "evidence": np.array([row[5] for row in unique], dtype=str),
+            }
+            self._pending[prop] = []
+
+    def save(self, path: str):
+        """Write the index as a single .npz file (no pickled objects)"""
+        self._consolidate()
+        arrays = {
+            "materials": np.array(self.materials, dtype=str),
+            "sources": np.array(self.sources, dtype=str),
+        }
+        for prop, column in self.columns.items():
+            for name, values in column.items():
+                arrays[f"{prop}__{name}"] = values
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "PropertyIndex":
+        index = cls()
+        with np.load(path, allow_pickle=False) as data:
+            index.materials = data["materials"].tolist()
+            index.sources = data["sources"].tolist()
+            for key in data.files:
+                if "__" in key:
+                    prop, name = key.split("__", 1)
+                    index.columns.setdefault(prop, {})[name] = data[key]
+        index._material_ids = {name.lower(): i for i, name in enumerate(index.materials)}
+        index._source_ids = {name.lower(): i for i, name in enumerate(index.sources)}
+        return index
+
+    @classmethod
+    def load_or_create(cls, path: str) -> "PropertyIndex":
+        if os.path.exists(path):
+            try:
+                return cls.load(path)
+            except Exception as e:
+                logger.error(f"Could not load property index at {path}, starting a new one: {str(e)}")
+        return cls()
+
+    def filter(self, constraints: List[Tuple[str, str, float]]) -> Dict[int, Dict[str, List[int]]]:
+        """
+        Find materials satisfying every constraint.
+
+        A material satisfies "prop < value" if any of its reported ranges reaches below the
+        value (and "prop > value" if any reaches above it), so ranges spanning the limit are kept.
+
+        Args:
+            constraints (List[Tuple[str, str, float]]): (property, "<" or ">", value in canonical units)
+
+        Returns:
+            Dict[int, Dict[str, List[int]]]: Material id -> property -> matching row numbers
+        """
+        self._consolidate()
+        matches: Optional[Dict[int, Dict[str, List[int]]]] = None
+        for prop, operator, value in constraints:
+            column = self.columns.get(prop)
+            if column is None:
+                return {}
+            mask = column["low"] < value if operator == "<" else column["high"] > value
+            rows_by_material: Dict[int, List[int]] = {}
+            for row in np.nonzero(mask)[0].tolist():
+                rows_by_material.setdefault(int(column["material"][row]), []).append(row)
+
+            if matches is None:
+                matches = {material: {prop: rows} for material, rows in rows_by_material.items()}
+            else:
+                matches = {
+                    material: {**props, prop: rows_by_material[material]}
+                    for material, props in matches.items() if material in rows_by_material
+                }
+        return matches or {}
+
+    def search(self, constraints: List[Tuple[str, str, float]], limit: int = 15) -> List[dict]:
+        """
+        Materials satisfying the constraints, with the supporting values and their sources.
+
+        Args:
+            constraints (List[Tuple[str, str, float]]): (property, "<" or ">", value in canonical units)
+            limit (int): Maximum number of candidates
+
+        Returns:
+            List[dict]: Candidates with material name and per-property values
+        """
+        candidates = []
+        for material, props in self.filter(constraints).items():
+            values = {}
+            for prop, rows in props.items():
+                column = self.columns[prop]
+                values[prop] = [{
+                    "low": float(column["low"][row]),
+                    "high": float(column["high"][row]),
+                    "source": self.sources[column["source"][row]],
+                    "page": int(column["page"][row]),
+                    "evidence": str(column["evidence"][row]),
+                } for row in rows[:2]]
+            candidates.append({"material": self.materials[material], "values": values})
+        candidates.sort(key=lambda c: (-sum(len(v) for v in c["values"].values()), c["material"].lower()))
+        return candidates[:limit]
+
+
+def parse_constraints(query: str) -> List[Tuple[str, str, float]]:
+    """
+    Parse numeric property constraints from a requirements query.
+
+    Recognises phrases such as "density < 5 g/cm³", "service temperature above 500°C" and
+    "yield strength of at least 300 MPa". Values are converted to canonical units.
+
+    Args:
+        query (str): Free-text requirements
+
+    Returns:
+        List[Tuple[str, str, float]]: (property, "<" or ">", value) constraints
+    """
+    constraints = []
+    property_pattern = "|".join([f"(?:{aliases})" for _, aliases in PROPERTIES.values()] + [QUERY_TEMPERATURE_ALIAS])
+    operator_pattern = "|".join(pattern for pattern, _ in CONSTRAINT_OPERATORS)
+    regex = re.compile(
+        rf"(?P<prop>\b(?:{property_pattern}))\b[^.;\n<>≤≥\d]{{0,40}}?(?P<op>{operator_pattern})\s*"
+        rf"(?P<value>[-+]?\d+(?:[.,]\d+)?)\s*(?P<unit>{UNIT_PATTERN})?",
+        re.IGNORECASE
+    )
+    for match in regex.finditer(query):
+        prop = match_property(match.group("prop"))
+        if prop is None and re.fullmatch(QUERY_TEMPERATURE_ALIAS, match.group("prop"), re.IGNORECASE):
+            prop = "max_service_temperature"
+        if prop is None:
+            continue
+        operator = next(symbol for pattern, symbol in CONSTRAINT_OPERATORS
+                        if re.fullmatch(pattern, match.group("op"), re.IGNORECASE))
+        # "temperatures up to 600°C" is a requirement to survive 600°C, not a ceiling
+        if prop in ("max_service_temperature", "melting_point") and re.fullmatch(r"up to", match.group("op"), re.IGNORECASE):
+            operator = ">"
+        value = float(match.group("value").replace(",", "."))
+        converted = normalize_value(prop, value, value, match.group("unit"))
+        if converted is not None:
+            constraints.append((prop, operator, converted[0]))
+    return list(dict.fromkeys(constraints))
+
+
+_loaded_indexes: Dict[str, Tuple[float, PropertyIndex]] = {}
+
+
+def load_property_index(index_path: str) -> Optional[PropertyIndex]:
+    """
+    Load a shard's property store, reusing it until the file changes.
+
+    Args:
+        index_path (str): Shard (or pre-sharding index) directory
+
+    Returns:
+        PropertyIndex or None: None if the shard has no property store
+    """
+    path = os.path.join(index_path, PROPERTY_INDEX_FILE)
+    if not os.path.exists(path):
+        return None
+    mtime = os.path.getmtime(path)
+    cached = _loaded_indexes.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, PropertyIndex.load(path))
+        _loaded_indexes[path] = cached
+    return cached[1]
+
+
+def format_candidates(constraints: List[Tuple[str, str, float]], candidates: List[dict]) -> str:
+    """Render property-index candidates as a context segment for the analysis prompt"""
+    wanted = ", ".join(f"{prop.replace('_', ' ')} {op} {value:g} {PROPERTIES[prop][0]}" for prop, op, value in constraints)
+    lines = [f"Structured property data for materials matching: {wanted}"]
+    for candidate in candidates:
+        parts = []
+        for prop, values in candidate["values"].items():
+            value = values[0]
+            shown = f"{value['low']:g}" if value["low"] == value["high"] else f"{value['low']:g}-{value['high']:g}"
+            location = f"{value['source']}, page {value['page'] + 1}" if value["page"] >= 0 else value["source"]
+            parts.append(f"{prop.replace('_', ' ')} {shown} {PROPERTIES[prop][0]} ({location})")
+        lines.append(f"- {candidate['material']}: " + "; ".join(parts))
+    return "\n".join(lines)
+
+
+def lookup_property_candidates(query: str, index_path: str = None, limit: int = 15, corpora: List[str] = None) -> str:
+    """
+    Answer a query's numeric constraints from the property index.
+
+    Args:
+        query (str): Requirements text (e.g. the comprehensive query)
+        index_path (str, optional): Index directory (defaults to the indexes of `corpora`)
+        limit (int): Maximum number of candidate materials
+        corpora (List[str], optional): Corpora whose property stores are searched (defaults to [settings.DEFAULT_CORPUS])
+
+    Returns:
+        str: Formatted candidate segment, or "" if there are no constraints or matches
+    """
+    try:
+        constraints = parse_constraints(query)
+        if not constraints:
+            return ""
+        index_paths = [index_path] if index_path else [corpus_path(corpus) for corpus in corpora or [settings.DEFAULT_CORPUS]]
+        # Each shard has its own property store
+        paths = [path for index_path in index_paths for path in shard_paths(index_path)]
+        property_indexes = [index for index in map(load_property_index, paths) if index is not None]
+        if not property_indexes:
+            logger.info("No property index available, skipping structured lookup")
+            return ""
+        candidates = [candidate for index in property_indexes for candidate in index.search(constraints, limit=limit)]
+        candidates.sort(key=lambda c: (-sum(len(v) for v in c["values"].values()), c["material"].lower()))
+        candidates = candidates[:limit]
+        logger.info(f"Property index: {len(candidates)} candidates for {constraints}")
+        return format_candidates(constraints, candidates) if candidates else ""
+    except Exception as e:
+        logger.error(f"Property index lookup failed: {str(e)}")
+        return ""
+
+
+def build_from_vector_index(index_path: str) -> PropertyIndex:
+    """
+    Build the property store from the chunks already in a FAISS index, without re-embedding.
+
+    Args:
+        index_path (str): Shard (or pre-sharding index) directory
+
+    Returns:
+        PropertyIndex: The saved property index
+    """
+    # The docstore is pickled next to the FAISS index (the same file FAISS.load_local reads)
+    with open(os.path.join(index_path, "index.pkl"), "rb") as f:
+        docstore, _ = pickle.load(f)
+    property_index = PropertyIndex()
+    added = property_index.add_documents(list(docstore._dict.values()))
+    property_index.save(os.path.join(index_path, PROPERTY_INDEX_FILE))
+    logger.success(f"Extracted {added} property values for {len(property_index.materials)} materials into {index_path}")
+    return property_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or query the structured materials property index.')
+    parser.add_argument('--index', default=os.path.join(settings.DOC_INDEXES_DIR, settings.DEFAULT_CORPUS), help='Vector index directory')
+    parser.add_argument('--build', action='store_true', help="Extract properties from the index's existing chunks")
+    parser.add_argument('--query', default=None, help='Constraints to look up, e.g. "density < 5 g/cm3 and service temperature > 500 C"')
+    args = parser.parse_args()
+
+    if args.build:
+        for path in shard_paths(args.index):
+            build_from_vector_index(path)
+    if args.query:
+        print(lookup_property_candidates(args.query, args.index) or "No matching materials")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from loguru import logger
+from src.data_loader import settings
+from src.monitoring.metrics import CACHE_REQUESTS_TOTAL
+
+_embeddings = None
+_embeddings_lock = threading.Lock()
+
+
+def get_embeddings():
+    """The process-wide embeddings model, loaded on first use and shared by indexing and retrieval"""
+    global _embeddings
+    with _embeddings_lock:
+        if _embeddings is None:
+            from langchain_community.embeddings import HuggingFaceEmbeddings
+            _embeddings = HuggingFaceEmbeddings(model_name=settings.EMBEDDING_MODEL)
+        return _embeddings
+
+
+def precomputed_path() -> str:
+    """File holding the pinned query embeddings of the current embedding model"""
+    return os.path.join(settings.QUERY_EMBEDDINGS_DIR, f"{settings.EMBEDDING_MODEL.replace('/', '_')}.json")
+
+
+class QueryEmbeddingCache:
+    """
+    Query text -> embedding, so repeated queries skip the model's forward pass.
+
+    Pinned entries (fixed queries the app itself issues, such as the fallback sub-queries)
+    are never evicted and are persisted, so a restarted process loads them from disk
+    instead of embedding them again. Other queries are kept in a bounded LRU.
+    """
+
+    def __init__(self, max_entries: int = None):
+        """
+        Args:
+            max_entries (int, optional): Unpinned queries kept (defaults to settings.QUERY_EMBEDDING_CACHE_SIZE)
+        """
+        self.max_entries = settings.QUERY_EMBEDDING_CACHE_SIZE if max_entries is None else max_entries
+        self.pinned: Dict[str, List[float]] = {}
+        self._recent: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.pinned) + len(self._recent)
+
+    def get(self, text: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self.pinned.get(text)
+            if vector is None:
+                vector = self._recent.get(text)
+                if vector is not None:
+                    self._recent.move_to_end(text)
+        CACHE_REQUESTS_TOTAL.inc(cache="query_embedding", result="miss" if vector is None else "hit")
+        return vector
+
+    def put(self, text: str, vector: List[float]):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if text in self.pinned:
+                return
+            self._recent[text] = vector
+            self._recent.move_to_end(text)
+            while len(self._recent) > self.max_entries:
+                self._recent.popitem(last=False)
+
+    def pin(self, texts: List[str], embeddings, path: str = None) -> int:
+        """
+        Pin the embeddings of fixed queries, loading them from disk when precomputed.
+
+        Texts missing from the file are embedded in one batch and the file is rewritten.
+
+        Args:
+            texts (List[str]): Queries to pin
+            embeddings: The embeddings object for texts not precomputed yet
+            path (str, optional): Precomputed embeddings file (defaults to precomputed_path())
+
+        Returns:
+            int: Number of texts that had to be embedded
+        """
+        path = path or precomputed_path()
+        stored = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    stored = json.load(f)["vectors"]
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable precomputed query embeddings {path}: {str(e)}")
+
+        missing = [text for text in dict.fromkeys(texts) if text not in stored]
+        if missing:
+            for text, vector in zip(missing, embeddings.embed_documents(missing)):
+                stored[text] = [float(value) for value in vector]
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"model": settings.EMBEDDING_MODEL, "vectors": stored}, f)
+            logger.info(f"Precomputed {len(missing)} query embeddings into {path}")
+
+        with self._lock:
+            for text in texts:
+                self.pinned[text] = stored[text]
+                self._recent.pop(text, None)
+        return len(missing)
+
+
+_cache = QueryEmbeddingCache()
+
+
+def embed_query(text: str, embeddings=None) -> List[float]:
+    """
+    Embed a search query, from the cache when it has been seen before.
+
+    Args:
+        text (str): The query
+        embeddings: The embeddings object to use on a miss (defaults to get_embeddings())
+
+    Returns:
+        List[float]: The query embedding
+    """
+    vector = _cache.get(text)
+    if vector is None:
+        vector = (embeddings or get_embeddings()).embed_query(text)
+        _cache.put(text, vector)
+    return vector
+
+
+def pin_query_embeddings(texts: List[str], embeddings=None) -> int:
+    """Pin fixed queries in the process-wide cache (see QueryEmbeddingCache.pin)"""
+    return _cache.pin(texts, embeddings or get_embeddings())
+
+
+def query_embedding_cache() -> QueryEmbeddingCache:
+    return _cache
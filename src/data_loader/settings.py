@@ -1,4 +1,5 @@
 import os
+import json
 from pathlib import Path
 
 # Get project root directory
@@ -13,6 +14,141 @@ TEMP_DIR = os.path.join(ROOT_DIR, "temp_uploads")
 
 # Output subdirectories
 DOC_INDEXES_DIR = os.path.join(OUTPUT_DIR, "doc_indexes")
+EXTRACTION_CACHE_DIR = os.path.join(OUTPUT_DIR, "extraction_cache")
+QUERY_EMBEDDINGS_DIR = os.path.join(OUTPUT_DIR, "query_embeddings")
+
+# Cache extracted page text keyed by file content hash so re-indexing skips parsing
+EXTRACTION_CACHE_ENABLED = os.getenv("MSE_EXTRACTION_CACHE", "1") == "1"
+
+# Pages extracted, split and embedded together while indexing (bounds peak memory)
+INDEX_PAGE_BATCH_SIZE = 32
+
+# Chunking strategy: "recursive" (fixed-size character splits) or "structure"
+# (tables kept whole with their captions, prose split per section)
+CHUNKER = os.getenv("MSE_CHUNKER", "recursive")
+# Let the structure chunker use pdfplumber's table extraction for PDF pages (slower, more accurate grids)
+CHUNKER_PDF_TABLES = os.getenv("MSE_CHUNKER_PDF_TABLES", "0") == "1"
+
+# Extract material/property/value tuples while indexing and use them to answer numeric constraints
+PROPERTY_INDEX_ENABLED = os.getenv("MSE_PROPERTY_INDEX", "1") == "1"
+
+# Corpora: each is indexed under DOC_INDEXES_DIR/<name>. The default corpus is built from DATA_DIR,
+# the others from CORPORA_DIR/<name>
+DEFAULT_CORPUS = os.getenv("MSE_DEFAULT_CORPUS", "materials_database")
+CORPORA_DIR = os.path.join(ROOT_DIR, "corpora")
+# Estimated memory the loaded corpora may hold before the least recently used are unloaded
+CORPUS_MEMORY_BUDGET_MB = int(os.getenv("MSE_CORPUS_MEMORY_BUDGET_MB", "2048"))
+# Send each sub-query only to the corpora whose description is within this cosine similarity of the
+# best match (corpora without a description are always searched)
+CORPUS_ROUTING = os.getenv("MSE_CORPUS_ROUTING", "1") == "1"
+CORPUS_ROUTING_MARGIN = float(os.getenv("MSE_CORPUS_ROUTING_MARGIN", "0.1"))
+
+# Sentence-transformers model embedding documents and queries (one instance per process)
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+# Load the embedding model and the index at startup so the first query doesn't pay for it
+RETRIEVAL_WARM_UP = os.getenv("MSE_RETRIEVAL_WARM_UP", "1") == "1"
+# Recently embedded queries kept in memory; the app's fixed default queries are pinned on top
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("MSE_QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+
+# Adaptive k: keep a query's results until similarity falls below ADAPTIVE_MIN_SIMILARITY, drops by
+# more than ADAPTIVE_MAX_GAP from the previous result, or trails the best by more than ADAPTIVE_MARGIN
+# (cosine similarities), keeping between ADAPTIVE_MIN_K and ADAPTIVE_MAX_K results
+ADAPTIVE_K = os.getenv("MSE_ADAPTIVE_K", "1") == "1"
+ADAPTIVE_MIN_K = int(os.getenv("MSE_ADAPTIVE_MIN_K", "2"))
+ADAPTIVE_MAX_K = int(os.getenv("MSE_ADAPTIVE_MAX_K", "6"))
+ADAPTIVE_MIN_SIMILARITY = float(os.getenv("MSE_ADAPTIVE_MIN_SIMILARITY", "0.3"))
+ADAPTIVE_MAX_GAP = float(os.getenv("MSE_ADAPTIVE_MAX_GAP", "0.08"))
+ADAPTIVE_MARGIN = float(os.getenv("MSE_ADAPTIVE_MARGIN", "0.15"))
+
+# Threads used to search index shards in parallel
+SHARD_SEARCH_WORKERS = int(os.getenv("MSE_SHARD_SEARCH_WORKERS", "4"))
+
+# Published index versions kept on disk for rollback
+INDEX_KEEP_VERSIONS = int(os.getenv("MSE_INDEX_KEEP_VERSIONS", "3"))
+
+# Embedding storage for new shards: "flat" (float32), "fp16", "sq8" or "pq"
+INDEX_TYPE = os.getenv("MSE_INDEX_TYPE", "flat")
+# Keep a float32 copy of compressed shards' vectors on disk (memory-mapped) ...
+INDEX_FULL_PRECISION = os.getenv("MSE_INDEX_FULL_PRECISION", "1") == "1"
+# ... and re-score the top k * INDEX_RESCORE_FACTOR candidates exactly with it
+INDEX_RESCORE = os.getenv("MSE_INDEX_RESCORE", "1") == "1"
+INDEX_RESCORE_FACTOR = int(os.getenv("MSE_INDEX_RESCORE_FACTOR", "4"))
+
+# Background ingestion of uploaded files and files dropped into TEMP_DIR
+INGESTION_ENABLED = os.getenv("MSE_INGESTION", "1") == "1"
+UPLOADS_DIR = os.path.join(DATA_DIR, "uploads")
+INGESTION_DB = os.path.join(OUTPUT_DIR, "ingestion", "jobs.sqlite3")
+INGESTION_POLL_SECONDS = float(os.getenv("MSE_INGESTION_POLL_SECONDS", "2"))
+# Uploads are refused (and dropped files left in place) while this many jobs are queued
+INGESTION_MAX_PENDING = int(os.getenv("MSE_INGESTION_MAX_PENDING", "20"))
+INGESTION_MAX_ATTEMPTS = 3
+# Fraction of wall time the worker may spend indexing; it sleeps the rest between page batches
+INGESTION_DUTY_CYCLE = float(os.getenv("MSE_INGESTION_DUTY_CYCLE", "0.5"))
+# Nice value of the worker thread, so chat requests win the CPU
+INGESTION_NICE = int(os.getenv("MSE_INGESTION_NICE", "10"))
+
+# Corpus watcher (index_data.py --watch): quiet period after a change before syncing,
+# and rescan interval when filesystem events are unavailable
+WATCH_DEBOUNCE_SECONDS = float(os.getenv("MSE_WATCH_DEBOUNCE_SECONDS", "1.0"))
+WATCH_POLL_SECONDS = float(os.getenv("MSE_WATCH_POLL_SECONDS", "2.0"))
+
+# Model tiers: lightweight steps run on the light model and escalate to the heavy one on a
+# parse failure or low confidence; MSE_LLM_ROUTING=0 runs every step on the heavy model
+LLM_ROUTING = os.getenv("MSE_LLM_ROUTING", "1") == "1"
+LLM_LIGHT_MODEL = os.getenv("MSE_LLM_LIGHT_MODEL", "llama-3.1-8b-instant")
+LLM_HEAVY_MODEL = os.getenv("MSE_LLM_HEAVY_MODEL", "llama-3.3-70b-versatile")
+LLM_CONVERSATIONAL_MODEL = os.getenv("MSE_LLM_CONVERSATIONAL_MODEL", "qwen-2.5-32b")
+LLM_ESCALATE_BELOW_CONFIDENCE = float(os.getenv("MSE_LLM_ESCALATE_BELOW_CONFIDENCE", "0.6"))
+
+# LLM backend: "groq", or "local" for a deterministic offline stand-in (load tests, benchmarks)
+# whose time-to-first-token (log-normal median and sigma) and token rate are configurable
+LLM_BACKEND = os.getenv("MSE_LLM_BACKEND", "groq")
+LOCAL_LLM_LATENCY_MS = float(os.getenv("MSE_LOCAL_LLM_LATENCY_MS", "300"))
+LOCAL_LLM_LATENCY_SIGMA = float(os.getenv("MSE_LOCAL_LLM_LATENCY_SIGMA", "0.5"))
+LOCAL_LLM_TOKENS_PER_SECOND = float(os.getenv("MSE_LOCAL_LLM_TOKENS_PER_SECOND", "250"))
+LOCAL_LLM_SEED = int(os.getenv("MSE_LOCAL_LLM_SEED", "0"))
+
+# Client-side rate limiting: requests are paced against each model's requests and tokens per
+# minute (Groq free tier by default; MSE_LLM_RATE_LIMITS takes a JSON object of the same shape),
+# interactive steps are served before long analyses, and a request that cannot start within
+# its priority's queueing deadline fails fast instead of waiting
+LLM_SCHEDULER = os.getenv("MSE_LLM_SCHEDULER", "1") == "1"
+LLM_RATE_LIMITS = json.loads(os.getenv("MSE_LLM_RATE_LIMITS", "null")) or {
+    "llama-3.1-8b-instant": {"rpm": 30, "tpm": 6000},
+    "llama-3.3-70b-versatile": {"rpm": 30, "tpm": 12000},
+    "qwen-2.5-32b": {"rpm": 30, "tpm": 6000},
+    "default": {"rpm": 30, "tpm": 6000},
+}
+LLM_QUEUE_DEADLINES = {
+    "interactive": float(os.getenv("MSE_LLM_INTERACTIVE_DEADLINE_SECONDS", "30")),
+    "analysis": float(os.getenv("MSE_LLM_ANALYSIS_DEADLINE_SECONDS", "90")),
+}
+# Attempts per request when the provider still rejects it (429) or fails transiently
+LLM_MAX_ATTEMPTS = int(os.getenv("MSE_LLM_MAX_ATTEMPTS", "3"))
+
+# Ask for the mode with the initial questions, and for the comprehensive query with the
+# sub-queries, in one structured LLM call each instead of two
+CONSOLIDATED_PROMPTS = os.getenv("MSE_CONSOLIDATED_PROMPTS", "1") == "1"
+
+# Rolling requirements summary: each answer is folded into a bounded running summary in the
+# background, and later prompts send the summary instead of every answer verbatim
+ROLLING_SUMMARY = os.getenv("MSE_ROLLING_SUMMARY", "1") == "1"
+REQUIREMENTS_SUMMARY_MAX_TOKENS = int(os.getenv("MSE_REQUIREMENTS_SUMMARY_MAX_TOKENS", "300"))
+
+# Tracing (spans are appended as OTLP/JSON lines)
+TRACING_ENABLED = os.getenv("MSE_TRACING", "1") == "1"
+TRACE_FILE = os.path.join(LOGS_DIR, "traces.jsonl")
+# Spans are buffered and written in batches of this size, or at least every TRACE_FLUSH_SECONDS
+TRACE_BATCH_SIZE = int(os.getenv("MSE_TRACE_BATCH_SIZE", "200"))
+TRACE_FLUSH_SECONDS = float(os.getenv("MSE_TRACE_FLUSH_SECONDS", "5"))
+# The trace file is rotated past this size, keeping TRACE_BACKUPS old files (traces.jsonl.1, ...)
+TRACE_MAX_MB = int(os.getenv("MSE_TRACE_MAX_MB", "100"))
+TRACE_BACKUPS = int(os.getenv("MSE_TRACE_BACKUPS", "3"))
+
+# Metrics (Prometheus text format, served locally and/or dumped for the textfile collector)
+METRICS_ENABLED = os.getenv("MSE_METRICS", "1") == "1"
+METRICS_PORT = int(os.getenv("MSE_METRICS_PORT", "9464"))
+METRICS_TEXTFILE = os.path.join(OUTPUT_DIR, "metrics", "mse_ai.prom")
 
 # Create directories if they don't exist
 for directory in [
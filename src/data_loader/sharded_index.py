@@ -0,0 +1,626 @@
+import os
+import re
+import sys
+import json
+import heapq
+import pickle
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain.schema import Document
+from langchain_community.vectorstores import FAISS
+from loguru import logger
+
+# Add the root project directory to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.data_loader import settings
+from src.data_loader.metadata_filter import MetadataTable, filtered_search_with_score, search_by_vector
+from src.data_loader.vector_compression import load_full_vectors, save_vector_store
+from src.monitoring.tracing import span
+from src.monitoring.metrics import INDEX_VECTORS, RETRIEVAL_SECONDS
+
+MANIFEST_FILE = "manifest.json"
+SHARDS_DIR = "shards"
+# Name given to an index saved before sharding (index.faiss at the top of the index directory)
+LEGACY_SHARD = "legacy"
+# Versioned layout: <index>/versions/<version>/ holds a manifest, <index>/CURRENT names the live version
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+
+_manifest_lock = threading.Lock()
+
+# Shared by every ShardedIndex; FAISS releases the GIL while searching, so shards run in parallel
+_search_pool = ThreadPoolExecutor(max_workers=settings.SHARD_SEARCH_WORKERS, thread_name_prefix="shard-search")
+
+
+def resolve_index_path(index_path: str) -> str:
+    """
+    Directory of the live version of an index.
+
+    Indexes published with versioning have a CURRENT file naming the live version; older
+    layouts are read in place.
+    """
+    current_file = os.path.join(index_path, CURRENT_FILE)
+    if os.path.exists(current_file):
+        with open(current_file, "r", encoding="utf-8") as f:
+            return os.path.join(index_path, VERSIONS_DIR, f.read().strip())
+    return index_path
+
+
+def shard_name_for(doc_name: str) -> str:
+    """Filesystem-safe shard name for a source document"""
+    name = re.sub(r"[^A-Za-z0-9._-]+", "_", doc_name).strip("._")
+    return name[:100] or "unnamed"
+
+
+def shard_name_for_source(document_path: str) -> str:
+    """
+    Shard name of a source file: its name plus a hash of its path (relative to the project
+    root when under it), so files with the same name in different folders get separate shards.
+    """
+    path = os.path.abspath(document_path)
+    key = os.path.relpath(path, settings.ROOT_DIR) if path.startswith(settings.ROOT_DIR + os.sep) else path
+    digest = hashlib.sha1(key.replace(os.sep, "/").encode("utf-8")).hexdigest()[:8]
+    return f"{shard_name_for(Path(path).stem)}-{digest}"
+
+
+def read_manifest(index_path: str) -> dict:
+    """
+    Read an index's shard manifest.
+
+    An index written before sharding (index.faiss directly in the index directory) is
+    described as a single shard, so it keeps working unchanged.
+
+    Args:
+        index_path (str): Index directory
+
+    Returns:
+        dict: Manifest with a "shards" mapping of shard name -> path, doc_names, vectors
+    """
+    manifest_path = os.path.join(index_path, MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    manifest = {"format": 1, "shards": {}}
+    if os.path.exists(os.path.join(index_path, "index.faiss")):
+        manifest["shards"][LEGACY_SHARD] = {"path": ".", "doc_names": None, "vectors": None}
+    return manifest
+
+
+def write_manifest(index_path: str, manifest: dict):
+    """Write the manifest atomically so readers never see a partial file"""
+    manifest_path = os.path.join(index_path, MANIFEST_FILE)
+    tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def shard_path(index_path: str, shard_name: str, manifest: dict = None) -> str:
+    """Directory of a shard, whether or not it exists yet"""
+    manifest = manifest or read_manifest(index_path)
+    entry = manifest["shards"].get(shard_name)
+    if entry is not None:
+        return os.path.normpath(os.path.join(index_path, entry["path"]))
+    return os.path.join(index_path, SHARDS_DIR, shard_name)
+
+
+def shard_paths(index_path: str) -> List[str]:
+    """Directories of every shard listed in the live version's manifest"""
+    index_path = resolve_index_path(index_path)
+    manifest = read_manifest(index_path)
+    return [shard_path(index_path, name, manifest) for name in manifest["shards"]]
+
+
+def index_exists(index_path: str) -> bool:
+    """Whether the index directory holds at least one shard"""
+    return any(os.path.exists(os.path.join(path, "index.faiss")) for path in shard_paths(index_path))
+
+
+def register_shard(index_path: str, shard_name: str, doc_name: str, vectors: int, path: str = None,
+                   index_type: str = None, sources: Dict[str, str] = None):
+    """
+    Record a written shard in the manifest.
+
+    Args:
+        index_path (str): Index (version) directory
+        shard_name (str): Shard that was written
+        doc_name (str): Document added to the shard
+        vectors (int): Vectors now in the shard
+        path (str, optional): Where the shard was written, if not its current manifest location
+        index_type (str, optional): Storage format the shard's embeddings were saved in
+        sources (dict, optional): Source file path -> content hash of everything now in the shard
+    """
+    with _manifest_lock:
+        manifest = read_manifest(index_path)
+        entry = manifest["shards"].setdefault(shard_name, {
+            "path": os.path.relpath(shard_path(index_path, shard_name, manifest), index_path),
+            "doc_names": [],
+            "vectors": 0,
+        })
+        if path is not None:
+            entry["path"] = os.path.relpath(path, index_path)
+        if entry["doc_names"] is not None and doc_name not in entry["doc_names"]:
+            entry["doc_names"].append(doc_name)
+        entry["vectors"] = vectors
+        if index_type is not None:
+            entry["index_type"] = index_type
+        if sources is not None:
+            entry["sources"] = sources
+        entry["updated"] = datetime.now().isoformat(timespec="seconds")
+        write_manifest(index_path, manifest)
+
+
+def remove_shard(index_path: str, shard_name: str):
+    """
+    Drop a shard from an unpublished version's manifest.
+
+    The shard's files are left alone: published versions may still reference them, and
+    pruning removes them once none does.
+    """
+    with _manifest_lock:
+        manifest = read_manifest(index_path)
+        if shard_name == LEGACY_SHARD:
+            raise ValueError("Documents in a pre-sharding index can't be removed individually; "
+                             "run 'python -m src.data_loader.sharded_index --split-legacy' first")
+        if manifest["shards"].pop(shard_name, None) is None:
+            logger.warning(f"No shard {shard_name} to remove from {index_path}")
+            return
+        write_manifest(index_path, manifest)
+
+
+def remove_source(index_path: str, source_path: str, embeddings, keep: str = None) -> int:
+    """
+    Drop one source file's chunks from an unpublished version's shards.
+
+    A shard holding only that file is dropped from the manifest. A shard that also holds
+    other files, or doesn't record its files (one keyed by document name before shards were
+    keyed by path), is rewritten into this version without the chunks whose source is the
+    file, reusing the stored vectors. Other files' chunks are never touched.
+
+    Args:
+        index_path (str): Index (version) directory
+        source_path (str): The source file
+        embeddings: Embeddings object handed to FAISS
+        keep (str, optional): Shard left alone (the one the file is being indexed into)
+
+    Returns:
+        int: Chunks removed
+    """
+    source_path = os.path.abspath(source_path)
+    doc_name = Path(source_path).stem
+    manifest = read_manifest(index_path)
+    candidates = [
+        name for name, entry in manifest["shards"].items()
+        if name not in (keep, LEGACY_SHARD) and (
+            source_path in (entry.get("sources") or {})
+            or (entry.get("sources") is None and doc_name in (entry.get("doc_names") or []))
+        )
+    ]
+
+    removed = 0
+    for name in candidates:
+        entry = manifest["shards"][name]
+        if set(entry.get("sources") or {}) == {source_path}:
+            remove_shard(index_path, name)
+            removed += entry.get("vectors") or 0
+            continue
+
+        path = shard_path(index_path, name, manifest)
+        vector_store = FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+        full_vectors = load_full_vectors(path)
+        vectors = (np.asarray(full_vectors, dtype=np.float32) if full_vectors is not None
+                   else vector_store.index.reconstruct_n(0, vector_store.index.ntotal))
+        kept = []
+        for faiss_id in range(vector_store.index.ntotal):
+            document = vector_store.docstore.search(vector_store.index_to_docstore_id[faiss_id])
+            if os.path.abspath(document.metadata.get("source", "")) != source_path:
+                kept.append((document, vectors[faiss_id]))
+        if len(kept) == vector_store.index.ntotal:
+            continue
+        removed += vector_store.index.ntotal - len(kept)
+        if not kept:
+            remove_shard(index_path, name)
+            continue
+
+        shard = FAISS.from_embeddings([(doc.page_content, vector.tolist()) for doc, vector in kept], embeddings,
+                                      metadatas=[doc.metadata for doc, _ in kept])
+        save_path = os.path.join(index_path, SHARDS_DIR, name)
+        saved_type = save_vector_store(shard, save_path, entry.get("index_type"))
+        from src.data_loader.property_index import build_from_vector_index
+        build_from_vector_index(save_path)
+        with _manifest_lock:
+            current = read_manifest(index_path)
+            updated = current["shards"][name]
+            updated["path"] = os.path.relpath(save_path, index_path)
+            updated["vectors"] = len(kept)
+            updated["index_type"] = saved_type
+            updated["doc_names"] = sorted({doc.metadata.get("doc_name", "") for doc, _ in kept})
+            if updated.get("sources") is not None:
+                updated["sources"].pop(source_path, None)
+            updated["updated"] = datetime.now().isoformat(timespec="seconds")
+            write_manifest(index_path, current)
+        logger.info(f"Removed {source_path} from shard {name}; {len(kept)} vectors of other files kept")
+    return removed
+
+
+def indexed_sources(index_path: str) -> Dict[str, str]:
+    """Source file path -> content hash for every file recorded in the live version's shards"""
+    sources = {}
+    for entry in read_manifest(resolve_index_path(index_path))["shards"].values():
+        sources.update(entry.get("sources") or {})
+    return sources
+
+
+def indexed_doc_names(index_path: str) -> set:
+    """
+    Names of every document in the live version, including shards without a source record.
+
+    Shards whose manifest entry doesn't list its documents (a pre-sharding index) are read
+    from their docstore.
+    """
+    version_path = resolve_index_path(index_path)
+    manifest = read_manifest(version_path)
+    doc_names = set()
+    for name, entry in manifest["shards"].items():
+        if entry.get("doc_names") is not None:
+            doc_names.update(entry["doc_names"])
+            continue
+        with open(os.path.join(shard_path(version_path, name, manifest), "index.pkl"), "rb") as f:
+            docstore, _ = pickle.load(f)
+        doc_names.update(document.metadata.get("doc_name", "") for document in docstore._dict.values())
+    return doc_names
+
+
+def estimate_memory_bytes(vector_store) -> int:
+    """Approximate memory held by a loaded FAISS vector store: its vector codes plus chunk text"""
+    index = vector_store.index
+    try:
+        code_size = index.sa_code_size()
+    except Exception:
+        code_size = index.d * 4
+    text_bytes = sum(len(doc.page_content) for doc in getattr(vector_store.docstore, "_dict", {}).values())
+    return index.ntotal * code_size + text_bytes
+
+
+class _Shard:
+    """A lazily loaded shard; reloaded when its index.faiss changes"""
+
+    def __init__(self, name: str, path: str, doc_names: Optional[List[str]]):
+        self.name = name
+        self.path = path
+        self.doc_names = doc_names
+        self.vector_store = None
+        self.metadata_table = None
+        # Memory-mapped float32 vectors of a compressed shard, for exact re-scoring
+        self.full_vectors = None
+        self.mtime = None
+        # Estimated resident size of the loaded vector store (codes and chunk text)
+        self.memory_bytes = 0
+        # (vector store, docstore id -> FAISS id), built on the first stored vector lookup
+        self._faiss_ids = None
+        self._lock = threading.Lock()
+
+    def load(self, embeddings):
+        mtime = os.path.getmtime(os.path.join(self.path, "index.faiss"))
+        if self.vector_store is not None and self.mtime == mtime:
+            return self.vector_store
+        with self._lock:
+            if self.vector_store is None or self.mtime != mtime:
+                logger.info(f"Loading shard {self.name} from {self.path}")
+                with span("index_load", index_path=self.path, shard=self.name) as load_span:
+                    vector_store = FAISS.load_local(self.path, embeddings, allow_dangerous_deserialization=True)
+                RETRIEVAL_SECONDS.observe(load_span.duration_ms / 1000, stage="index_load")
+                self.full_vectors = load_full_vectors(self.path) if settings.INDEX_RESCORE else None
+                self.memory_bytes = estimate_memory_bytes(vector_store)
+                self.vector_store, self.metadata_table, self.mtime = vector_store, None, mtime
+        return self.vector_store
+
+    def unload(self):
+        """Drop the loaded vector store; the next search loads it again"""
+        with self._lock:
+            self.vector_store, self.metadata_table, self.full_vectors = None, None, None
+            self.mtime, self.memory_bytes = None, 0
+
+    def stored_vectors(self, docstore_ids: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Stored embeddings of this shard's chunks, by docstore id.
+
+        Read from the full-precision copy when the shard has one, otherwise reconstructed
+        from the index. Nothing is returned while the shard is unloaded.
+        """
+        vector_store, full_vectors = self.vector_store, self.full_vectors
+        if vector_store is None:
+            return {}
+        if self._faiss_ids is None or self._faiss_ids[0] is not vector_store:
+            self._faiss_ids = (vector_store, {docstore_id: faiss_id for faiss_id, docstore_id
+                                              in vector_store.index_to_docstore_id.items()})
+        found = {docstore_id: self._faiss_ids[1][docstore_id] for docstore_id in docstore_ids
+                 if docstore_id in self._faiss_ids[1]}
+        if not found:
+            return {}
+        ids = np.fromiter(found.values(), dtype=np.int64, count=len(found))
+        if full_vectors is not None:
+            vectors = np.asarray(full_vectors[ids], dtype=np.float32)
+        else:
+            vectors = vector_store.index.reconstruct_batch(ids)
+        return dict(zip(found, vectors))
+
+    def table(self) -> MetadataTable:
+        if self.metadata_table is None:
+            self.metadata_table = MetadataTable(self.vector_store)
+        return self.metadata_table
+
+    def may_contain(self, filters: Dict) -> bool:
+        """Whether the shard can hold chunks matching a doc_name filter (unknown contents always can)"""
+        wanted = filters.get("doc_name")
+        if not wanted or self.doc_names is None:
+            return True
+        wanted = [wanted] if isinstance(wanted, str) else list(wanted)
+        return any(name in self.doc_names for name in wanted)
+
+
+# Loaded shards by directory, shared by every version that references them so switching
+# versions only loads the shards that changed
+_loaded_shards: Dict[str, _Shard] = {}
+
+
+class ShardedIndex:
+    """
+    Reader for an index split into per-document shards.
+
+    Shards are loaded on first use, searched in parallel and their top-k results merged by
+    distance. Shards that a doc_name filter rules out are never loaded. The live version is
+    re-resolved on every search, so a newly published version is picked up without a restart.
+    """
+
+    def __init__(self, index_path: str):
+        """
+        Args:
+            index_path (str): Index directory (versioned, holding manifest.json, or a pre-sharding index)
+        """
+        self.index_path = index_path
+        self.version_path = None
+        self.shards: Dict[str, _Shard] = {}
+        self._manifest_mtime = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Pick up a newly published version, or shards added or removed since the manifest was last read"""
+        version_path = resolve_index_path(self.index_path)
+        manifest_path = os.path.join(version_path, MANIFEST_FILE)
+        mtime = os.path.getmtime(manifest_path) if os.path.exists(manifest_path) else None
+        if self.shards and version_path == self.version_path and mtime == self._manifest_mtime:
+            return
+        with self._lock:
+            manifest = read_manifest(version_path)
+            shards = {}
+            for name, entry in manifest["shards"].items():
+                path = os.path.abspath(shard_path(version_path, name, manifest))
+                shard = _loaded_shards.get(path)
+                if shard is None:
+                    shard = _loaded_shards[path] = _Shard(name, path, entry.get("doc_names"))
+                shard.doc_names = entry.get("doc_names")
+                shards[name] = shard
+            if self.version_path is not None and version_path != self.version_path:
+                logger.info(f"Switched {self.index_path} to version {os.path.basename(version_path)}")
+                # Forget shards no version of this index references any more
+                for path in set(shard.path for shard in self.shards.values()) - set(s.path for s in shards.values()):
+                    _loaded_shards.pop(path, None)
+            self.shards = shards
+            self.version_path = version_path
+            self._manifest_mtime = mtime
+
+    @property
+    def loaded_vectors(self) -> int:
+        return sum(shard.vector_store.index.ntotal for shard in self.shards.values() if shard.vector_store is not None)
+
+    @property
+    def memory_bytes(self) -> int:
+        """Estimated memory held by the loaded shards"""
+        return sum(shard.memory_bytes for shard in self.shards.values() if shard.vector_store is not None)
+
+    def unload(self) -> int:
+        """
+        Unload every shard of this index (they are loaded again on the next search).
+
+        Returns:
+            int: Estimated bytes released
+        """
+        released = self.memory_bytes
+        for shard in list(self.shards.values()):
+            shard.unload()
+        INDEX_VECTORS.set(0, index=os.path.basename(self.index_path))
+        return released
+
+    def search(self, embeddings, query_vector: List[float], k: int, filters: Dict = None) -> List[Tuple[Document, float]]:
+        """
+        Scatter a query across the shards and gather the overall top k.
+
+        Args:
+            embeddings: Embeddings object handed to FAISS.load_local
+            query_vector (List[float]): Embedded query
+            k (int): Number of results
+            filters (dict, optional): Metadata filters (see MetadataTable.mask)
+
+        Returns:
+            List[Tuple[Document, float]]: Chunks and their distances, best first
+        """
+        return search_indexes([self], embeddings, query_vector, k, filters)
+
+    def stored_vectors(self, documents: List[Document]) -> Dict[str, np.ndarray]:
+        """
+        Stored embeddings of retrieved chunks, so callers can reuse them instead of re-embedding.
+
+        Args:
+            documents (List[Document]): Chunks returned by a search of this index
+
+        Returns:
+            Dict[str, np.ndarray]: Docstore id -> embedding, for the chunks of loaded shards
+        """
+        docstore_ids = [document.id for document in documents if getattr(document, "id", None)]
+        vectors = {}
+        for shard in list(self.shards.values()):
+            if len(vectors) == len(docstore_ids):
+                break
+            vectors.update(shard.stored_vectors([i for i in docstore_ids if i not in vectors]))
+        return vectors
+
+    def warm(self, embeddings) -> int:
+        """
+        Load every shard, build its metadata table and page in its memory-mapped vectors.
+
+        A search only reads the full-precision vectors of the candidates it re-scores, so
+        without this the first queries after startup fault in their pages one by one.
+
+        Args:
+            embeddings: Embeddings object handed to FAISS.load_local
+
+        Returns:
+            int: Bytes of memory-mapped vectors read
+        """
+        self.refresh()
+        touched = 0
+        for shard in list(self.shards.values()):
+            shard.load(embeddings)
+            shard.table()
+            if shard.full_vectors is not None:
+                # One read per 4 KiB page is enough to fault the whole file in
+                flat = shard.full_vectors.reshape(-1)
+                flat[::max(1, 4096 // flat.itemsize)].sum()
+                touched += flat.nbytes
+        INDEX_VECTORS.set(self.loaded_vectors, index=os.path.basename(self.index_path))
+        return touched
+
+
+def search_indexes(indexes: List[ShardedIndex], embeddings, query_vector: List[float], k: int,
+                   filters: Dict = None) -> List[Tuple[Document, float]]:
+    """
+    Scatter a query across the shards of one or more indexes and gather the overall top k.
+
+    The shards of every index go into one scatter on the shared pool, so searching several
+    corpora costs one round of parallel shard searches rather than one per corpus.
+
+    Args:
+        indexes (List[ShardedIndex]): Indexes to search
+        embeddings: Embeddings object handed to FAISS.load_local
+        query_vector (List[float]): Embedded query
+        k (int): Number of results
+        filters (dict, optional): Metadata filters (see MetadataTable.mask)
+
+    Returns:
+        List[Tuple[Document, float]]: Chunks and their distances, best first
+    """
+    filters = filters or {}
+    shards = []
+    for index in indexes:
+        index.refresh()
+        shards += [shard for shard in index.shards.values() if shard.may_contain(filters)]
+    if not shards:
+        return []
+
+    def search_shard(shard: _Shard) -> List[Tuple[Document, float]]:
+        vector_store = shard.load(embeddings)
+        if filters:
+            return filtered_search_with_score(vector_store, shard.table(), query_vector, k, filters, shard.full_vectors)
+        if shard.full_vectors is not None:
+            return search_by_vector(vector_store, query_vector, k, full_vectors=shard.full_vectors)
+        return vector_store.similarity_search_with_score_by_vector(query_vector, k=k)
+
+    if len(shards) == 1:
+        results = search_shard(shards[0])
+    else:
+        results = [hit for hits in _search_pool.map(search_shard, shards) for hit in hits]
+    for index in indexes:
+        INDEX_VECTORS.set(index.loaded_vectors, index=os.path.basename(index.index_path))
+
+    # Every shard uses the same metric (L2 distance), so lower is better across shards and corpora
+    return heapq.nsmallest(k, results, key=lambda hit: hit[1])
+
+
+def split_legacy_index(index_path: str, embeddings) -> List[str]:
+    """
+    Split a pre-sharding index into one shard per document, without re-embedding.
+
+    Args:
+        index_path (str): Index directory holding index.faiss/index.pkl at the top level
+        embeddings: Embeddings object handed to FAISS
+
+    Returns:
+        List[str]: Names of the shards written
+    """
+    if os.path.exists(os.path.join(index_path, CURRENT_FILE)):
+        raise ValueError(f"{index_path} is versioned; rebuild it with 'python index_data.py --rebuild' instead")
+    if not os.path.exists(os.path.join(index_path, "index.faiss")):
+        raise ValueError(f"No pre-sharding index found at {index_path}")
+    vector_store = FAISS.load_local(index_path, embeddings, allow_dangerous_deserialization=True)
+    vectors = vector_store.index.reconstruct_n(0, vector_store.index.ntotal)
+
+    by_document: Dict[str, List[int]] = {}
+    for faiss_id, docstore_id in vector_store.index_to_docstore_id.items():
+        doc_name = vector_store.docstore.search(docstore_id).metadata.get("doc_name", "")
+        by_document.setdefault(doc_name, []).append(faiss_id)
+
+    # Shards added since the index was last rebuilt are kept as they are
+    manifest = read_manifest(index_path)
+    manifest["shards"].pop(LEGACY_SHARD, None)
+    by_document_shards = []
+    for doc_name, faiss_ids in by_document.items():
+        name = shard_name_for(doc_name)
+        if name in manifest["shards"]:
+            name = f"{name}_legacy"
+        documents = [vector_store.docstore.search(vector_store.index_to_docstore_id[i]) for i in faiss_ids]
+        shard = FAISS.from_embeddings(
+            [(doc.page_content, vectors[i].tolist()) for doc, i in zip(documents, faiss_ids)],
+            embeddings,
+            metadatas=[doc.metadata for doc in documents]
+        )
+        path = os.path.join(index_path, SHARDS_DIR, name)
+        shard.save_local(path)
+        by_document_shards.append(name)
+        manifest["shards"][name] = {
+            "path": os.path.relpath(path, index_path),
+            "doc_names": [doc_name],
+            "vectors": len(faiss_ids),
+            "updated": datetime.now().isoformat(timespec="seconds"),
+        }
+        logger.info(f"Wrote shard {name} with {len(faiss_ids)} vectors")
+
+    # Property stores are per shard too; rebuild them from each shard's chunks
+    from src.data_loader.property_index import PROPERTY_INDEX_FILE, build_from_vector_index
+    for name in by_document_shards:
+        build_from_vector_index(os.path.join(index_path, manifest["shards"][name]["path"]))
+
+    # The manifest switches readers to the shards; only then is the old index removed
+    write_manifest(index_path, manifest)
+    for file_name in ("index.faiss", "index.pkl", PROPERTY_INDEX_FILE):
+        if os.path.exists(os.path.join(index_path, file_name)):
+            os.remove(os.path.join(index_path, file_name))
+    logger.success(f"Split {index_path} into {len(by_document_shards)} shards")
+    return by_document_shards
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect or migrate a sharded index.')
+    parser.add_argument('--index', default=os.path.join(settings.DOC_INDEXES_DIR, settings.DEFAULT_CORPUS), help='Index directory')
+    parser.add_argument('--split-legacy', action='store_true', help='Split a pre-sharding index into per-document shards')
+    args = parser.parse_args()
+
+    if args.split_legacy:
+        from src.data_loader.query_embeddings import get_embeddings
+        split_legacy_index(args.index, get_embeddings())
+
+    for name, entry in read_manifest(resolve_index_path(args.index))["shards"].items():
+        print(f"{name:<40} {entry.get('vectors')!s:>8} vectors  {entry.get('index_type', 'flat'):<5} {entry['path']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import re
+from typing import List, Optional
+
+import pdfplumber
+from langchain.schema import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from loguru import logger
+
+# Lines such as "Table 4.2 Properties of ..." or "Fig. 3.1 ..."
+CAPTION_PATTERN = re.compile(r"^\s*(table|fig\.?|figure|chart)\s+[A-Z]?\d+(\.\d+)*[a-z]?\b", re.IGNORECASE)
+# "Chapter 5", "5.3 Material indices", "5.3.1 Minimum weight design"
+HEADING_PATTERN = re.compile(r"^\s*(chapter\s+\d+\b.*|\d+(\.\d+){0,3}\.?\s+[A-Z][^.]{2,80})$", re.IGNORECASE)
+NUMBER_PATTERN = re.compile(r"[-+]?\d+(?:[.,]\d+)?(?:\s*[-–]\s*\d+(?:[.,]\d+)?)?")
+COLUMN_GAP_PATTERN = re.compile(r"\S(?:\s{2,}|\t+|\s*\|\s*)\S")
+
+
+def is_caption(line: str) -> bool:
+    return bool(CAPTION_PATTERN.match(line))
+
+
+def is_heading(line: str) -> bool:
+    stripped = line.strip()
+    if not stripped or len(stripped) > 90 or is_caption(stripped):
+        return False
+    if HEADING_PATTERN.match(stripped) and not stripped.endswith((".", ",", ";")):
+        # "5.3 Material indices" is a heading, "2.5 MPa at 20 °C" is data
+        return len(NUMBER_PATTERN.findall(stripped)) <= 2
+    # Short all-caps lines ("MECHANICAL PROPERTIES")
+    letters = [c for c in stripped if c.isalpha()]
+    return len(letters) >= 4 and all(c.isupper() for c in letters) and len(stripped.split()) <= 8
+
+
+def is_table_row(line: str) -> bool:
+    """
+    Whether a line looks like a row of a property table.
+
+    PDF text extraction flattens tables into lines where cells are separated by runs of
+    spaces or pipes, and most cells are numbers (values, ranges, units).
+    """
+    stripped = line.strip()
+    if not stripped or is_caption(stripped):
+        return False
+    numbers = NUMBER_PATTERN.findall(stripped)
+    words = stripped.split()
+    if len(COLUMN_GAP_PATTERN.findall(stripped)) >= 2 and numbers:
+        return True
+    # Rows whose columns were collapsed to single spaces: mostly numeric tokens
+    return len(numbers) >= 3 and len(numbers) >= 0.4 * len(words)
+
+
+def format_table(rows: List[List[Optional[str]]]) -> str:
+    """Render rows from pdfplumber's table extraction as pipe-separated lines"""
+    lines = []
+    for row in rows:
+        cells = [" ".join((cell or "").split()) for cell in row]
+        if any(cells):
+            lines.append(" | ".join(cells))
+    return "\n".join(lines)
+
+
+class StructureAwareChunker:
+    """
+    Splits extracted pages into chunks along the document's structure.
+
+    Property tables are kept whole (with their caption) as a single chunk, prose is split
+    within the section it belongs to, and every chunk records its section heading and
+    `chunk_type` ("table" or "text") in its metadata. Sections carry over from one page to
+    the next, so a chunker instance should be used for one document's pages in order.
+    """
+
+    def __init__(self,
+                 chunk_size: int = 2000,
+                 chunk_overlap: int = 150,
+                 max_table_chars: int = 4000,
+                 min_table_rows: int = 3,
+                 use_pdfplumber_tables: bool = False):
+        """
+        Args:
+            chunk_size (int): Maximum characters in a prose chunk
+            chunk_overlap (int): Overlap between consecutive prose chunks
+            max_table_chars (int): Tables longer than this are split by rows, repeating the caption and header
+            min_table_rows (int): Consecutive table-like lines needed to treat them as a table
+            use_pdfplumber_tables (bool): Use pdfplumber's table extraction for PDF pages
+        """
+        self.max_table_chars = max_table_chars
+        self.min_table_rows = min_table_rows
+        self.use_pdfplumber_tables = use_pdfplumber_tables
+        self.text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=len,
+            separators=["\n\n", "\n", ". ", " ", ""]
+        )
+        self.section = ""
+        self._pdf = None
+        self._pdf_path = None
+
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        """
+        Split a batch of pages (in page order) into structure-aware chunks.
+
+        Args:
+            documents (List[Document]): Extracted pages
+
+        Returns:
+            List[Document]: Table and prose chunks
+        """
+        chunks = []
+        for document in documents:
+            chunks.extend(self._split_page(document))
+        return chunks
+
+    def _split_page(self, document: Document) -> List[Document]:
+        blocks = self._detect_blocks(document.page_content)
+
+        pdf_tables = self._pdf_tables(document) if self.use_pdfplumber_tables else []
+        if pdf_tables:
+            # pdfplumber's cell grid is more reliable than the text heuristics, so its
+            # tables replace the detected ones and take over their captions in order
+            captions = [block["caption"] for block in blocks if block["type"] == "table" and block["caption"]]
+            blocks = [block for block in blocks if block["type"] != "table"]
+            for position, rows in enumerate(pdf_tables):
+                blocks.append({
+                    "type": "table",
+                    "section": self.section,
+                    "caption": captions[position] if position < len(captions) else "",
+                    "lines": format_table(rows).splitlines(),
+                })
+
+        chunks = []
+        for block in blocks:
+            metadata = dict(document.metadata)
+            metadata["section"] = block["section"]
+            if block["type"] == "table":
+                metadata["chunk_type"] = "table"
+                if block["caption"]:
+                    metadata["caption"] = block["caption"]
+                chunks.extend(self._table_chunks(block, metadata))
+            else:
+                metadata["chunk_type"] = "text"
+                text = "\n".join(block["lines"]).strip()
+                if text:
+                    chunks.extend(self.text_splitter.split_documents([Document(page_content=text, metadata=metadata)]))
+        return chunks
+
+    def _detect_blocks(self, text: str) -> List[dict]:
+        """Group a page's lines into prose and table blocks, tracking headings and captions"""
+        blocks = []
+        prose: List[str] = []
+        table: List[str] = []
+        caption = ""
+
+        def flush_prose():
+            if prose:
+                blocks.append({"type": "text", "section": self.section, "caption": "", "lines": list(prose)})
+                prose.clear()
+
+        def flush_table():
+            nonlocal caption
+            if len(table) >= self.min_table_rows:
+                flush_prose()
+                blocks.append({"type": "table", "section": self.section, "caption": caption, "lines": list(table)})
+                caption = ""
+            else:
+                # Too short to be a table, keep it with the prose
+                prose.extend(table)
+            table.clear()
+
+        lines = text.splitlines()
+        for position, line in enumerate(lines):
+            if not line.strip():
+                continue
+            if is_caption(line):
+                flush_table()
+                if caption:
+                    # A caption without a table (e.g. a figure) stays in the prose
+                    prose.append(caption)
+                caption = line.strip()
+                continue
+            # A heading-looking line directly above table rows is usually the column header
+            next_is_row = position + 1 < len(lines) and is_table_row(lines[position + 1])
+            if is_table_row(line) or (table and not is_heading(line) and next_is_row) or (caption and next_is_row):
+                table.append(line.strip())
+                continue
+            flush_table()
+            if is_heading(line):
+                # Consecutive headings ("Chapter 5" then "5.1 ...") stay together with the prose below them
+                if any(not is_heading(previous) for previous in prose):
+                    flush_prose()
+                self.section = line.strip()
+            if caption:
+                prose.append(caption)
+                caption = ""
+            prose.append(line.strip())
+
+        flush_table()
+        if caption:
+            prose.append(caption)
+        flush_prose()
+        return blocks
+
+    def _table_chunks(self, block: dict, metadata: dict) -> List[Document]:
+        """Emit a table as one chunk, or as row groups that each repeat the caption and header"""
+        prefix = [line for line in (block["section"], block["caption"]) if line]
+        text = "\n".join(prefix + block["lines"])
+        if len(text) <= self.max_table_chars:
+            return [Document(page_content=text, metadata=metadata)]
+
+        header, rows = block["lines"][0], block["lines"][1:]
+        base = prefix + [header]
+        base_chars = sum(len(line) + 1 for line in base)
+        chunks, current = [], []
+        for row in rows:
+            if current and base_chars + sum(len(r) + 1 for r in current) + len(row) > self.max_table_chars:
+                chunks.append(Document(page_content="\n".join(base + current), metadata=dict(metadata)))
+                current = []
+            current.append(row)
+        if current:
+            chunks.append(Document(page_content="\n".join(base + current), metadata=dict(metadata)))
+        return chunks
+
+    def _pdf_tables(self, document: Document) -> List[List[List[Optional[str]]]]:
+        """Extract a PDF page's tables with pdfplumber, or an empty list for non-PDF pages"""
+        source = document.metadata.get("source", "")
+        page_number = document.metadata.get("page")
+        if not source.lower().endswith(".pdf") or page_number is None:
+            return []
+        try:
+            if self._pdf_path != source:
+                self.close()
+                self._pdf = pdfplumber.open(source)
+                self._pdf_path = source
+            if page_number >= len(self._pdf.pages):
+                return []
+            page = self._pdf.pages[page_number]
+            tables = [table for table in page.extract_tables() if len(table) >= 2]
+            page.close()
+            return tables
+        except Exception as e:
+            logger.error(f"pdfplumber table extraction failed on page {page_number} of {source}: {str(e)}")
+            return []
+
+    def close(self):
+        if self._pdf is not None:
+            self._pdf.close()
+            self._pdf = None
+            self._pdf_path = None
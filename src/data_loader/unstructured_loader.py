@@ -5,6 +5,7 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from loguru import logger
 from src.data_loader.doc_indexer import create_and_save_document_index
+from src.data_loader.index_versions import new_version
 from src.data_loader import settings
 
 class DataIndexer:
@@ -50,10 +51,11 @@ class DataIndexer:
                             files.append(file_path)
         return files
 
-    def process_file(self, file_path: str) -> Optional[str]:
-        """Index a single file and return the index path"""
+    def process_file(self, file_path: str, version_path: str = None) -> Optional[str]:
+        """Index a single file (into an unpublished index version, if given) and return the index path"""
         try:
-            index_path = create_and_save_document_index(embeddings=self.embeddings, document_path=file_path)
+            index_path = create_and_save_document_index(embeddings=self.embeddings, document_path=file_path,
+                                                         index_path=version_path)
             logger.success(f"Indexed {file_path} → {index_path}")
             return index_path
         except Exception as e:
@@ -69,8 +71,10 @@ class DataIndexer:
 
         logger.info(f"Indexing {len(files)} files with {self.max_workers} workers")
 
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            futures = {executor.submit(self.process_file, f): f for f in files}
+        # All files go into one new index version, published once they are done
+        index_root = os.path.join(settings.DOC_INDEXES_DIR, settings.DEFAULT_CORPUS)
+        with new_version(index_root) as version_path, ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.process_file, f, version_path): f for f in files}
             
             for future in as_completed(futures):
                 file_path = futures[future]
@@ -0,0 +1,209 @@
+import os
+import sys
+import shutil
+import argparse
+from typing import Optional
+
+import faiss
+import numpy as np
+from loguru import logger
+
+# Add the root project directory to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from src.data_loader import settings
+
+# Storage formats for a shard's embeddings; bytes per 384-dim vector in brackets
+#   flat: float32 (1536)   fp16: float16 (768)   sq8: 8-bit scalar quantizer (384)   pq: product quantizer (48)
+INDEX_TYPES = ("flat", "fp16", "sq8", "pq")
+# Full-precision copy of a compressed shard's vectors (row i = FAISS id i), memory-mapped for re-scoring
+FULL_VECTORS_FILE = "vectors.npy"
+# Sub-quantizers for "pq": 8 dimensions per 1-byte code for 384-dim embeddings
+PQ_SUBQUANTIZERS = 48
+# PQ trains 256 centroids per sub-quantizer; smaller shards fall back to sq8
+PQ_MIN_TRAINING_VECTORS = 256
+
+
+def index_type_of(index: faiss.Index) -> str:
+    """Storage format of a FAISS index (one of INDEX_TYPES)"""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexPQ):
+        return "pq"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return "fp16" if index.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    return "flat"
+
+
+def supports_selector(index: faiss.Index) -> bool:
+    """Whether the index accepts an IDSelector in its search parameters (IndexPQ does not)"""
+    return index_type_of(index) != "pq"
+
+
+def build_index(vectors: np.ndarray, index_type: str) -> faiss.Index:
+    """
+    Build an L2 index of the given storage format over vectors, in id order.
+
+    Args:
+        vectors (np.ndarray): float32 array of shape (n, d)
+        index_type (str): One of INDEX_TYPES
+
+    Returns:
+        faiss.Index: Trained index holding the vectors
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type: {index_type} (expected one of {', '.join(INDEX_TYPES)})")
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    dimension = vectors.shape[1]
+
+    if index_type == "pq" and len(vectors) < PQ_MIN_TRAINING_VECTORS:
+        logger.warning(f"Only {len(vectors)} vectors, too few to train a product quantizer; using sq8")
+        index_type = "sq8"
+
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dimension)
+    elif index_type == "fp16":
+        index = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_L2)
+    elif index_type == "sq8":
+        index = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+    else:
+        subquantizers = max(m for m in range(1, PQ_SUBQUANTIZERS + 1) if dimension % m == 0)
+        index = faiss.IndexPQ(dimension, subquantizers, 8, faiss.METRIC_L2)
+
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def load_full_vectors(path: str) -> Optional[np.ndarray]:
+    """Memory-map a shard's full-precision vectors, or None if the shard is stored as float32"""
+    vectors_path = os.path.join(path, FULL_VECTORS_FILE)
+    if not os.path.exists(vectors_path):
+        return None
+    return np.load(vectors_path, mmap_mode="r")
+
+
+def to_flat_index(index: faiss.Index, full_vectors: np.ndarray = None) -> faiss.Index:
+    """
+    Convert a loaded index back to float32 so vectors can be added to it.
+
+    The full-precision copy is used when there is one; otherwise the vectors are decoded
+    from the compressed codes, which loses what the compression lost.
+    """
+    if index_type_of(index) == "flat":
+        return index
+    if full_vectors is not None and len(full_vectors) == index.ntotal:
+        vectors = np.asarray(full_vectors, dtype=np.float32)
+    else:
+        logger.warning("No full-precision vectors for a compressed shard; decoding its codes instead")
+        vectors = index.reconstruct_n(0, index.ntotal)
+    return build_index(vectors, "flat")
+
+
+def save_vector_store(vector_store, path: str, index_type: str = None, full_precision: bool = None) -> str:
+    """
+    Save a LangChain FAISS store with its embeddings in the given storage format.
+
+    Args:
+        vector_store: LangChain FAISS store whose index holds float32 vectors
+        path (str): Shard directory
+        index_type (str, optional): One of INDEX_TYPES (defaults to settings.INDEX_TYPE)
+        full_precision (bool, optional): Also write the float32 vectors for re-scoring and later
+                                         re-indexing (defaults to settings.INDEX_FULL_PRECISION)
+
+    Returns:
+        str: The storage format actually used
+    """
+    index_type = index_type or settings.INDEX_TYPE
+    if full_precision is None:
+        full_precision = settings.INDEX_FULL_PRECISION
+    os.makedirs(path, exist_ok=True)
+    vectors_path = os.path.join(path, FULL_VECTORS_FILE)
+
+    flat_index = vector_store.index
+    if index_type != "flat":
+        vectors = flat_index.reconstruct_n(0, flat_index.ntotal)
+        vector_store.index = build_index(vectors, index_type)
+        if full_precision:
+            # Written under a temporary name first so a reader never maps a partial file
+            tmp_path = f"{vectors_path}.{os.getpid()}.tmp.npy"
+            np.save(tmp_path, vectors)
+            os.replace(tmp_path, vectors_path)
+    if (index_type == "flat" or not full_precision) and os.path.exists(vectors_path):
+        os.remove(vectors_path)
+
+    try:
+        vector_store.save_local(path)
+    finally:
+        saved_type = index_type_of(vector_store.index)
+        vector_store.index = flat_index
+    return saved_type
+
+
+def rescore(full_vectors: np.ndarray, query: np.ndarray, ids: np.ndarray, k: int):
+    """
+    Re-rank candidate ids by exact L2 distance against the full-precision vectors.
+
+    Returns:
+        tuple: (ids, squared distances) of the best k candidates, best first
+    """
+    if not len(ids):
+        return ids, np.empty(0, dtype=np.float32)
+    # Sorted ids read the memory-mapped file front to back
+    ids = np.sort(ids)
+    distances = ((np.asarray(full_vectors[ids], dtype=np.float32) - query) ** 2).sum(axis=1)
+    order = np.argsort(distances)[:k]
+    return ids[order], distances[order]
+
+
+def convert_index(index_root: str, index_type: str, embeddings) -> str:
+    """
+    Re-encode every shard of the live index in another storage format, without re-embedding.
+
+    The converted shards are published as a new index version.
+
+    Args:
+        index_root (str): Index directory
+        index_type (str): One of INDEX_TYPES
+        embeddings: Embeddings object handed to FAISS.load_local
+
+    Returns:
+        str: Path of the new version (not published if every shard already had that format)
+    """
+    from langchain_community.vectorstores import FAISS
+    from src.data_loader.index_versions import new_version
+    from src.data_loader.property_index import PROPERTY_INDEX_FILE
+    from src.data_loader.sharded_index import SHARDS_DIR, read_manifest, register_shard, shard_path
+
+    with new_version(index_root) as version_path:
+        manifest = read_manifest(version_path)
+        for name, entry in manifest["shards"].items():
+            source = shard_path(version_path, name, manifest)
+            vector_store = FAISS.load_local(source, embeddings, allow_dangerous_deserialization=True)
+            if index_type_of(vector_store.index) == index_type:
+                continue
+            vector_store.index = to_flat_index(vector_store.index, load_full_vectors(source))
+            target = os.path.join(version_path, SHARDS_DIR, name)
+            saved_type = save_vector_store(vector_store, target, index_type)
+            if os.path.exists(os.path.join(source, PROPERTY_INDEX_FILE)):
+                shutil.copyfile(os.path.join(source, PROPERTY_INDEX_FILE), os.path.join(target, PROPERTY_INDEX_FILE))
+            doc_name = (entry.get("doc_names") or [""])[0]
+            register_shard(version_path, name, doc_name, vector_store.index.ntotal, path=target, index_type=saved_type)
+            logger.info(f"Converted shard {name} to {saved_type}")
+    return version_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert the storage format of an index\'s embeddings.')
+    parser.add_argument('--index', default=os.path.join(settings.DOC_INDEXES_DIR, settings.DEFAULT_CORPUS), help='Index directory')
+    parser.add_argument('--convert', choices=INDEX_TYPES, required=True, help='Storage format to convert every shard to')
+    args = parser.parse_args()
+
+    from src.data_loader.query_embeddings import get_embeddings
+    version_path = convert_index(args.index, args.convert, get_embeddings())
+    logger.success(f"Published {os.path.basename(version_path)} with {args.convert} shards")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+import os
+import sys
+import bisect
+import logging
+import threading
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+# Add the root project directory to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from loguru import logger
+from src.data_loader import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Model of the LLM call currently in flight, used to attribute provider-side retries
+current_llm_model: ContextVar[str] = ContextVar("current_llm_model", default="unknown")
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: Dict[str, str] = None) -> str:
+    pairs = list(zip(labelnames, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    escaped = [(k, str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')) for k, v in pairs]
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+class _Metric:
+    """Base class for labelled metrics"""
+
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric {self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    metric_type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+
+    metric_type = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets"""
+
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], dict] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return series["count"] if series else 0
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, series["counts"]):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labelnames, key, {"le": repr(bound)})
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key, {"le": "+Inf"})
+                lines.append(f"{self.name}_bucket{labels} {series['count']}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series['sum']}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Process-wide collection of metrics rendered in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames=(), **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, documentation, tuple(labelnames), **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as {metric.metric_type}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames=()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        """Render every registered metric in the Prometheus text format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# LLM layer
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    "mse_llm_request_seconds", "LLM call latency in seconds", ("model", "step")
+)
+LLM_REQUESTS_TOTAL = REGISTRY.counter(
+    "mse_llm_requests_total", "LLM calls by outcome", ("model", "step", "status")
+)
+LLM_RETRIES_TOTAL = REGISTRY.counter(
+    "mse_llm_retries_total", "Retried LLM requests (rate limited, transient errors or client retries)", ("model",)
+)
+LLM_TOKENS_TOTAL = REGISTRY.counter(
+    "mse_llm_tokens_total", "Tokens reported by the LLM provider", ("model", "kind")
+)
+LLM_COST_DOLLARS_TOTAL = REGISTRY.counter(
+    "mse_llm_cost_dollars_total", "Estimated LLM spend in USD from reported tokens and list prices", ("model", "step")
+)
+LLM_ESCALATIONS_TOTAL = REGISTRY.counter(
+    "mse_llm_escalations_total", "Steps retried on a larger model", ("step", "reason")
+)
+LLM_QUEUE_SECONDS = REGISTRY.histogram(
+    "mse_llm_queue_seconds", "Time LLM requests waited for rate limit capacity", ("model", "priority")
+)
+LLM_QUEUE_DEPTH = REGISTRY.gauge(
+    "mse_llm_queue_depth", "LLM requests waiting for rate limit capacity", ("model",)
+)
+LLM_DEADLINE_EXCEEDED_TOTAL = REGISTRY.counter(
+    "mse_llm_deadline_exceeded_total", "LLM requests dropped because they could not start before their deadline",
+    ("model", "priority")
+)
+FALLBACKS_TOTAL = REGISTRY.counter(
+    "mse_fallback_total", "Times a function fell back to its default output", ("function",)
+)
+STRUCTURED_OUTPUT_TOTAL = REGISTRY.counter(
+    "mse_structured_output_total", "Structured LLM outputs by parse outcome (valid, repaired, invalid_json, schema_error)",
+    ("function", "outcome")
+)
+
+# Retrieval layer
+RETRIEVAL_SECONDS = REGISTRY.histogram(
+    "mse_retrieval_seconds", "Retrieval stage latency in seconds", ("stage",)
+)
+RETRIEVAL_RESULTS_TOTAL = REGISTRY.counter(
+    "mse_retrieval_results_total", "Document segments returned by retrieval", ("index",)
+)
+RETRIEVAL_ERRORS_TOTAL = REGISTRY.counter(
+    "mse_retrieval_errors_total", "Retrieval calls that failed and returned no results", ("index",)
+)
+RETRIEVAL_ADAPTIVE_K = REGISTRY.histogram(
+    "mse_retrieval_adaptive_k", "Results kept per query by adaptive k, by the rule that cut the list",
+    ("reason",), buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15, 20)
+)
+INDEX_VECTORS = REGISTRY.gauge(
+    "mse_index_vectors", "Number of vectors in the index", ("index",)
+)
+CORPUS_MEMORY_BYTES = REGISTRY.gauge(
+    "mse_corpus_memory_bytes", "Estimated memory held by a loaded corpus", ("corpus",)
+)
+CORPUS_EVICTIONS_TOTAL = REGISTRY.counter(
+    "mse_corpus_evictions_total", "Corpora unloaded to stay within the memory budget", ("corpus",)
+)
+CACHE_REQUESTS_TOTAL = REGISTRY.counter(
+    "mse_cache_requests_total", "Cache lookups by outcome", ("cache", "result")
+)
+
+
+class _RetryLogHandler(logging.Handler):
+    """Counts the groq client's "Retrying request" log records per model"""
+
+    def emit(self, record: logging.LogRecord):
+        if record.getMessage().startswith("Retrying request"):
+            LLM_RETRIES_TOTAL.inc(model=current_llm_model.get())
+
+
+_retry_handler_installed = False
+
+
+def install_retry_counter(logger_name: str = "groq._base_client"):
+    """Attach the retry counter to the LLM client's logger (idempotent)"""
+    global _retry_handler_installed
+    if _retry_handler_installed:
+        return
+    client_logger = logging.getLogger(logger_name)
+    client_logger.addHandler(_RetryLogHandler(level=logging.INFO))
+    if client_logger.getEffectiveLevel() > logging.INFO:
+        client_logger.setLevel(logging.INFO)
+    _retry_handler_installed = True
+
+
+def write_textfile(path: str = None) -> str:
+    """
+    Dump the registry for the node_exporter textfile collector.
+
+    Args:
+        path (str): Destination .prom file (defaults to settings.METRICS_TEXTFILE)
+
+    Returns:
+        str: Path the metrics were written to
+    """
+    path = path or settings.METRICS_TEXTFILE
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(REGISTRY.render())
+    # Atomic rename so the collector never reads a half-written file
+    os.replace(tmp_path, path)
+    return path
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Keep scrapes out of the application logs
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int = None, host: str = "127.0.0.1") -> Optional[ThreadingHTTPServer]:
+    """
+    Serve /metrics on a local port from a daemon thread. Safe to call more than once.
+
+    Args:
+        port (int): Port to listen on (defaults to settings.METRICS_PORT)
+        host (str): Interface to bind
+
+    Returns:
+        ThreadingHTTPServer: The running server, or None if it could not be started
+    """
+    global _server
+    port = port or settings.METRICS_PORT
+    with _server_lock:
+        if _server is not None:
+            return _server
+        try:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            logger.warning(f"Could not start metrics server on {host}:{port}: {str(e)}")
+            return None
+        thread = threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True)
+        thread.start()
+        logger.info(f"Metrics available at http://{host}:{port}/metrics")
+        return _server
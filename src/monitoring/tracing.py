@@ -0,0 +1,356 @@
+import os
+import sys
+import json
+import time
+import atexit
+import secrets
+import argparse
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+# Add the root project directory to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+sys.path.insert(0, project_root)
+
+from loguru import logger
+from src.data_loader import settings
+
+SERVICE_NAME = "mse-ai"
+
+# The span currently active in this thread/context, used to parent nested spans
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+class Span:
+    """
+    A single timed operation. Spans are exported as OTLP/JSON so the trace file can be
+    read by any OpenTelemetry collector (e.g. the otlpjsonfile receiver).
+    """
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, attributes: Dict = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent.span_id if parent else ""
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        end_ns = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end_ns - self.start_ns) / 1e6
+
+    def to_otlp(self) -> dict:
+        """Format the span as an OTLP/JSON ExportTraceServiceRequest"""
+        status = {"code": 2, "message": self.error} if self.error else {"code": 1}
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+                "scopeSpans": [{
+                    "scope": {"name": "mse-ai.tracing"},
+                    "spans": [{
+                        "traceId": self.trace_id,
+                        "spanId": self.span_id,
+                        "parentSpanId": self.parent_span_id,
+                        "name": self.name,
+                        "kind": 1,
+                        "startTimeUnixNano": str(self.start_ns),
+                        "endTimeUnixNano": str(self.end_ns),
+                        "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+                        "status": status,
+                    }]
+                }]
+            }]
+        }
+
+
+def _otlp_attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+class _TraceWriter:
+    """
+    Buffers finished spans and appends them to the trace file in batches.
+
+    A batch is written once settings.TRACE_BATCH_SIZE spans are buffered, or by a daemon
+    thread every settings.TRACE_FLUSH_SECONDS, and on exit. When the file would grow past
+    settings.TRACE_MAX_MB it is rotated to traces.jsonl.1, .2, ... keeping
+    settings.TRACE_BACKUPS old files.
+    """
+
+    def __init__(self):
+        self._buffer: List[str] = []
+        self._lock = threading.Lock()
+        # Held while writing, so batches from different threads never interleave
+        self._write_lock = threading.Lock()
+        self._thread = None
+
+    def add(self, line: str):
+        with self._lock:
+            self._buffer.append(line)
+            full = len(self._buffer) >= settings.TRACE_BATCH_SIZE
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+                self._thread.start()
+        if full:
+            self.flush()
+
+    def _run(self):
+        while True:
+            time.sleep(settings.TRACE_FLUSH_SECONDS)
+            self.flush()
+
+    def flush(self):
+        """Write the buffered spans to the trace file"""
+        with self._write_lock:
+            with self._lock:
+                lines, self._buffer = self._buffer, []
+            if not lines:
+                return
+            try:
+                data = "".join(line + "\n" for line in lines)
+                path = settings.TRACE_FILE
+                if os.path.exists(path) and os.path.getsize(path) + len(data) > settings.TRACE_MAX_MB * 1024 * 1024:
+                    _rotate(path)
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(data)
+            except Exception as e:
+                logger.warning(f"Failed to export {len(lines)} spans: {str(e)}")
+
+
+def _rotate(path: str):
+    """Shift traces.jsonl -> .1 -> .2 ..., dropping the oldest beyond settings.TRACE_BACKUPS"""
+    if settings.TRACE_BACKUPS <= 0:
+        os.remove(path)
+        return
+    for i in range(settings.TRACE_BACKUPS - 1, 0, -1):
+        if os.path.exists(f"{path}.{i}"):
+            os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+    os.replace(path, f"{path}.1")
+
+
+def trace_files(trace_file: str) -> List[str]:
+    """The trace file and its rotated backups that exist, oldest first"""
+    backups = [f"{trace_file}.{i}" for i in range(settings.TRACE_BACKUPS, 0, -1)]
+    return [path for path in backups + [trace_file] if os.path.exists(path)]
+
+
+_writer = _TraceWriter()
+atexit.register(_writer.flush)
+
+
+def flush_spans():
+    """Write buffered spans to the trace file now, e.g. before reading it back"""
+    _writer.flush()
+
+
+def _export(finished: Span):
+    """Buffer a finished span for the trace file"""
+    if not settings.TRACING_ENABLED:
+        return
+    try:
+        _writer.add(json.dumps(finished.to_otlp()))
+    except Exception as e:
+        logger.warning(f"Failed to export span {finished.name}: {str(e)}")
+
+
+def current_span() -> Optional[Span]:
+    """Return the active span, if any"""
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Time a block of code as a span nested under the currently active span.
+
+    Args:
+        name (str): Stage name, e.g. "llm.generate_sub_queries" or "faiss_search"
+        **attributes: Attributes recorded on the span
+
+    Yields:
+        Span: The active span, so callers can attach attributes such as token counts
+    """
+    active = Span(name, parent=_current_span.get(), attributes=attributes)
+    token = _current_span.set(active)
+    try:
+        yield active
+    except Exception as e:
+        active.error = str(e)
+        raise
+    finally:
+        active.end_ns = time.time_ns()
+        _current_span.reset(token)
+        _export(active)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Linear-interpolated percentile of a list of values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def _iter_lines(paths: List[str]):
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            yield from f
+
+
+def _iter_spans(trace_file: str, window_seconds: float = None):
+    """Yield (name, duration in ms, attributes) of every span in an exported trace file and its backups"""
+    cutoff_ns = time.time_ns() - int(window_seconds * 1e9) if window_seconds else 0
+    for line in _iter_lines(trace_files(trace_file)):
+        try:
+            payload = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        for resource_spans in payload.get("resourceSpans", []):
+            for scope_spans in resource_spans.get("scopeSpans", []):
+                for item in scope_spans.get("spans", []):
+                    end_ns = int(item["endTimeUnixNano"])
+                    if end_ns < cutoff_ns:
+                        continue
+                    attributes = {
+                        attribute["key"]: next(iter(attribute["value"].values()))
+                        for attribute in item.get("attributes", [])
+                    }
+                    yield item["name"], (end_ns - int(item["startTimeUnixNano"])) / 1e6, attributes
+
+
+def summarize_traces(trace_file: str = None, window_seconds: float = None) -> Dict[str, dict]:
+    """
+    Summarize span latencies per stage from an exported trace file.
+
+    Args:
+        trace_file (str): Path to the OTLP/JSON lines file (defaults to settings.TRACE_FILE)
+        window_seconds (float): Only include spans that ended within this many seconds
+
+    Returns:
+        Dict[str, dict]: Per-stage count, mean, p50, p95 and p99 in milliseconds
+    """
+    trace_file = trace_file or settings.TRACE_FILE
+    durations: Dict[str, List[float]] = {}
+    # Spans of this process may still be buffered
+    flush_spans()
+    if not trace_files(trace_file):
+        logger.warning(f"No trace file found at {trace_file}")
+        return {}
+
+    for name, duration, _ in _iter_spans(trace_file, window_seconds):
+        durations.setdefault(name, []).append(duration)
+
+    return {
+        name: {
+            "count": len(values),
+            "mean_ms": sum(values) / len(values),
+            "p50_ms": percentile(values, 50),
+            "p95_ms": percentile(values, 95),
+            "p99_ms": percentile(values, 99),
+        }
+        for name, values in sorted(durations.items())
+    }
+
+
+def summarize_llm_costs(trace_file: str = None, window_seconds: float = None) -> Dict[str, dict]:
+    """
+    Summarize latency, tokens and cost of LLM calls per step and model.
+
+    Args:
+        trace_file (str): Path to the OTLP/JSON lines file (defaults to settings.TRACE_FILE)
+        window_seconds (float): Only include spans that ended within this many seconds
+
+    Returns:
+        Dict[str, dict]: Per "step model" key: calls, p50/p95 latency, mean prompt and completion tokens, mean
+                         static (cacheable) and provider-cached prompt tokens, and total cost in USD
+    """
+    trace_file = trace_file or settings.TRACE_FILE
+    # Spans of this process may still be buffered
+    flush_spans()
+    if not trace_files(trace_file):
+        logger.warning(f"No trace file found at {trace_file}")
+        return {}
+
+    calls: Dict[str, List[tuple]] = {}
+    for name, duration, attributes in _iter_spans(trace_file, window_seconds):
+        if not name.startswith("llm."):
+            continue
+        key = f"{name[len('llm.'):]} {attributes.get('model', 'unknown')}"
+        calls.setdefault(key, []).append((
+            duration,
+            int(attributes.get("prompt_tokens", 0)),
+            int(attributes.get("completion_tokens", 0)),
+            float(attributes.get("cost_usd", 0.0)),
+            int(attributes.get("static_prompt_tokens", 0)),
+            int(attributes.get("cached_prompt_tokens", 0)),
+        ))
+
+    return {
+        key: {
+            "count": len(values),
+            "p50_ms": percentile([v[0] for v in values], 50),
+            "p95_ms": percentile([v[0] for v in values], 95),
+            "mean_prompt_tokens": sum(v[1] for v in values) / len(values),
+            "mean_completion_tokens": sum(v[2] for v in values) / len(values),
+            "mean_static_prompt_tokens": sum(v[4] for v in values) / len(values),
+            "mean_cached_prompt_tokens": sum(v[5] for v in values) / len(values),
+            "cost_usd": sum(v[3] for v in values),
+        }
+        for key, values in sorted(calls.items())
+    }
+
+
+def main():
+    """Print a per-stage latency report (or per-step LLM cost report) from the trace file"""
+    parser = argparse.ArgumentParser(description='Summarize per-stage latency from exported traces.')
+    parser.add_argument('--file', default=settings.TRACE_FILE, help='Trace file to read')
+    parser.add_argument('--window', type=float, default=None, help='Only include spans from the last N seconds')
+    parser.add_argument('--costs', action='store_true', help='Report tokens and cost of LLM calls per step and model')
+    args = parser.parse_args()
+
+    if args.costs:
+        costs = summarize_llm_costs(args.file, args.window)
+        if not costs:
+            print("No LLM spans found.")
+            return
+        print(f"{'step':<34} {'model':<26} {'calls':>6} {'p50 ms':>9} {'p95 ms':>9} {'prompt':>8} {'static':>7} "
+              f"{'cached':>7} {'compl.':>7} {'cost $':>10}")
+        for key, stats in costs.items():
+            step, model = key.split(" ", 1)
+            print(f"{step:<34} {model:<26} {stats['count']:>6} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} "
+                  f"{stats['mean_prompt_tokens']:>8.0f} {stats['mean_static_prompt_tokens']:>7.0f} "
+                  f"{stats['mean_cached_prompt_tokens']:>7.0f} {stats['mean_completion_tokens']:>7.0f} {stats['cost_usd']:>10.5f}")
+        print(f"{'total':<34} {'':<26} {sum(s['count'] for s in costs.values()):>6} {'':>9} {'':>9} {'':>8} {'':>7} "
+              f"{'':>7} {'':>7} {sum(s['cost_usd'] for s in costs.values()):>10.5f}")
+        return
+
+    summary = summarize_traces(args.file, args.window)
+    if not summary:
+        print("No spans found.")
+        return
+
+    print(f"{'stage':<40} {'count':>7} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for name, stats in summary.items():
+        print(f"{name:<40} {stats['count']:>7} {stats['p50_ms']:>10.1f} {stats['p95_ms']:>10.1f} {stats['p99_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
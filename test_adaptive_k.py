@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+
+# Add the project root to the system path
+project_root = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, project_root)
+
+# Import project modules
+from src.data_loader.adaptive_k import choose_k, similarity_from_distance
+
+LIMITS = {"min_k": 2, "max_k": 6, "min_similarity": 0.5, "max_gap": 0.15, "margin": 0.3}
+
+
+def _distances(similarities):
+    return [2.0 * (1.0 - similarity) for similarity in similarities]
+
+
+def _cut(similarities, **overrides):
+    cutoff = choose_k(_distances(similarities), **{**LIMITS, **overrides})
+    return cutoff.k, cutoff.reason
+
+
+def test_similarity_from_distance():
+    assert similarity_from_distance(0.0) == 1.0
+    assert similarity_from_distance(2.0) == 0.0
+    assert similarity_from_distance(4.0) == -1.0
+
+
+def test_threshold():
+    assert _cut([0.8, 0.75, 0.7, 0.45, 0.44]) == (3, "threshold")
+
+
+def test_gap():
+    """A strong match followed by a drop keeps only the strong matches"""
+    assert _cut([0.9, 0.88, 0.86, 0.65, 0.64]) == (3, "gap")
+
+
+def test_margin():
+    """Slowly declining scores are cut once they trail the best by more than the margin"""
+    assert _cut([0.9, 0.82, 0.74, 0.66, 0.58, 0.55]) == (4, "margin")
+
+
+def test_threshold_is_checked_before_gap_and_margin():
+    assert _cut([0.9, 0.8, 0.4]) == (2, "threshold")
+
+
+def test_min_k_is_kept_even_below_the_cut_offs():
+    assert _cut([0.9, 0.3, 0.2]) == (2, "threshold")
+    assert _cut([0.9, 0.3, 0.2], min_k=1) == (1, "threshold")
+    # min_k of 0 still keeps the best result
+    assert _cut([0.3, 0.2], min_k=0) == (1, "threshold")
+
+
+def test_max_k():
+    cutoff = choose_k(_distances([0.9, 0.89, 0.88, 0.87, 0.86, 0.85, 0.84, 0.83]), **LIMITS)
+    assert (cutoff.k, cutoff.reason) == (6, "max_k")
+    assert cutoff.next_similarity is None and cutoff.gap is None
+
+
+def test_exhausted():
+    assert _cut([0.9, 0.89, 0.88]) == (3, "exhausted")
+    assert _cut([0.9]) == (1, "exhausted")
+    assert _cut([]) == (0, "exhausted")
+
+
+def test_cutoff_scores():
+    cutoff = choose_k(_distances([0.9, 0.88, 0.86, 0.65]), **LIMITS)
+    assert round(cutoff.top_similarity, 6) == 0.9
+    assert round(cutoff.last_similarity, 6) == 0.86
+    assert round(cutoff.next_similarity, 6) == 0.65
+    assert round(cutoff.gap, 6) == 0.21
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import tempfile
+
+# Add the project root to the system path
+project_root = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, project_root)
+
+# Import project modules
+from src.data_loader.index_versions import _write_current, list_versions, prune_versions
+from src.data_loader.sharded_index import SHARDS_DIR, VERSIONS_DIR, write_manifest
+
+
+def _make_version(index_root: str, version: str, shards: dict, status: str = "published"):
+    """
+    Write a version whose shards live in its own directory, or in an older version's.
+
+    Args:
+        shards (dict): Shard name -> version holding the shard files (None for this version)
+    """
+    version_path = os.path.join(index_root, VERSIONS_DIR, version)
+    os.makedirs(version_path)
+    manifest = {"format": 1, "version": version, "status": status, "shards": {}}
+    for name, owner in shards.items():
+        owner_shard = os.path.join(index_root, VERSIONS_DIR, owner or version, SHARDS_DIR, name)
+        if owner is None:
+            os.makedirs(owner_shard)
+            open(os.path.join(owner_shard, "index.faiss"), "w").close()
+        manifest["shards"][name] = {
+            "path": os.path.relpath(owner_shard, version_path), "doc_names": [name], "vectors": 1,
+        }
+    write_manifest(version_path, manifest)
+
+
+def _versions(index_root: str) -> list:
+    return [v["version"] for v in list_versions(index_root)]
+
+
+def test_prunes_beyond_keep():
+    with tempfile.TemporaryDirectory() as root:
+        for version in ["v1", "v2", "v3", "v4"]:
+            _make_version(root, version, {f"shard-{version}": None})
+        _write_current(root, "v4")
+        prune_versions(root, keep=2)
+        assert _versions(root) == ["v3", "v4"]
+
+
+def test_keeps_the_live_version():
+    """A rolled-back live version survives even when it is older than the newest `keep`"""
+    with tempfile.TemporaryDirectory() as root:
+        for version in ["v1", "v2", "v3", "v4"]:
+            _make_version(root, version, {f"shard-{version}": None})
+        _write_current(root, "v1")
+        prune_versions(root, keep=2)
+        assert _versions(root) == ["v1", "v3", "v4"]
+
+
+def test_keeps_versions_whose_shards_are_referenced():
+    """Incremental versions reference older versions' shards, transitively"""
+    with tempfile.TemporaryDirectory() as root:
+        _make_version(root, "v1", {"a": None})
+        _make_version(root, "v2", {"a": "v1", "b": None})
+        _make_version(root, "v3", {"a": "v1", "b": "v2", "c": None})
+        _make_version(root, "v4", {"d": None})
+        _make_version(root, "v5", {"d": "v4", "e": None})
+        _write_current(root, "v5")
+        prune_versions(root, keep=1)
+        assert _versions(root) == ["v4", "v5"]
+
+
+def test_keeps_versions_referenced_by_a_rolled_back_live_version():
+    with tempfile.TemporaryDirectory() as root:
+        _make_version(root, "v1", {"a": None})
+        _make_version(root, "v2", {"a": "v1", "b": None})
+        _make_version(root, "v3", {"a": "v1", "b": "v2", "c": None})
+        _make_version(root, "v4", {"d": None})
+        _write_current(root, "v3")
+        prune_versions(root, keep=1)
+        assert _versions(root) == ["v1", "v2", "v3", "v4"]
+
+
+def test_builds_in_progress_keep_their_references():
+    with tempfile.TemporaryDirectory() as root:
+        _make_version(root, "v1", {"a": None})
+        _make_version(root, "v2", {"b": None})
+        _make_version(root, "v3", {"a": "v1", "c": None}, status="building")
+        _write_current(root, "v2")
+        prune_versions(root, keep=1)
+        assert _versions(root) == ["v1", "v2", "v3"]
+
+
+def test_stale_builds_are_removed():
+    with tempfile.TemporaryDirectory() as root:
+        _make_version(root, "v1", {"a": None})
+        _make_version(root, "v2", {"b": None}, status="building")
+        stale = os.path.join(root, VERSIONS_DIR, "v2")
+        os.utime(stale, (0, 0))
+        _write_current(root, "v1")
+        prune_versions(root, keep=1)
+        assert _versions(root) == ["v1"]
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+import threading
+
+# Add the project root to the system path
+project_root = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, project_root)
+
+# Import project modules
+from src.ai_functions.llm_scheduler import DeadlineExceeded, RequestScheduler, TokenBucket
+
+# 10 tokens a second, so the waits below stay well under a second each
+LIMITS = {"default": {"rpm": 6000, "tpm": 600}}
+
+
+def _expect_deadline(call):
+    try:
+        call()
+    except DeadlineExceeded:
+        pass
+    else:
+        raise AssertionError("expected DeadlineExceeded")
+
+
+def test_token_bucket_refills_up_to_capacity():
+    bucket = TokenBucket(60)
+    start = bucket.updated
+    bucket.take(60, start)
+    assert bucket.wait_time(10, start) == 10.0
+    assert bucket.wait_time(10, start + 4) == 6.0
+    assert bucket.wait_time(10, start + 10) == 0.0
+    bucket._refill(start + 1000)
+    assert bucket.level == 60.0
+
+
+def test_token_bucket_oversized_requests_need_a_full_bucket():
+    bucket = TokenBucket(60)
+    start = bucket.updated
+    assert bucket.wait_time(500, start) == 0.0
+    bucket.take(500, start)
+    assert bucket.level == 0.0
+    assert bucket.wait_time(500, start) == 60.0
+
+
+def test_token_bucket_debt_is_repaid_before_new_requests():
+    bucket = TokenBucket(60)
+    start = bucket.updated
+    bucket.take(10, start)
+    # The request used 40 more tokens than reserved
+    bucket.adjust(40)
+    assert bucket.level == 10.0
+    bucket.take(10, start)
+    bucket.adjust(20)
+    assert bucket.level == -20.0
+    assert bucket.wait_time(1, start) == 21.0
+    # A refund never raises the level over capacity
+    bucket.adjust(-1000)
+    assert bucket.level == 60.0
+
+
+def test_requests_within_capacity_do_not_wait():
+    scheduler = RequestScheduler(LIMITS)
+    reservation = scheduler.acquire("model", 100)
+    assert reservation.waited_seconds < 0.1
+    assert scheduler.queue_depth("model") == 0
+
+
+def test_interactive_requests_are_served_before_analysis():
+    scheduler = RequestScheduler(LIMITS)
+    scheduler.acquire("model", 600)
+    served = []
+
+    def request(priority):
+        scheduler.acquire("model", 3, priority=priority)
+        served.append(priority)
+
+    threads = []
+    for priority in ["analysis", "analysis", "interactive"]:
+        threads.append(threading.Thread(target=request, args=(priority,)))
+        threads[-1].start()
+        time.sleep(0.05)
+    assert scheduler.queue_depth("model") == 3
+    for thread in threads:
+        thread.join(timeout=5)
+    assert served == ["interactive", "analysis", "analysis"]
+
+
+def test_deadline_that_cannot_be_met_fails_fast():
+    scheduler = RequestScheduler(LIMITS)
+    scheduler.acquire("model", 600)
+    start = time.monotonic()
+    _expect_deadline(lambda: scheduler.acquire("model", 50, deadline_seconds=1))
+    assert time.monotonic() - start < 0.5
+    assert scheduler.queue_depth("model") == 0
+
+
+def test_deadline_while_queued_behind_other_requests():
+    scheduler = RequestScheduler(LIMITS)
+    scheduler.acquire("model", 600)
+    head = threading.Thread(target=scheduler.acquire, args=("model", 10))
+    head.start()
+    time.sleep(0.05)
+    start = time.monotonic()
+    _expect_deadline(lambda: scheduler.acquire("model", 1, priority="analysis", deadline_seconds=0.3))
+    assert 0.25 < time.monotonic() - start < 0.8
+    head.join(timeout=5)
+    assert scheduler.queue_depth("model") == 0
+
+
+def test_settle_charges_underestimated_usage():
+    scheduler = RequestScheduler(LIMITS)
+    reservation = scheduler.acquire("model", 100)
+    # 600 more tokens than estimated leaves the bucket 100 tokens in debt
+    scheduler.settle(reservation, 700)
+    _expect_deadline(lambda: scheduler.acquire("model", 1, deadline_seconds=0.2))
+
+
+def test_penalize_pauses_the_model():
+    scheduler = RequestScheduler(LIMITS)
+    scheduler.penalize("model", 0.3)
+    _expect_deadline(lambda: scheduler.acquire("model", 1, deadline_seconds=0.1))
+    # Other models are unaffected
+    assert scheduler.acquire("other", 1, deadline_seconds=0.1).waited_seconds < 0.1
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: ok")
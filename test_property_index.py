@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+
+# Add the project root to the system path
+project_root = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, project_root)
+
+# Import project modules
+from src.data_loader.property_index import PropertyIndex, extract_properties, parse_constraints
+from langchain.schema import Document
+
+
+def _values(text: str) -> set:
+    return {(record["material"], record["property"], record["low"], record["high"]) for record in extract_properties(text)}
+
+
+def test_sentence_values_go_to_the_nearest_property():
+    """Each value belongs to the property mentioned right before it, whatever their order"""
+    assert _values("Stainless steel 304 has density 8.0 g/cm3 and yield strength 215 MPa.") == {
+        ("Stainless steel", "density", 8.0, 8.0),
+        ("Stainless steel", "strength", 215.0, 215.0),
+    }
+    assert _values("Ti-6Al-4V has density 4.43 g/cm3, tensile strength 950 MPa.") == {
+        ("Ti-6Al-4V", "density", 4.43, 4.43),
+        ("Ti-6Al-4V", "strength", 950.0, 950.0),
+    }
+    assert _values("Ti-6Al-4V has tensile strength 950 MPa and density 4.43 g/cm3.") == {
+        ("Ti-6Al-4V", "density", 4.43, 4.43),
+        ("Ti-6Al-4V", "strength", 950.0, 950.0),
+    }
+
+
+def test_sentence_units_are_converted():
+    assert _values("The density of alumina is 3900 kg/m3.") == {("alumina", "density", 3.9, 3.9)}
+    assert _values("Inconel 718 has a maximum service temperature of 1200 °F.") == {
+        ("Inconel 718", "max_service_temperature", 648.888889, 648.888889),
+    }
+
+
+def test_temperatures_need_a_service_qualifier():
+    """Glass transition and melting temperatures are not service temperatures"""
+    assert _values("Polycarbonate has a glass transition temperature of 147 °C and melts near 267 °C.") == set()
+    assert _values("Inconel 718 has a maximum service temperature of 650 °C and melting point 1336 °C.") == {
+        ("Inconel 718", "max_service_temperature", 650.0, 650.0),
+        ("Inconel 718", "melting_point", 1336.0, 1336.0),
+    }
+
+
+def test_table_with_named_header():
+    text = (
+        "Material  Density (g/cm3)  Yield strength (MPa)\n"
+        "HSLA steel 4140 (o.q. T-315)  7.85  590\n"
+        "Ti-6-4  4.4  880-950\n"
+    )
+    assert _values(text) == {
+        ("HSLA steel 4140 (o.q. T-315)", "density", 7.85, 7.85),
+        ("HSLA steel 4140 (o.q. T-315)", "strength", 590.0, 590.0),
+        ("Ti-6-4", "density", 4.4, 4.4),
+        ("Ti-6-4", "strength", 880.0, 950.0),
+    }
+
+
+def test_table_with_units_row():
+    text = (
+        "Material density modulus strength\n"
+        "kg/m3 GPa MPa\n"
+        "Nodular cast iron 7150 178 250\n"
+        "Duralcan Al-SiC(p) composite 2880 110 230\n"
+    )
+    assert _values(text) == {
+        ("Nodular cast iron", "density", 7.15, 7.15),
+        ("Nodular cast iron", "youngs_modulus", 178.0, 178.0),
+        ("Nodular cast iron", "strength", 250.0, 250.0),
+        ("Duralcan Al-SiC(p) composite", "density", 2.88, 2.88),
+        ("Duralcan Al-SiC(p) composite", "youngs_modulus", 110.0, 110.0),
+        ("Duralcan Al-SiC(p) composite", "strength", 230.0, 230.0),
+    }
+
+
+def test_parse_constraints():
+    assert parse_constraints("density < 5 g/cm³ and service temp > 500°C") == [
+        ("density", "<", 5.0), ("max_service_temperature", ">", 500.0),
+    ]
+    assert parse_constraints("yield strength of at least 40 ksi") == [("strength", ">", 275.8)]
+    # A requirement to survive a temperature is a lower bound on the service temperature
+    assert parse_constraints("must withstand temperatures up to 600°C") == [("max_service_temperature", ">", 600.0)]
+    assert parse_constraints("a glass transition temperature above 100 °C") == []
+    assert parse_constraints("a lightweight, corrosion resistant bracket") == []
+
+
+def test_range_filter():
+    index = PropertyIndex()
+    index.add_documents([Document(
+        page_content=(
+            "Material  Density (g/cm3)  Max service temperature (°C)\n"
+            "Ti-6-4  4.4  400-600\n"
+            "Aluminium 6061  2.7  150\n"
+            "Inconel 718  8.2  650\n"
+        ),
+        metadata={"doc_name": "handbook", "page": 3}
+    )])
+    candidates = index.search(parse_constraints("density < 5 g/cm3 and service temperature > 500 C"))
+    assert [candidate["material"] for candidate in candidates] == ["Ti-6-4"]
+    assert candidates[0]["values"]["density"][0]["source"] == "handbook"
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: ok")
@@ -14,6 +14,7 @@ logger.add("logs/retrieval_test.log", rotation="500 MB")
 # Import project modules
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from src.data_loader.doc_indexer import retrieve_documents
+from src.data_loader.sharded_index import index_exists
 from src.data_loader import settings
 
 def test_document_retrieval():
@@ -37,8 +38,8 @@ def test_document_retrieval():
     print("="*80 + "\n")
     
     # Ensure the index exists
-    unified_index_path = os.path.join(settings.DOC_INDEXES_DIR, "materials_database")
-    if not os.path.exists(os.path.join(unified_index_path, "index.faiss")):
+    unified_index_path = os.path.join(settings.DOC_INDEXES_DIR, settings.DEFAULT_CORPUS)
+    if not index_exists(unified_index_path):
         logger.error(f"Unified materials database index not found at {unified_index_path}")
         print(f"ERROR: Unified database not found at {unified_index_path}")
         print("Please run: python index_data.py --rebuild")
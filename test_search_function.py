@@ -14,6 +14,7 @@ logger.add("logs/search_test.log", rotation="500 MB")
 # Import project modules
 from src.data_loader import settings
 from src.ai_functions.prompt_functions import search_materials_database
+from src.data_loader.sharded_index import index_exists
 
 def test_search_materials_database():
     """
@@ -34,8 +35,8 @@ def test_search_materials_database():
     print("="*80 + "\n")
     
     # Ensure the index exists
-    unified_index_path = os.path.join(settings.DOC_INDEXES_DIR, "materials_database")
-    if not os.path.exists(os.path.join(unified_index_path, "index.faiss")):
+    unified_index_path = os.path.join(settings.DOC_INDEXES_DIR, settings.DEFAULT_CORPUS)
+    if not index_exists(unified_index_path):
         logger.error(f"Unified materials database index not found at {unified_index_path}")
         print(f"ERROR: Unified database not found at {unified_index_path}")
         print("Please run: python index_data.py --rebuild")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+
+# Add the project root to the system path
+project_root = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, project_root)
+
+# Import project modules
+from langchain_core.exceptions import OutputParserException
+from src.ai_functions.structured_output import (
+    QueryAnalysis,
+    QuestionList,
+    StructuredOutputParser,
+    SubQueryPlan,
+    list_items,
+    parse_json_output,
+)
+from src.monitoring.metrics import STRUCTURED_OUTPUT_TOTAL
+
+
+def test_valid_json_is_not_repaired():
+    assert parse_json_output('{"questions": ["a", "b"]}') == ({"questions": ["a", "b"]}, False)
+
+
+def test_repairs():
+    expected = {"questions": ["What load?", "What temperature?"]}
+    repairs = [
+        # Code fence and prose around the value
+        'Here you go:\n```json\n{"questions": ["What load?", "What temperature?"]}\n```\nHope it helps.',
+        # Trailing commas
+        '{"questions": ["What load?", "What temperature?",],}',
+        # Missing outer braces
+        '"questions": ["What load?", "What temperature?"]',
+        # Python-style literal
+        "{'questions': ['What load?', 'What temperature?']}",
+        # Truncated inside a string
+        '{"questions": ["What load?", "What temperature?',
+    ]
+    for text in repairs:
+        assert parse_json_output(text) == (expected, True), text
+    # A string cut off mid-word is closed rather than dropped
+    assert parse_json_output('{"questions": ["What load?", "Wh') == ({"questions": ["What load?", "Wh"]}, True)
+
+
+def test_truncated_mid_key_falls_back_to_the_last_element():
+    value, repaired = parse_json_output('{"requirements": "light", "sub_que')
+    assert repaired
+    assert value == {"requirements": "light"}
+
+
+def test_raw_newlines_in_strings_are_escaped():
+    value, _ = parse_json_output('{"requirements": "light\nand stiff", "sub_queries": ["a"]}')
+    assert value["requirements"] == "light\nand stiff"
+
+
+def test_no_json_raises():
+    try:
+        parse_json_output("I could not think of any questions.")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("expected ValueError")
+
+
+def test_list_items():
+    text = "1. Ti-6Al-4V - light and strong\n2) Inconel 718\n- **CFRP**\nNot an item"
+    assert list_items(text) == ["Ti-6Al-4V", "Inconel 718", "CFRP"]
+
+
+def test_parser_validates_and_normalises():
+    parser = StructuredOutputParser(pydantic_object=QueryAnalysis, function="test_analyze")
+    parsed = parser.parse('{"mode": "material science", "questions": [" What load? ", ""], "confidence": 0.8}')
+    assert parsed == QueryAnalysis(mode="MATERIAL_SCIENCE", questions=["What load?"], confidence=0.8)
+
+
+def test_parser_counts_outcomes():
+    parser = StructuredOutputParser(pydantic_object=SubQueryPlan, function="test_outcomes")
+
+    def count(outcome):
+        return STRUCTURED_OUTPUT_TOTAL.value(function="test_outcomes", outcome=outcome)
+
+    parser.parse('{"sub_queries": ["a"]}')
+    parser.parse('```json\n{"sub_queries": ["a"],}\n```')
+    for text, outcome in [("no json here", "invalid_json"), ('{"sub_queries": []}', "schema_error")]:
+        try:
+            parser.parse(text)
+        except OutputParserException:
+            pass
+        else:
+            raise AssertionError(f"expected OutputParserException for {text!r}")
+    assert (count("valid"), count("repaired"), count("invalid_json"), count("schema_error")) == (1, 1, 1, 1)
+
+
+def test_parser_rejects_schema_mismatches():
+    parser = StructuredOutputParser(pydantic_object=QueryAnalysis, function="test_schema")
+    for text in ['{"mode": "CHAT"}', '{"mode": "CONVERSATIONAL", "confidence": 1.5}', '{"questions": ["a"]}']:
+        try:
+            parser.parse(text)
+        except OutputParserException:
+            pass
+        else:
+            raise AssertionError(f"expected OutputParserException for {text!r}")
+
+
+def test_parser_falls_back_to_list_items():
+    parser = StructuredOutputParser(pydantic_object=QuestionList, function="test_list", list_field="questions")
+    parsed = parser.parse("Questions:\n1. What load?\n2. What temperature?")
+    assert parsed.questions == ["What load?", "What temperature?"]
+
+    strict = StructuredOutputParser(pydantic_object=QuestionList, function="test_list")
+    try:
+        strict.parse("Questions:\n1. What load?")
+    except OutputParserException:
+        pass
+    else:
+        raise AssertionError("expected OutputParserException without list_field")
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: ok")